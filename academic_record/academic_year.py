@@ -0,0 +1,94 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import AcademicYear
+
+CACHE_KEY = 'academic_record:current_academic_year'
+REQUEST_ATTRIBUTE = 'current_academic_year'
+
+_local = {}
+_lock = threading.Lock()
+
+
+def shared_cache():
+    alias = getattr(settings, 'ACADEMIC_YEAR_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+def cache_timeout():
+    return getattr(settings, 'ACADEMIC_YEAR_CACHE_TIMEOUT', 60)
+
+
+def load_current_academic_year():
+    cache = shared_cache()
+    if cache is not None:
+        # wrapped in a tuple so "no academic year" is cached too
+        cached = cache.get(CACHE_KEY)
+        if cached is not None:
+            return cached[0]
+
+    academic_year = AcademicYear.objects.first()
+
+    if cache is not None:
+        cache.set(CACHE_KEY, (academic_year,))
+    return academic_year
+
+
+def current_academic_year(request=None):
+    """
+        The academic year every view works on, AcademicYear.objects.first().
+        Kept in process for ACADEMIC_YEAR_CACHE_TIMEOUT seconds, backed by the
+        ACADEMIC_YEAR_CACHE_ALIAS cache when set (its own timeout applies
+        there), and memoized on the request.
+        Setting request.current_academic_year beforehand overrides it.
+    """
+    if request is not None:
+        academic_year = getattr(request, REQUEST_ATTRIBUTE, _local)
+        if academic_year is not _local:
+            return academic_year
+
+    with _lock:
+        cached = _local.get('academic_year')
+        if cached is None or cached[1] <= time.monotonic():
+            cached = (load_current_academic_year(),
+                      time.monotonic() + cache_timeout())
+            _local['academic_year'] = cached
+    academic_year = cached[0]
+
+    if request is not None:
+        setattr(request, REQUEST_ATTRIBUTE, academic_year)
+    return academic_year
+
+
+def academic_year_on(day):
+    """
+        The academic year whose start_date..end_date holds day: the current
+        one when it does, else the first such year. None between years.
+    """
+    academic_year = current_academic_year()
+    if academic_year is not None and academic_year.start_date <= day <= academic_year.end_date:
+        return academic_year
+    return AcademicYear.objects.filter(start_date__lte=day, end_date__gte=day).first()
+
+
+def clear_current_academic_year():
+    with _lock:
+        _local.clear()
+
+    cache = shared_cache()
+    if cache is not None:
+        cache.delete(CACHE_KEY)
+
+
+@receiver(post_save, sender=AcademicYear)
+@receiver(post_delete, sender=AcademicYear)
+def invalidate_current_academic_year(sender, **kwargs):
+    clear_current_academic_year()
+    # a request running before the commit may have cached the old row again
+    transaction.on_commit(clear_current_academic_year)
@@ -5,7 +5,7 @@ from base.admin import BaseAdmin
 from class_information.models import Section, Subject
 from user_profile.models import Student, Teacher
 
-from .models import Assessment, Attendance, Schedule, StudentAssessment, AcademicYear
+from .models import Assessment, Attendance, PeriodGrade, Schedule, StudentAssessment, AcademicYear
 
 class AcademicYearForm(forms.ModelForm):
 
@@ -183,3 +183,18 @@ class StudentAssessmentAdmin(admin.ModelAdmin):
     list_display = ['assessment', 'student', 'obtained_marks']
     list_filter = ['assessment', 'student',]
     autocomplete_fields = ['student', 'assessment']
+
+
+@admin.register(PeriodGrade)
+class PeriodGradeAdmin(admin.ModelAdmin):
+    search_fields = ['student__user__last_name',
+                     'student__user__first_name', 'subject__name']
+    list_display = ['student', 'subject', 'grading_period', 'grade']
+    list_filter = ['grading_period', 'subject', 'academic_year']
+    list_select_related = ['student__user', 'subject']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AcademicRecordConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'academic_record'
+
+    def ready(self):
+        from . import academic_year, signals
@@ -0,0 +1,124 @@
+from collections import OrderedDict
+
+from academic_record.gpa_caluclate import gpa_calculate
+from .models import Assessment
+
+
+GRADING_PERIODS = [period for period, _ in Assessment.GRADING_PERIOD_CHOICES]
+
+# assessment_type -> Subject weight column used by gpa_calculate
+ASSESSMENT_TYPE_WEIGHTS = OrderedDict([
+    ('WRITTEN_WORKS', 'assessment__subject__written_work'),
+    ('PERFORMANCE_TASK', 'assessment__subject__performance_task'),
+    ('QUARTERLY_ASSESSMENT', 'assessment__subject__quartery_assessment'),
+])
+
+MARK_FIELDS = [
+    'student_id',
+    'assessment__grading_period',
+    'assessment__assessment_type',
+    'obtained_marks',
+    'assessment__max_marks',
+] + list(ASSESSMENT_TYPE_WEIGHTS.values())
+
+
+def empty_buckets():
+    return {assessment_type: {"weightage": 0, "obtained_marks": []}
+            for assessment_type in ASSESSMENT_TYPE_WEIGHTS}
+
+
+def add_mark(buckets, row):
+    _, _, assessment_type, obtained_marks, max_marks = row[:5]
+    bucket = buckets.get(assessment_type)
+    if bucket is None:
+        return
+
+    bucket['obtained_marks'].append(obtained_marks / max_marks)
+    # the first non zero subject weight wins, same as the old per row loop
+    if bucket['weightage'] == 0:
+        weight = row[5 + list(ASSESSMENT_TYPE_WEIGHTS).index(assessment_type)]
+        bucket['weightage'] = weight / 100
+
+
+def mark_rows(student_assessments):
+    # views fall back to an empty list when nothing matches
+    if not hasattr(student_assessments, 'values_list'):
+        return []
+    return student_assessments.values_list(*MARK_FIELDS)
+
+
+def collect_marks(student_assessments):
+    """
+        Reduce a StudentAssessment queryset to
+        {student_id: {grading_period: {assessment_type: {"weightage", "obtained_marks"}}}}
+        using a single query. The queryset ordering is kept so the weightage
+        is taken from the same row the per row loop used to pick.
+    """
+    marks = {}
+
+    for row in mark_rows(student_assessments):
+        student_id, grading_period = row[:2]
+        periods = marks.setdefault(student_id, {})
+        add_mark(periods.setdefault(grading_period, empty_buckets()), row)
+
+    return marks
+
+
+def calculate_buckets(buckets):
+    return gpa_calculate(
+        buckets['WRITTEN_WORKS'], buckets['PERFORMANCE_TASK'], buckets['QUARTERLY_ASSESSMENT'])
+
+
+def calculate_total_gpa(period_grades):
+    grades = list(period_grades)
+    if 'N/A' in grades:
+        return 'N/A'
+
+    temp_total_gpa = 0
+    for value in grades:
+        temp_total_gpa += float(value)
+    temp_total_gpa = temp_total_gpa / len(grades)
+
+    return str(round(temp_total_gpa, 2))
+
+
+def grades_from_periods(periods):
+    data = {}
+    for grading_period in GRADING_PERIODS:
+        data[grading_period.lower()] = calculate_buckets(
+            periods.get(grading_period, empty_buckets()))
+
+    data['total_gpa'] = calculate_total_gpa(data.values())
+    return data
+
+
+def calculate_section_grades(student_assessments):
+    """
+        Four grading period grades plus total_gpa for every student found in
+        the queryset, e.g. a whole section for one subject.
+    """
+    marks = collect_marks(student_assessments)
+    return {student_id: grades_from_periods(periods) for student_id, periods in marks.items()}
+
+
+def calculate_student_grades(student_assessments):
+    """
+        Grades of a queryset already narrowed down to one student and subject.
+        Returns 'N/A' for each period without complete marks.
+    """
+    marks = collect_marks(student_assessments)
+    periods = next(iter(marks.values()), {})
+    return grades_from_periods(periods)
+
+
+def calculate_gpa(student_assessments):
+    """
+        Single grade of every row in the queryset regardless of grading period,
+        used by list views that already filter on grading_period.
+    """
+    buckets = empty_buckets()
+
+    for row in mark_rows(student_assessments):
+        add_mark(buckets, row)
+
+    return calculate_buckets(buckets)
@@ -0,0 +1,147 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from academic_record.models import Assessment, Attendance, Schedule, StudentAssessment
+from academic_record.seed import seed_school
+from chat.models import ChatMessage, ChatSession
+from core.benchmark import check_benchmark_database
+from registration.models import Registration
+
+# composite indexes added for the hot lookups, dropped for the "before" run
+HOT_INDEXES = [
+    'attendance_student_day_idx',
+    'attendance_student_page_idx',
+    'registration_student_year_idx',
+    'registration_section_year_idx',
+    'student_assessment_student_idx',
+    'assessment_period_idx',
+    'schedule_year_section_idx',
+    'schedule_teacher_year_idx',
+    'chat_message_session_page_idx',
+]
+
+
+class Command(BaseCommand):
+    help = ('Seed a school sized dataset in a transaction that is rolled back, then report '
+            'EXPLAIN plans and latencies of the hot lookups with and without the composite indexes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--sections', type=int, default=25)
+        parser.add_argument('--subjects', type=int, default=8)
+        parser.add_argument('--days', type=int, default=20, help='School days of attendance')
+        parser.add_argument('--repeat', type=int, default=50, help='Runs of each lookup')
+        parser.add_argument('--plans', action='store_true', help='Print the full EXPLAIN output')
+        parser.add_argument('--force', action='store_true',
+                            help='Run against a database that is not a test one')
+
+    def lookups(self, rng, sample):
+        """
+            (name, queryset factory) of the predicates the views hit the most,
+            each factory picks its parameters from the seeded rows.
+        """
+        return [
+            ('attendance of a student for a schedule on a day', lambda: Attendance.objects.filter(
+                student_id=rng.choice(sample['students']), schedule_id=rng.choice(sample['schedules']),
+                attendance_date=rng.choice(sample['dates']), time_in__isnull=False)),
+            ('attendance history page of a student', lambda: Attendance.objects.filter(
+                student_id=rng.choice(sample['students'])).order_by(
+                '-attendance_date', '-time_in', '-id')[:10]),
+            ('registration of a student', lambda: Registration.objects.filter(
+                student_id=rng.choice(sample['students']), academic_year_id=sample['academic_year'])),
+            ('registrations of a section', lambda: Registration.objects.filter(
+                section_id=rng.choice(sample['sections']), academic_year_id=sample['academic_year'])),
+            ('grading period marks of a student', lambda: StudentAssessment.objects.filter(
+                student_id=rng.choice(sample['students']),
+                assessment__academic_year_id=sample['academic_year'],
+                assessment__grading_period='FIRST_GRADING',
+                assessment__subject_id=rng.choice(sample['subjects']))),
+            ('assessments of a teacher for a period', lambda: Assessment.objects.filter(
+                academic_year_id=sample['academic_year'], grading_period='SECOND_GRADING',
+                subject_id=rng.choice(sample['subjects']), teacher_id=rng.choice(sample['teachers']))),
+            ('schedules of a section', lambda: Schedule.objects.filter(
+                academic_year_id=sample['academic_year'], section_id=rng.choice(sample['sections']))),
+            ('schedules of a teacher', lambda: Schedule.objects.filter(
+                teacher_id=rng.choice(sample['teachers']), academic_year_id=sample['academic_year'])),
+            ('chat messages page of a session', lambda: ChatMessage.objects.filter(
+                chat_session_id=rng.choice(sample['chat_sessions'])).order_by('-timestamp', '-id')[:10]),
+        ]
+
+    def sample(self, academic_year_id):
+        schedules = Schedule.objects.filter(academic_year_id=academic_year_id)
+        return {
+            'academic_year': academic_year_id,
+            'students': list(Registration.objects.filter(
+                academic_year_id=academic_year_id).values_list('student_id', flat=True)),
+            'schedules': list(schedules.values_list('pk', flat=True)),
+            'sections': list(schedules.values_list('section_id', flat=True).distinct()),
+            'subjects': list(schedules.values_list('subject_id', flat=True).distinct()),
+            'teachers': list(schedules.values_list('teacher_id', flat=True).distinct()),
+            'dates': list(Attendance.objects.filter(
+                schedule__academic_year_id=academic_year_id).values_list(
+                'attendance_date', flat=True).distinct()),
+            'chat_sessions': list(ChatSession.objects.filter(
+                room_name__startswith='benchmark-room-').values_list('pk', flat=True)),
+        }
+
+    def explain(self, queryset, label):
+        # the label keeps the text apart between runs, sqlite would reuse the
+        # plan of a cached EXPLAIN statement after the indexes are dropped
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql} /* {label} */', params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+    def measure(self, lookups, repeat, label):
+        results = {}
+        for name, build in lookups:
+            timings = []
+            for _ in range(repeat):
+                queryset = build()
+                started = time.perf_counter()
+                list(queryset)
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = (statistics.median(timings), self.explain(build(), label))
+        return results
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for name in HOT_INDEXES:
+                cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+
+    def handle(self, *args, **options):
+        # DROP INDEX locks attendance, registration and schedule until the rollback
+        check_benchmark_database(options['force'])
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            counts = seed_school(
+                prefix='benchmark', students=options['students'], sections=options['sections'],
+                subjects=options['subjects'], days=options['days'])
+            self.stdout.write(f'Seeded in {time.perf_counter() - started:.1f}s: ' + ', '.join(
+                f'{count} {name}' for name, count in counts.items()))
+
+            academic_year_id = Schedule.objects.filter(
+                section__name__startswith='benchmark ').values_list('academic_year_id', flat=True).first()
+            sample = self.sample(academic_year_id)
+            # same parameters for both runs
+            after = self.measure(self.lookups(random.Random(0), sample), options['repeat'], 'after')
+            self.drop_indexes()
+            before = self.measure(self.lookups(random.Random(0), sample), options['repeat'], 'before')
+
+            # nothing of the benchmark is kept, indexes included
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{"lookup":<50} {"before ms":>10} {"after ms":>10}')
+        for name, (after_ms, after_plan) in after.items():
+            before_ms, before_plan = before[name]
+            self.stdout.write(f'{name:<50} {before_ms:>10.3f} {after_ms:>10.3f}')
+            if options['plans']:
+                self.stdout.write(f'  before: {before_plan}\n  after:  {after_plan}')
+            else:
+                self.stdout.write(f'  before: {before_plan.splitlines()[-1].strip()}')
+                self.stdout.write(f'  after:  {after_plan.splitlines()[-1].strip()}')
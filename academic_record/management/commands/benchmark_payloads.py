@@ -0,0 +1,91 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from academic_record.models import Schedule
+from academic_record.seed import seed_school
+from academic_record.student_views import StudentAssessmentListView, StudentAttendanceListView, StudentScheduleListView
+from registration.models import Registration
+
+# (page, view, query) of the mobile pages, query gets the registration and a subject of it
+PAGES = [
+    ('student assessments', StudentAssessmentListView,
+     lambda registration, subject_id: {'grading_period': 'FIRST_GRADING', 'subject_id': subject_id}),
+    ('student attendance', StudentAttendanceListView,
+     lambda registration, subject_id: {'subject_id': subject_id}),
+    ('student schedule', StudentScheduleListView,
+     lambda registration, subject_id: {}),
+]
+
+# (variant, extra query) of every page, sparse asks for what the list screens show
+VARIANTS = [
+    ('full', {}),
+    ('flat ids', {'expand': ''}),
+    ('sparse', {'fields': 'pk,obtained_marks,is_present,attendance_date,time_in,time_out,day,time_start,time_end,'
+                          'assessment.name,assessment.max_marks,subject.name,schedule',
+                'expand': 'assessment,subject'}),
+]
+
+
+class Command(BaseCommand):
+    help = ('Seed a school in a transaction that is rolled back and report response size, '
+            'serialization time and queries of the student pages with and without ?fields=/?expand=')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=200)
+        parser.add_argument('--sections', type=int, default=5)
+        parser.add_argument('--subjects', type=int, default=8)
+        parser.add_argument('--days', type=int, default=20, help='School days of attendance')
+        parser.add_argument('--assessments', type=int, default=4, help='Assessments per type and period')
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=10, help='Requests of each page and variant')
+
+    def request(self, view, query, registration):
+        request = APIRequestFactory().get('/', query)
+        force_authenticate(request, user=registration.student.user)
+        request.current_academic_year = registration.academic_year
+        response = view.as_view()(request)
+        response.render()
+        return response
+
+    def measure(self, view, query, registration, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = self.request(view, query, registration)
+                timings.append((time.perf_counter() - started) * 1000)
+
+        return {'bytes': len(response.content), 'ms': statistics.median(timings), 'queries': len(queries),
+                'rows': len(response.data.get('results', []))}
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            started = time.perf_counter()
+            counts = seed_school(
+                prefix='benchmark', students=options['students'], sections=options['sections'],
+                subjects=options['subjects'], days=options['days'], assessments=options['assessments'],
+                chat_messages=0)
+            self.stdout.write(f'Seeded in {time.perf_counter() - started:.1f}s: ' + ', '.join(
+                f'{count} {name}' for name, count in counts.items()))
+
+            registration = Registration.objects.select_related('student__user', 'academic_year').filter(
+                section__name__startswith='benchmark ').first()
+            subject_id = Schedule.objects.filter(section_id=registration.section_id).values_list(
+                'subject_id', flat=True).first()
+
+            self.stdout.write(f'{"page":<22} {"variant":<10} {"rows":>5} {"bytes":>9} {"median ms":>10} '
+                              f'{"queries":>8}')
+            for page, view, query in PAGES:
+                for variant, extra in VARIANTS:
+                    result = self.measure(view, {**query(registration, subject_id), **extra,
+                                                 'page_size': options['page_size']},
+                                          registration, options['repeat'])
+                    self.stdout.write(f'{page:<22} {variant:<10} {result["rows"]:>5} {result["bytes"]:>9} '
+                                      f'{result["ms"]:>10.1f} {result["queries"]:>8}')
+
+            transaction.set_rollback(True)
@@ -0,0 +1,57 @@
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from aes.aes_implementation import decrypt, decrypt_qr, derive_key, encrypt, encrypt_qr
+
+
+class Command(BaseCommand):
+    help = 'Measure QR attendance scans per second for each decryption path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scans', type=int, default=50,
+                            help='Number of QR codes decrypted per path')
+        parser.add_argument('--students', type=int, default=40,
+                            help='Number of distinct students (QR codes) in the class')
+
+    def run(self, label, payloads, decrypt_payload, clear_cache=False):
+        derive_key.cache_clear()
+        started = time.perf_counter()
+        for payload in payloads:
+            if clear_cache:
+                derive_key.cache_clear()
+            decrypt_payload(payload)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'{label:<40} {len(payloads) / elapsed:>10.1f} scans/s '
+            f'{elapsed / len(payloads) * 1000:>8.2f} ms/scan')
+
+    def handle(self, *args, **options):
+        password = settings.AES_SECRET_KEY or 'benchmark-secret-key'
+        scans = options['scans']
+        students = [str(uuid.uuid4()) for _ in range(options['students'])]
+
+        legacy_codes = []
+        for student in students:
+            encrypted = encrypt(student, password)
+            legacy_codes.append(
+                f'{encrypted["cipher_text"]}${encrypted["salt"]}${encrypted["nonce"]}${encrypted["tag"]}')
+        v2_codes = [encrypt_qr(student, password) for student in students]
+
+        legacy_scans = [legacy_codes[index % len(legacy_codes)] for index in range(scans)]
+        v2_scans = [v2_codes[index % len(v2_codes)] for index in range(scans)]
+
+        def legacy_decrypt(payload):
+            cipher_text, salt, nonce, tag = payload.split('$')
+            return decrypt({'cipher_text': cipher_text, 'salt': salt, 'nonce': nonce, 'tag': tag}, password)
+
+        self.stdout.write(f'{scans} scans over {len(students)} students')
+        self.run('legacy, scrypt on every scan (before)', legacy_scans,
+                 legacy_decrypt, clear_cache=True)
+        self.run('legacy, cached key per salt', legacy_scans,
+                 lambda payload: decrypt_qr(payload, password))
+        self.run('v2, deployment salt (AES-GCM only)', v2_scans,
+                 lambda payload: decrypt_qr(payload, password))
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from academic_record.tasks import perform_end_of_day_tasks
+
+
+class Command(BaseCommand):
+    help = 'Mark students absent for the schedules due on a day, use --date/--until to backfill'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Day to process as YYYY-MM-DD, defaults to today')
+        parser.add_argument('--until', help='Process every day from --date up to this YYYY-MM-DD')
+
+    def parse_day(self, value, option):
+        day = parse_date(value) if value else None
+        if day is None:
+            raise CommandError(f'{option} must be a date formatted as YYYY-MM-DD')
+        return day
+
+    def handle(self, *args, **options):
+        if not options['date']:
+            if options['until']:
+                raise CommandError('--until requires --date')
+            days = [None]
+        else:
+            start = self.parse_day(options['date'], '--date')
+            end = self.parse_day(options['until'], '--until') if options['until'] else start
+            if end < start:
+                raise CommandError('--until must not be before --date')
+            days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+        for day in days:
+            report = perform_end_of_day_tasks(day)
+            self.stdout.write(
+                f"{report['date']}: {report['schedules']} schedules, {report['due']} due, "
+                f"{report['existing']} already recorded, {report['created']} marked absent "
+                f"in {report['seconds']:.2f}s")
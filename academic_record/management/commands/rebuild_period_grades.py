@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from academic_record.period_grade import rebuild_period_grades, verify_period_grades
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the PeriodGrade table from StudentAssessment and verify it matches. Run once after '
+            'migrating to academic_record 0029, signals keep the table current afterwards')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify-only', action='store_true',
+                            help='Only compare the stored rows against StudentAssessment')
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            started = time.monotonic()
+            count = rebuild_period_grades()
+            self.stdout.write(
+                f'Rebuilt {count} period grades in {time.monotonic() - started:.2f}s')
+
+        mismatches = verify_period_grades()
+        for key, stored_grade, expected_grade in mismatches[:20]:
+            student_id, subject_id, academic_year_id, grading_period = key
+            self.stderr.write(
+                f'student={student_id} subject={subject_id} academic_year={academic_year_id} '
+                f'{grading_period}: stored={stored_grade} expected={expected_grade}')
+
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} period grades do not match')
+
+        self.stdout.write(self.style.SUCCESS('Period grades match StudentAssessment'))
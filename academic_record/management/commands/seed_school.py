@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from academic_record.models import AcademicYear
+from academic_record.seed import SUBJECT_WEIGHTS, seed_school
+from core.benchmark import check_benchmark_database
+
+
+def subject_weights(value):
+    """
+        '30/50/20,40/40/20' -> [(30, 50, 20), (40, 40, 20)], written work,
+        performance task and quarterly assessment percentages of a subject.
+    """
+    weights = []
+    for weight in value.split(','):
+        parts = weight.split('/')
+        if len(parts) != 3 or not all(part.strip().isdigit() for part in parts):
+            raise CommandError(f'Invalid weights {weight!r}, use written/performance/quarterly e.g. 30/50/20')
+        weight = tuple(int(part) for part in parts)
+        if sum(weight) != 100:
+            raise CommandError(f'Weights {weight!r} do not add up to 100')
+        weights.append(weight)
+    return weights
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic school: sections, weighted subjects, schedules, students with '
+            'registrations and parents, assessments with marks, attendance history and chats')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='seed', help='Start of every seeded name, one run per prefix')
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--parents', type=int, default=None, help='Parent accounts, half the students by default')
+        parser.add_argument('--sections', type=int, default=25)
+        parser.add_argument('--subjects', type=int, default=8)
+        parser.add_argument('--weights', default=','.join('/'.join(map(str, weight)) for weight in SUBJECT_WEIGHTS),
+                            help='Grade weights cycled over the subjects, e.g. 30/50/20,40/40/20')
+        parser.add_argument('--days', type=int, default=20, help='School days of attendance')
+        parser.add_argument('--assessments', type=int, default=2, help='Assessments per type and grading period')
+        parser.add_argument('--chat-messages', type=int, default=20, help='Messages per chat session')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of marks and absences')
+        parser.add_argument('--force', action='store_true',
+                            help='Run against a database that is not a test one')
+
+    def handle(self, *args, **options):
+        # the seeded school is committed, with its fake users and passwords
+        check_benchmark_database(options['force'])
+        if AcademicYear.objects.filter(name__startswith=f'{options["prefix"]} ').exists():
+            raise CommandError(f'A school was already seeded with prefix {options["prefix"]!r}')
+
+        parents = options['parents']
+        started = time.perf_counter()
+        with transaction.atomic():
+            counts = seed_school(
+                prefix=options['prefix'], students=options['students'], sections=options['sections'],
+                subjects=options['subjects'], days=options['days'], assessments=options['assessments'],
+                chat_messages=options['chat_messages'], seed=options['seed'],
+                parents=options['students'] // 2 if parents is None else parents,
+                weights=subject_weights(options['weights']))
+
+        self.stdout.write(f'Seeded in {time.perf_counter() - started:.1f}s: ' + ', '.join(
+            f'{count} {name}' for name, count in counts.items()))
@@ -0,0 +1,39 @@
+# Generated by Django 3.2 on 2026-10-18 13:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_profile', '0006_admin'),
+        ('class_information', '0006_auto_20240501_2202'),
+        ('academic_record', '0028_alter_assessment_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodGrade',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('grading_period', models.CharField(choices=[('FIRST_GRADING', 'First Grading'), ('SECOND_GRADING', 'Second Grading'), ('THIRD_GRADING', 'Third Grading'), ('FOURTH_GRADING', 'Fourth Grading')], default='FIRST_GRADING', max_length=255)),
+                ('written_works_total', models.DecimalField(decimal_places=20, default=0, max_digits=28)),
+                ('written_works_count', models.PositiveIntegerField(default=0)),
+                ('performance_task_total', models.DecimalField(decimal_places=20, default=0, max_digits=28)),
+                ('performance_task_count', models.PositiveIntegerField(default=0)),
+                ('quarterly_assessment_total', models.DecimalField(decimal_places=20, default=0, max_digits=28)),
+                ('quarterly_assessment_count', models.PositiveIntegerField(default=0)),
+                ('grade', models.CharField(default='N/A', max_length=10)),
+                ('academic_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='academic_record.academicyear')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='user_profile.student')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='class_information.subject')),
+            ],
+            options={
+                'unique_together': {('student', 'subject', 'academic_year', 'grading_period')},
+            },
+        ),
+    ]
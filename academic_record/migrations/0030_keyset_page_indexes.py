@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 13:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic_record', '0029_periodgrade'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['student', '-attendance_date', '-time_in', '-id'], name='attendance_student_page_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2 on 2026-10-18 13:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic_record', '0030_keyset_page_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assessment',
+            index=models.Index(fields=['academic_year', 'grading_period', 'subject', 'teacher'], name='assessment_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['student', 'schedule', 'attendance_date'], name='attendance_student_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['academic_year', 'section'], name='schedule_year_section_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='schedule',
+            index=models.Index(fields=['teacher', 'academic_year'], name='schedule_teacher_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentassessment',
+            index=models.Index(fields=['student', 'assessment'], name='student_assessment_student_idx'),
+        ),
+    ]
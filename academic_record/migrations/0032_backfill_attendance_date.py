@@ -0,0 +1,30 @@
+# Generated by Django 3.2 on 2026-10-18 13:59
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def backfill_attendance_date(apps, schema_editor):
+    # time_in__date lookups now read attendance_date, rows created before
+    # attendance_date existed carry the date of that migration instead
+    Attendance = apps.get_model('academic_record', 'Attendance')
+    changed = []
+
+    for attendance in Attendance.objects.exclude(time_in=None).only('time_in', 'attendance_date').iterator():
+        local_date = timezone.localtime(attendance.time_in).date()
+        if attendance.attendance_date != local_date:
+            attendance.attendance_date = local_date
+            changed.append(attendance)
+
+    Attendance.objects.bulk_update(changed, ['attendance_date'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academic_record', '0031_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_attendance_date, migrations.RunPython.noop),
+    ]
@@ -34,6 +34,12 @@ class Schedule(BaseModelWithUUID):
     time_end = models.TimeField()
     is_view_grade = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['academic_year', 'section'], name='schedule_year_section_idx'),
+            models.Index(fields=['teacher', 'academic_year'], name='schedule_teacher_year_idx'),
+        ]
+
     def __str__(self):
         return f'{self.day} {self.time_start} - {self.time_end} {self.subject.name} - {self.teacher.user.last_name} {self.teacher.user.first_name}'
 
@@ -69,6 +75,12 @@ class Assessment(BaseModelWithUUID):
     grading_period = models.CharField(
         max_length=255, choices=GRADING_PERIOD_CHOICES, default="FIRST_GRADING")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['academic_year', 'grading_period', 'subject', 'teacher'],
+                         name='assessment_period_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -80,6 +92,10 @@ class StudentAssessment(BaseModelWithUUID):
 
     class Meta:
         unique_together = ['assessment', 'student',]
+        indexes = [
+            # the unique index leads with assessment, grade lookups start from the student
+            models.Index(fields=['student', 'assessment'], name='student_assessment_student_idx'),
+        ]
 
     def __str__(self):
         return f'{self.assessment.name} - {self.student.user.last_name}, {self.student.user.first_name}'
@@ -93,5 +109,46 @@ class Attendance(BaseModelWithUUID):
     is_present = models.BooleanField(default=False)
     attendance_date = models.DateField(default=date.today)
 
+    class Meta:
+        indexes = [
+            # keyset pages of a student's attendance history
+            models.Index(fields=['student', '-attendance_date', '-time_in', '-id'],
+                         name='attendance_student_page_idx'),
+            # one day of a student for a schedule, attendance_date stands in for time_in::date
+            models.Index(fields=['student', 'schedule', 'attendance_date'],
+                         name='attendance_student_day_idx'),
+        ]
+
     def __str__(self):
         return f'{self.student.user.last_name} {self.student.user.first_name} - {self.is_present}'
+
+
+class PeriodGrade(BaseModelWithUUID):
+    """
+        Materialized grade of one student for one subject and grading period.
+        Holds the partial sums (obtained_marks / max_marks) and counts per
+        assessment_type so rows can be checked against StudentAssessment,
+        and the computed grade so reads do not touch raw marks.
+    """
+    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
+    academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE)
+    grading_period = models.CharField(
+        max_length=255, choices=Assessment.GRADING_PERIOD_CHOICES, default="FIRST_GRADING")
+    written_works_total = models.DecimalField(
+        max_digits=28, decimal_places=20, default=0)
+    written_works_count = models.PositiveIntegerField(default=0)
+    performance_task_total = models.DecimalField(
+        max_digits=28, decimal_places=20, default=0)
+    performance_task_count = models.PositiveIntegerField(default=0)
+    quarterly_assessment_total = models.DecimalField(
+        max_digits=28, decimal_places=20, default=0)
+    quarterly_assessment_count = models.PositiveIntegerField(default=0)
+    grade = models.CharField(max_length=10, default='N/A')
+
+    class Meta:
+        unique_together = ['student', 'subject',
+                           'academic_year', 'grading_period']
+
+    def __str__(self):
+        return f'{self.student} - {self.subject.name} {self.grading_period}: {self.grade}'
@@ -3,7 +3,8 @@ from rest_framework import generics, permissions, response, status, exceptions
 
 from core.paginate import ExtraSmallResultsSetPagination
 from .serializers import ParentStudentListSerializers
-from .models import Schedule, AcademicYear
+from academic_record.academic_year import current_academic_year
+from .models import Schedule
 from registration.models import Registration
 
 
@@ -14,11 +15,10 @@ class ParentStudentListView(generics.RetrieveAPIView):
     pagination_class = ExtraSmallResultsSetPagination
 
     def get_queryset(self):
-        academic_years = AcademicYear.objects.all()
+        current_academic = current_academic_year(self.request)
 
-        if academic_years.exists():
+        if current_academic:
             user = self.request.user
-            current_academic = academic_years.first()
             register_users = Registration.objects.filter(
                 academic_year=current_academic, student__user__pk=user.pk)
 
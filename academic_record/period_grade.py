@@ -0,0 +1,169 @@
+from decimal import Decimal
+
+from django.db import transaction
+
+from academic_record.grade_engine import (GRADING_PERIODS, MARK_FIELDS, add_mark, calculate_buckets,
+                                          calculate_total_gpa, empty_buckets)
+from .models import PeriodGrade, StudentAssessment
+
+# assessment_type -> PeriodGrade column prefix
+TOTAL_FIELDS = {
+    'WRITTEN_WORKS': 'written_works',
+    'PERFORMANCE_TASK': 'performance_task',
+    'QUARTERLY_ASSESSMENT': 'quarterly_assessment',
+}
+
+BATCH_SIZE = 500
+
+# partial sums go through float on SQLite, grades and counts must match exactly
+TOTAL_TOLERANCE = Decimal('1e-12')
+
+
+def collect_period_marks(student_assessments):
+    """
+        Reduce a StudentAssessment queryset to
+        {(student_id, subject_id, academic_year_id, grading_period): buckets}
+        in one query, buckets being the same shape grade_engine uses.
+    """
+    marks = {}
+    rows = student_assessments.order_by('created_at').values_list(
+        'assessment__subject_id', 'assessment__academic_year_id', *MARK_FIELDS)
+
+    for row in rows.iterator():
+        subject_id, academic_year_id, student_id, grading_period = row[:4]
+        key = (student_id, subject_id, academic_year_id, grading_period)
+        add_mark(marks.setdefault(key, empty_buckets()), row[2:])
+
+    return marks
+
+
+def build_period_grade(key, buckets):
+    student_id, subject_id, academic_year_id, grading_period = key
+    period_grade = PeriodGrade(
+        student_id=student_id, subject_id=subject_id,
+        academic_year_id=academic_year_id, grading_period=grading_period,
+        grade=calculate_buckets(buckets))
+
+    for assessment_type, prefix in TOTAL_FIELDS.items():
+        obtained_marks = buckets[assessment_type]['obtained_marks']
+        setattr(period_grade, f'{prefix}_total', sum(obtained_marks))
+        setattr(period_grade, f'{prefix}_count', len(obtained_marks))
+
+    return period_grade
+
+
+def refresh_period_grades(subject_id, academic_year_id=None, grading_period=None, student_ids=None):
+    """
+        Recompute the PeriodGrade rows of a subject, optionally narrowed down to
+        an academic year, a grading period and some students. Only the touched
+        rows are rewritten, the raw marks behind them are read in one query.
+    """
+    student_assessments = StudentAssessment.objects.filter(
+        assessment__subject_id=subject_id)
+    period_grades = PeriodGrade.objects.filter(subject_id=subject_id)
+
+    if academic_year_id:
+        student_assessments = student_assessments.filter(
+            assessment__academic_year_id=academic_year_id)
+        period_grades = period_grades.filter(academic_year_id=academic_year_id)
+
+    if grading_period:
+        student_assessments = student_assessments.filter(
+            assessment__grading_period=grading_period)
+        period_grades = period_grades.filter(grading_period=grading_period)
+
+    if student_ids is not None:
+        student_assessments = student_assessments.filter(
+            student_id__in=student_ids)
+        period_grades = period_grades.filter(student_id__in=student_ids)
+
+    marks = collect_period_marks(student_assessments)
+
+    with transaction.atomic():
+        period_grades.delete()
+        PeriodGrade.objects.bulk_create(
+            [build_period_grade(key, buckets)
+             for key, buckets in marks.items()],
+            batch_size=BATCH_SIZE)
+
+
+def refresh_assessment_period_grades(assessment, student_ids=None):
+    if student_ids is None:
+        student_ids = list(StudentAssessment.objects.filter(
+            assessment=assessment).values_list('student_id', flat=True))
+
+    refresh_period_grades(assessment.subject_id, assessment.academic_year_id,
+                          assessment.grading_period, student_ids)
+
+
+def rebuild_period_grades():
+    """
+        Drop and rebuild every PeriodGrade row from StudentAssessment.
+        Returns the number of rows written.
+    """
+    marks = collect_period_marks(StudentAssessment.objects.all())
+
+    with transaction.atomic():
+        PeriodGrade.objects.all().delete()
+        PeriodGrade.objects.bulk_create(
+            [build_period_grade(key, buckets)
+             for key, buckets in marks.items()],
+            batch_size=BATCH_SIZE)
+
+    return len(marks)
+
+
+def verify_period_grades():
+    """
+        Compare the stored rows with a fresh computation from StudentAssessment.
+        Returns a list of (key, stored grade, expected grade) mismatches.
+    """
+    marks = collect_period_marks(StudentAssessment.objects.all())
+    expected = {key: build_period_grade(key, buckets)
+                for key, buckets in marks.items()}
+    compared_fields = ['grade'] + [f'{prefix}_{suffix}' for prefix in TOTAL_FIELDS.values()
+                                   for suffix in ('total', 'count')]
+
+    mismatches = []
+    stored_keys = set()
+    for period_grade in PeriodGrade.objects.all().iterator():
+        key = (period_grade.student_id, period_grade.subject_id,
+               period_grade.academic_year_id, period_grade.grading_period)
+        stored_keys.add(key)
+        expected_grade = expected.get(key)
+
+        if expected_grade is None:
+            mismatches.append((key, period_grade.grade, None))
+            continue
+
+        for field in compared_fields:
+            stored_value = getattr(period_grade, field)
+            expected_value = getattr(expected_grade, field)
+            if field.endswith('_total'):
+                is_equal = abs(stored_value - expected_value) <= TOTAL_TOLERANCE
+            else:
+                is_equal = stored_value == expected_value
+
+            if not is_equal:
+                mismatches.append((key, period_grade.grade, expected_grade.grade))
+                break
+
+    for key in expected.keys() - stored_keys:
+        mismatches.append((key, None, expected[key].grade))
+
+    return mismatches
+
+
+def student_period_grades(student_id, subject_id, academic_year_id):
+    """
+        Over-all grades of a student for a subject read from PeriodGrade,
+        same shape as grade_engine.calculate_student_grades.
+    """
+    grades = dict(PeriodGrade.objects.filter(
+        student_id=student_id, subject_id=subject_id, academic_year_id=academic_year_id).values_list(
+        'grading_period', 'grade'))
+
+    data = {grading_period.lower(): grades.get(grading_period, 'N/A')
+            for grading_period in GRADING_PERIODS}
+    data['total_gpa'] = calculate_total_gpa(data.values())
+    return data
@@ -0,0 +1,144 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from aes.aes_implementation import decrypt_qr
+from academic_record.academic_year import current_academic_year
+from academic_record.uuid_checker import is_valid_uuid
+from registration.models import Registration
+from user_profile.models import PushEvent
+from user_profile.push import push_queue
+from .models import Attendance, Schedule
+
+# scrypt of legacy codes releases the GIL, threads are enough here
+MAX_DECRYPT_WORKERS = 8
+
+CREATED = 'created'
+ALREADY_TIMED_IN = 'already_timed_in'
+INVALID = 'invalid'
+NOT_REGISTERED = 'not_registered'
+NO_SCHEDULE = 'no_schedule'
+
+
+def decrypt_student_id(payload):
+    try:
+        student_id = bytes.decode(decrypt_qr(payload or '', settings.AES_SECRET_KEY))
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+    # registrations are matched on the canonical uuid string
+    return str(uuid.UUID(student_id)) if is_valid_uuid(student_id) else None
+
+
+def decrypt_student_ids(payloads):
+    if not payloads:
+        return []
+
+    workers = min(MAX_DECRYPT_WORKERS, len(payloads))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(decrypt_student_id, payloads))
+
+
+def parse_scanned_at(value, now=None):
+    """
+        Time of an offline scan. Missing or unreadable times, and times
+        further back than QR_SCAN_MAX_AGE or ahead of the server clock by
+        more than QR_SCAN_MAX_FUTURE seconds, fall back to the server time.
+    """
+    now = now or timezone.now()
+    try:
+        scanned_at = parse_datetime(value) if isinstance(value, str) else None
+    except ValueError:
+        scanned_at = None
+    if scanned_at is None:
+        return now
+
+    if timezone.is_naive(scanned_at):
+        scanned_at = timezone.make_aware(scanned_at)
+
+    max_age = timedelta(seconds=getattr(settings, 'QR_SCAN_MAX_AGE', 86400))
+    max_future = timedelta(seconds=getattr(settings, 'QR_SCAN_MAX_FUTURE', 300))
+    if not now - max_age <= scanned_at <= now + max_future:
+        return now
+    return scanned_at
+
+
+def ingest_scans(teacher_user, scans):
+    """
+        Time in a batch of offline QR scans of one teacher.
+        scans: [{"student": "<encrypted qr>", "scanned_at": "<iso datetime>"}]
+        Returns one result per scan, in order. Students, schedules and the
+        existing attendance are resolved with one query each and the new
+        rows are written with a single bulk_create.
+    """
+    student_ids = decrypt_student_ids([scan.get('student') for scan in scans])
+    now = timezone.now()
+    scanned_ats = [parse_scanned_at(scan.get('scanned_at'), now) for scan in scans]
+    results = [{'index': index, 'status': INVALID}
+               for index in range(len(scans))]
+
+    academic_year = current_academic_year()
+    valid_ids = {student_id for student_id in student_ids if student_id}
+
+    if academic_year is None or not valid_ids:
+        return results
+
+    # student_id -> section_id
+    register_sections = {str(student_id): section_id for student_id, section_id in Registration.objects.filter(
+        student__pk__in=valid_ids, academic_year=academic_year).values_list('student_id', 'section_id')}
+
+    # section_id -> first schedule of the teacher, same pick as the single scan
+    section_schedules = {}
+    for schedule in Schedule.objects.filter(
+            teacher__user__pk=teacher_user.pk, section__pk__in=set(register_sections.values())).order_by('pk'):
+        section_schedules.setdefault(schedule.section_id, schedule)
+
+    scan_dates = {timezone.localtime(scanned_at).date() for scanned_at in scanned_ats}
+    timed_in = {
+        (str(student_id), schedule_id, attendance_date)
+        for student_id, schedule_id, attendance_date in Attendance.objects.filter(
+            student__pk__in=register_sections.keys(),
+            schedule__in=section_schedules.values(),
+            attendance_date__in=scan_dates, time_in__isnull=False).values_list(
+                'student_id', 'schedule_id', 'attendance_date')
+    }
+
+    attendances = []
+    for index, (student_id, scanned_at) in enumerate(zip(student_ids, scanned_ats)):
+        if not student_id:
+            continue
+
+        if student_id not in register_sections:
+            results[index]['status'] = NOT_REGISTERED
+            continue
+
+        schedule = section_schedules.get(register_sections[student_id])
+        if schedule is None:
+            results[index]['status'] = NO_SCHEDULE
+            continue
+
+        results[index]['student_id'] = student_id
+        results[index]['schedule_id'] = str(schedule.pk)
+        key = (student_id, schedule.pk, timezone.localtime(scanned_at).date())
+
+        if key in timed_in:
+            results[index]['status'] = ALREADY_TIMED_IN
+            continue
+
+        timed_in.add(key)
+        attendance = Attendance(
+            student_id=student_id, schedule=schedule, is_present=True,
+            time_in=scanned_at, attendance_date=key[2])
+        attendances.append(attendance)
+        results[index]['status'] = CREATED
+        results[index]['attendance_id'] = str(attendance.pk)
+
+    Attendance.objects.bulk_create(attendances)
+    # bulk_create skips post_save, tell the students and parents here
+    push_queue.enqueue([attendance.student_id for attendance in attendances], PushEvent.ATTENDANCE)
+
+    return results
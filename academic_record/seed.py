@@ -0,0 +1,171 @@
+import random
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from itertools import cycle
+
+from django.utils import timezone
+
+from base.models import User
+from chat.models import ChatMessage, ChatSession
+from class_information.models import Department, Section, Subject
+from registration.models import Registration
+from user_profile.models import Parent, Student, Teacher
+from .models import AcademicYear, Assessment, Attendance, PeriodGrade, Schedule, StudentAssessment
+from .period_grade import build_period_grade, collect_period_marks
+
+BATCH_SIZE = 1000
+SCHOOL_DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+# classes a teacher handles
+CLASSES_PER_TEACHER = 6
+# (written work, performance task, quarterly assessment) percentages, cycled over the subjects
+SUBJECT_WEIGHTS = [(30, 50, 20)]
+ABSENT_RATE = 0.1
+
+
+def school_days(start_date, days):
+    current = start_date
+    while days:
+        if current.weekday() < len(SCHOOL_DAYS):
+            yield current
+            days -= 1
+        current += timedelta(days=1)
+
+
+def create_users(prefix, role, count):
+    users = [User(username=f'{prefix}-{role}-{index}', email=f'{prefix}-{role}-{index}@example.com',
+                  first_name=f'{role.title()} {index}', last_name=prefix.title(), password='!',
+                  is_new_user=False)
+             for index in range(count)]
+    User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+    return users
+
+
+def seed_school(prefix='seed', students=1000, sections=25, subjects=8, days=20, assessments=2,
+                chat_messages=20, seed=0, parents=0, weights=SUBJECT_WEIGHTS):
+    """
+        Bulk load a synthetic school: one academic year, sections with a
+        schedule per subject, registered students, attendance for the given
+        number of school days, graded assessments and teacher chats.
+        Students are shared round robin by the parents accounts, subjects
+        take their grade weights from weights in turn.
+        Usernames start with prefix so a second run needs another prefix.
+        Returns the number of rows created per model.
+    """
+    rng = random.Random(seed)
+    start_date = date(2024, 6, 3)
+
+    academic_year = AcademicYear.objects.create(
+        name=f'{prefix} 2024-2025', start_date=start_date, end_date=date(2025, 3, 28))
+    department = Department.objects.create(name=f'{prefix} Department', code=prefix[:50])
+
+    subject_rows = [Subject(name=f'Subject {index}', code=f'S{index}'[:10], department=department,
+                            written_work=weight[0], performance_task=weight[1], quartery_assessment=weight[2])
+                    for index, weight in zip(range(subjects), cycle(weights))]
+    Subject.objects.bulk_create(subject_rows)
+    section_rows = [Section(name=f'{prefix} Section {index}',
+                            year_level=Student.YEAR_LEVEL_CHOICES[index % 6][0])
+                    for index in range(sections)]
+    Section.objects.bulk_create(section_rows)
+
+    teacher_count = max(subjects, sections * subjects // CLASSES_PER_TEACHER)
+    teachers = [Teacher(user=user, department=department, address='Manila',
+                        contact_number=f'0917{index:07d}', age=30 + index % 25)
+                for index, user in enumerate(create_users(prefix, 'teacher', teacher_count))]
+    Teacher.objects.bulk_create(teachers, batch_size=BATCH_SIZE)
+
+    schedules = []
+    for section_index, section in enumerate(section_rows):
+        for subject_index, subject in enumerate(subject_rows):
+            schedules.append(Schedule(
+                academic_year=academic_year, subject=subject, section=section,
+                teacher=teachers[(section_index * subjects + subject_index) % teacher_count],
+                day=SCHOOL_DAYS[(section_index + subject_index) % len(SCHOOL_DAYS)],
+                time_start=time(7 + subject_index % 10), time_end=time(8 + subject_index % 10),
+                is_view_grade=True))
+    Schedule.objects.bulk_create(schedules, batch_size=BATCH_SIZE)
+
+    parent_rows = [Parent(user=user, address='Manila', contact_number=f'0919{index:07d}', age=35 + index % 20)
+                   for index, user in enumerate(create_users(prefix, 'parent', parents))]
+    Parent.objects.bulk_create(parent_rows, batch_size=BATCH_SIZE)
+
+    student_rows = [Student(user=user, address='Manila', contact_number=f'0918{index:07d}',
+                            age=12 + index % 6, gender='M' if index % 2 else 'F',
+                            year_level=section_rows[index % sections].year_level,
+                            parent=parent_rows[index % parents] if parents else None)
+                    for index, user in enumerate(create_users(prefix, 'student', students))]
+    Student.objects.bulk_create(student_rows, batch_size=BATCH_SIZE)
+
+    registrations = [Registration(student=student, section=section_rows[index % sections],
+                                  academic_year=academic_year)
+                     for index, student in enumerate(student_rows)]
+    Registration.objects.bulk_create(registrations, batch_size=BATCH_SIZE)
+
+    section_students = {}
+    for registration in registrations:
+        section_students.setdefault(registration.section_id, []).append(registration.student)
+
+    attendances = []
+    for day in school_days(start_date, days):
+        weekday = SCHOOL_DAYS[day.weekday()]
+        for schedule in schedules:
+            if schedule.day != weekday:
+                continue
+            time_in = timezone.make_aware(datetime.combine(day, schedule.time_start))
+            for student in section_students.get(schedule.section_id, []):
+                is_present = rng.random() >= ABSENT_RATE
+                attendances.append(Attendance(
+                    student=student, schedule=schedule, is_present=is_present,
+                    time_in=time_in + timedelta(minutes=rng.randint(0, 10)) if is_present else None,
+                    time_out=time_in + timedelta(hours=1) if is_present else None,
+                    attendance_date=day))
+    Attendance.objects.bulk_create(attendances, batch_size=BATCH_SIZE)
+
+    assessment_types = [assessment_type for assessment_type, _ in Assessment.ASSESSMENT_TYPE_CHOICES]
+    assessment_rows = []
+    assessment_sections = []
+    for schedule in schedules:
+        for grading_period, _ in Assessment.GRADING_PERIOD_CHOICES:
+            for assessment_type in assessment_types:
+                for index in range(assessments):
+                    assessment_rows.append(Assessment(
+                        academic_year=academic_year, subject=schedule.subject, teacher=schedule.teacher,
+                        name=f'{assessment_type.title()} {index + 1}', assessment_type=assessment_type,
+                        max_marks=Decimal(50), grading_period=grading_period))
+                    assessment_sections.append(schedule.section_id)
+    Assessment.objects.bulk_create(assessment_rows, batch_size=BATCH_SIZE)
+
+    student_assessments = [
+        StudentAssessment(assessment=assessment, student=student,
+                          obtained_marks=Decimal(rng.randint(25, 50)))
+        for assessment, section_id in zip(assessment_rows, assessment_sections)
+        for student in section_students.get(section_id, [])
+    ]
+    StudentAssessment.objects.bulk_create(student_assessments, batch_size=BATCH_SIZE)
+    # bulk inserts skip the signals that keep PeriodGrade up to date
+    period_grades = [build_period_grade(key, buckets) for key, buckets in collect_period_marks(
+        StudentAssessment.objects.filter(assessment__academic_year=academic_year)).items()]
+    PeriodGrade.objects.bulk_create(period_grades, batch_size=BATCH_SIZE)
+
+    chat_sessions = [ChatSession(room_name=f'{prefix}-room-{index}', teacher=teacher.user,
+                                 person=student_rows[index % students].user)
+                     for index, teacher in enumerate(teachers)] if students else []
+    ChatSession.objects.bulk_create(chat_sessions, batch_size=BATCH_SIZE)
+    sent_at = timezone.make_aware(datetime.combine(start_date, time(15)))
+    messages = [ChatMessage(chat_session=chat_session, message=f'Message {index}',
+                            user=chat_session.teacher if index % 2 else chat_session.person,
+                            timestamp=sent_at + timedelta(minutes=index))
+                for chat_session in chat_sessions for index in range(chat_messages)]
+    ChatMessage.objects.bulk_create(messages, batch_size=BATCH_SIZE)
+
+    return {
+        'teachers': len(teachers),
+        'sections': len(section_rows),
+        'schedules': len(schedules),
+        'students': len(student_rows),
+        'parents': len(parent_rows),
+        'attendances': len(attendances),
+        'assessments': len(assessment_rows),
+        'student_assessments': len(student_assessments),
+        'period_grades': len(period_grades),
+        'chat_messages': len(messages),
+    }
@@ -2,19 +2,28 @@ from datetime import datetime
 from rest_framework import serializers
 
 from class_information.serializers import SectionSerializers, SubjectSerializers
+from core.sparse_fields import SparseFieldsMixin
 from user_profile.models import Parent
 from user_profile.serializers import StudentSerializer, TeacherSerializer
 from .models import AcademicYear, Schedule, Attendance, Assessment, StudentAssessment
 from registration.models import Registration
 
 
-class AcademicYearSerializers(serializers.Serializer):
+class AcademicYearSerializers(SparseFieldsMixin, serializers.Serializer):
     class Meta:
         model = AcademicYear
         exclude = ['created_at', 'updated_at']
 
 
-class TeacherScheduleSerialzers(serializers.ModelSerializer):
+# relations walked by the nested serializers below, for select_related
+SCHEDULE_RELATED_FIELDS = ['subject__department', 'academic_year', 'section']
+STUDENT_SCHEDULE_RELATED_FIELDS = SCHEDULE_RELATED_FIELDS + ['teacher__user']
+ATTENDANCE_RELATED_FIELDS = [f'schedule__{field}' for field in STUDENT_SCHEDULE_RELATED_FIELDS] + ['student__user']
+ASSESSMENT_RELATED_FIELDS = ['academic_year', 'teacher__user', 'subject__department']
+STUDENT_ASSESSMENT_RELATED_FIELDS = [f'assessment__{field}' for field in ASSESSMENT_RELATED_FIELDS] + ['student__user']
+
+
+class TeacherScheduleSerialzers(SparseFieldsMixin, serializers.ModelSerializer):
     subject = SubjectSerializers()
     academic_year = AcademicYearSerializers()
     section = SectionSerializers()
@@ -24,7 +33,7 @@ class TeacherScheduleSerialzers(serializers.ModelSerializer):
         exclude = ['created_at', 'updated_at']
 
 
-class StudentScheduleSerialzers(serializers.ModelSerializer):
+class StudentScheduleSerialzers(SparseFieldsMixin, serializers.ModelSerializer):
     subject = SubjectSerializers()
     academic_year = AcademicYearSerializers()
     teacher = TeacherSerializer()
@@ -35,7 +44,7 @@ class StudentScheduleSerialzers(serializers.ModelSerializer):
         exclude = ['created_at', 'updated_at']
 
 
-class AttendanceSerializers(serializers.ModelSerializer):
+class AttendanceSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     schedule = StudentScheduleSerialzers(read_only=True)
     student = StudentSerializer(read_only=True)
 
@@ -44,7 +53,7 @@ class AttendanceSerializers(serializers.ModelSerializer):
         exclude = ['created_at', 'updated_at']
 
 
-class AssessmentSerializers(serializers.ModelSerializer):
+class AssessmentSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     academic_year = AcademicYearSerializers()
     teacher = TeacherSerializer()
     subject = SubjectSerializers()
@@ -54,7 +63,7 @@ class AssessmentSerializers(serializers.ModelSerializer):
         exclude = ['updated_at']
 
 
-class StudentAssessmentSerializers(serializers.ModelSerializer):
+class StudentAssessmentSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     assessment = AssessmentSerializers()
     student = StudentSerializer()
 
@@ -70,7 +79,7 @@ class StudentAssessmentSerializers(serializers.ModelSerializer):
         super(StudentAssessmentSerializers, self).__init__(*args, **kwargs)
 
 
-class TeacherChatSerialzers(serializers.ModelSerializer):
+class TeacherChatSerialzers(SparseFieldsMixin, serializers.ModelSerializer):
     teacher = TeacherSerializer()
 
     class Meta:
@@ -87,12 +96,14 @@ class TeacherChatSerialzers(serializers.ModelSerializer):
         data = super(TeacherChatSerialzers,
                      self).to_representation(instance)
 
-        department_id = data['teacher']['department']
-        data['teacher']['department'] = str(department_id)
+        # the teacher is a bare id with ?expand= or ?fields= leaving it out
+        teacher = data.get('teacher')
+        if isinstance(teacher, dict) and 'department' in teacher:
+            teacher['department'] = str(teacher['department'])
         return data
 
 
-class StudentRegisterSerializers(serializers.ModelSerializer):
+class StudentRegisterSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     student = StudentSerializer(read_only=True)
 
     class Meta:
@@ -100,7 +111,7 @@ class StudentRegisterSerializers(serializers.ModelSerializer):
         fields = ['student',]
 
 
-class TimeOutSerializers(serializers.ModelSerializer):
+class TimeOutSerializers(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Attendance
@@ -108,7 +119,7 @@ class TimeOutSerializers(serializers.ModelSerializer):
                   'is_present', 'attendance_date',]
 
 
-class TimeOutAttendanceSerializers(serializers.ModelSerializer):
+class TimeOutAttendanceSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     student = StudentSerializer(read_only=True)
     student_ids = serializers.ListField(write_only=True)
 
@@ -130,6 +141,13 @@ class TimeOutAttendanceSerializers(serializers.ModelSerializer):
     def to_representation(self, instance):
         data = super(TimeOutAttendanceSerializers,
                      self).to_representation(instance)
+        attendances = self.context.get('attendances', None)
+        if attendances is not None:
+            # rows already loaded by the bulk time out
+            attendance = attendances.get(str(instance.student_id))
+            data['attendance'] = TimeOutSerializers(attendance).data if attendance else None
+            return data
+
         if self.request:
             schedule_id = ''
 
@@ -144,10 +162,9 @@ class TimeOutAttendanceSerializers(serializers.ModelSerializer):
             schedule = Schedule.objects.get(pk=schedule_id)
 
             if "student" in data:
-                student = data['student']
                 current_date = datetime.now()
                 attendances = Attendance.objects.filter(
-                    student__pk=student['pk'], attendance_date=current_date, schedule=schedule,)
+                    student__pk=instance.student_id, attendance_date=current_date, schedule=schedule,)
 
                 attendace = None
 
@@ -158,7 +175,7 @@ class TimeOutAttendanceSerializers(serializers.ModelSerializer):
         return data
 
 
-class ParentStudentListSerializers(serializers.ModelSerializer):
+class ParentStudentListSerializers(SparseFieldsMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Parent
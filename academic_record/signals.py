@@ -0,0 +1,72 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from academic_record.period_grade import refresh_assessment_period_grades, refresh_period_grades
+from class_information.models import Subject
+from user_profile.models import PushEvent
+from user_profile.push import push_queue
+from .models import Assessment, Attendance, StudentAssessment
+
+# Assessment fields that move a mark to another PeriodGrade row or change its value
+ASSESSMENT_GRADE_FIELDS = ['subject_id', 'academic_year_id',
+                           'grading_period', 'assessment_type', 'max_marks']
+SUBJECT_WEIGHT_FIELDS = ['written_work',
+                         'performance_task', 'quartery_assessment']
+
+
+@receiver(post_save, sender=StudentAssessment)
+@receiver(post_delete, sender=StudentAssessment)
+def refresh_student_assessment_period_grade(sender, instance, **kwargs):
+    assessment = Assessment.objects.filter(pk=instance.assessment_id).first()
+
+    if assessment:
+        refresh_assessment_period_grades(
+            assessment, student_ids=[instance.student_id])
+
+
+@receiver(post_save, sender=StudentAssessment)
+def push_student_assessment(sender, instance, **kwargs):
+    push_queue.enqueue([instance.student_id], PushEvent.GRADES)
+
+
+@receiver(post_save, sender=Attendance)
+def push_attendance(sender, instance, **kwargs):
+    # a time in, a time out or an absence
+    push_queue.enqueue([instance.student_id], PushEvent.ATTENDANCE)
+
+
+@receiver(pre_save, sender=Assessment)
+def remember_assessment_grade_fields(sender, instance, **kwargs):
+    instance._previous_assessment = Assessment.objects.filter(
+        pk=instance.pk).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Assessment)
+def refresh_assessment_period_grade(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_assessment', None)
+
+    if created or previous is None:
+        return
+
+    if all(getattr(previous, field) == getattr(instance, field) for field in ASSESSMENT_GRADE_FIELDS):
+        return
+
+    student_ids = list(StudentAssessment.objects.filter(
+        assessment=instance).values_list('student_id', flat=True))
+    refresh_assessment_period_grades(previous, student_ids)
+    refresh_assessment_period_grades(instance, student_ids)
+
+
+@receiver(pre_save, sender=Subject)
+def remember_subject_weights(sender, instance, **kwargs):
+    instance._previous_weights = Subject.objects.filter(
+        pk=instance.pk).values_list(*SUBJECT_WEIGHT_FIELDS).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Subject)
+def refresh_subject_period_grade(sender, instance, created, **kwargs):
+    previous_weights = getattr(instance, '_previous_weights', None)
+    weights = tuple(getattr(instance, field) for field in SUBJECT_WEIGHT_FIELDS)
+
+    if not created and previous_weights is not None and previous_weights != weights:
+        refresh_period_grades(instance.pk)
@@ -1,12 +1,15 @@
 from decimal import Decimal
 from rest_framework import generics, permissions, response, status, exceptions
 
-from academic_record.gpa_caluclate import gpa_calculate
-from core.paginate import ExtraSmallResultsSetPagination
+from academic_record.academic_year import current_academic_year
+from academic_record.period_grade import student_period_grades
+from core.eager_loading import EagerLoadingMixin
+from core.paginate import ExtraSmallResultsSetPagination, KeysetPagination
 from user_profile.models import Parent
 from .serializers import (StudentScheduleSerialzers,
-                          AttendanceSerializers, StudentAssessmentSerializers, TeacherChatSerialzers)
-from .models import Schedule, AcademicYear, Attendance, StudentAssessment
+                          AttendanceSerializers, StudentAssessmentSerializers, TeacherChatSerialzers,
+                          ATTENDANCE_RELATED_FIELDS, STUDENT_ASSESSMENT_RELATED_FIELDS, STUDENT_SCHEDULE_RELATED_FIELDS)
+from .models import Schedule, Attendance, StudentAssessment
 from class_information.models import Subject
 from registration.models import Registration
 from rest_framework.views import APIView
@@ -16,19 +19,19 @@ from django.db.models import Q
 from django.shortcuts import get_object_or_404
 
 
-class StudentScheduleListView(generics.ListAPIView):
+class StudentScheduleListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = StudentScheduleSerialzers
     queryset = Schedule.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    select_related_fields = STUDENT_SCHEDULE_RELATED_FIELDS
     pagination_class = ExtraSmallResultsSetPagination
 
     def get_queryset(self):
-        academic_years = AcademicYear.objects.all()
+        current_academic = current_academic_year(self.request)
         student_id = self.request.GET.get('student_id', None)
 
-        if academic_years.exists():
+        if current_academic:
             user = self.request.user
-            current_academic = academic_years.first()
 
             register_users = None
 
@@ -48,20 +51,21 @@ class StudentScheduleListView(generics.ListAPIView):
         return []
 
 
-class StudentAttendanceListView(generics.ListAPIView):
+class StudentAttendanceListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = AttendanceSerializers
     queryset = Attendance.objects.all()
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = ExtraSmallResultsSetPagination
+    select_related_fields = ATTENDANCE_RELATED_FIELDS
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-attendance_date', '-time_in', '-id')
 
     def get_queryset(self):
-        academic_years = AcademicYear.objects.all()
+        current_academic = current_academic_year(self.request)
         subject_id = self.request.GET.get('subject_id', None)
         student_id = self.request.GET.get('student_id', None)
 
-        if academic_years.exists() and subject_id:
+        if current_academic and subject_id:
             user = self.request.user
-            current_academic = academic_years.first()
             register_users = None
 
             if student_id:
@@ -80,28 +84,29 @@ class StudentAttendanceListView(generics.ListAPIView):
         return []
 
 
-class StudentAttendanceRetrieveView(generics.RetrieveAPIView):
+class StudentAttendanceRetrieveView(EagerLoadingMixin, generics.RetrieveAPIView):
     serializer_class = AttendanceSerializers
     queryset = Attendance.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    select_related_fields = ATTENDANCE_RELATED_FIELDS
 
 
-class StudentAssessmentListView(generics.ListAPIView):
+class StudentAssessmentListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = StudentAssessmentSerializers
     queryset = StudentAssessment.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    select_related_fields = STUDENT_ASSESSMENT_RELATED_FIELDS
     pagination_class = ExtraSmallResultsSetPagination
 
     def get_queryset(self):
-        academic_years = AcademicYear.objects.all()
+        current_academic = current_academic_year(self.request)
         grading_period = self.request.GET.get('grading_period', None)
         subject_id = self.request.GET.get('subject_id', None)
         student_id = self.request.GET.get('student_id', None)
 
-        if academic_years.exists() and grading_period and subject_id:
+        if current_academic and grading_period and subject_id:
             subject = get_object_or_404(Subject, pk=subject_id)
             user = self.request.user
-            current_academic = academic_years.first()
             register_users = None
 
             if student_id:
@@ -125,43 +130,6 @@ class StudentAssessmentListView(generics.ListAPIView):
 class StudentOverAllGPAView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_calculate_gap(self, student_assessments):
-
-        written_works_marks = []
-        performance_tasks_marks = []
-        quarterly_assessments_marks = []
-        written_weightage = 0
-        performance_task_weightage = 0
-        quarterly_assessment_weightage = 0
-
-        # Calculate the total weighted marks
-        for sa in student_assessments:
-            if sa.assessment.assessment_type == 'WRITTEN_WORKS':
-                written_works_marks.append(
-                    sa.obtained_marks/sa.assessment.max_marks)
-                if written_weightage == 0:
-                    written_weightage = sa.assessment.subject.written_work / 100
-            if sa.assessment.assessment_type == 'PERFORMANCE_TASK':
-                performance_tasks_marks.append(
-                    sa.obtained_marks/sa.assessment.max_marks)
-                if performance_task_weightage == 0:
-                    performance_task_weightage = sa.assessment.subject.performance_task / 100
-            if sa.assessment.assessment_type == 'QUARTERLY_ASSESSMENT':
-                quarterly_assessments_marks.append(
-                    sa.obtained_marks/sa.assessment.max_marks)
-                if quarterly_assessment_weightage == 0:
-                    quarterly_assessment_weightage = sa.assessment.subject.quartery_assessment / 100
-
-        written_works = {"weightage": written_weightage,
-                         "obtained_marks": written_works_marks, }
-        performance_tasks = {"weightage": performance_task_weightage,
-                             "obtained_marks": performance_tasks_marks, }
-        quarterly_assessments = {
-            "weightage": quarterly_assessment_weightage, "obtained_marks": quarterly_assessments_marks, }
-
-        return gpa_calculate(
-            written_works, performance_tasks, quarterly_assessments)
-
     @swagger_auto_schema(
         manual_parameters=[
             openapi.Parameter(
@@ -182,13 +150,12 @@ class StudentOverAllGPAView(APIView):
     )
     def get(self, request, *args, **kwargs):
         user = self.request.user
-        academic_years = AcademicYear.objects.all()
+        current_academic = current_academic_year(request)
         subject_id = request.query_params.get('subject_id', None)
         student_id = self.request.GET.get('student_id', None)
 
-        if academic_years.exists():
+        if current_academic:
             user = self.request.user
-            current_academic = academic_years.first()
 
             register_users = None
 
@@ -202,41 +169,15 @@ class StudentOverAllGPAView(APIView):
 
             if register_users.exists():
                 register_user = register_users.first()
-                first_grading_assessments = None
-                second_grading_assessments = None
-                third_grading_assessments = None
-                fourth_grading_assessments = None
 
                 if subject_id:
                     subject = get_object_or_404(Subject, pk=subject_id)
                     schedule = Schedule.objects.get(
-                        academic_year=current_academic, subject=subject, section=register_user.section)
+                        academic_year=current_academic, subject=subject, section=register_user.section_id)
 
                     if schedule.is_view_grade:
-                        first_grading_assessments = StudentAssessment.objects.filter(
-                            assessment__academic_year=current_academic, assessment__grading_period='FIRST_GRADING', student=register_user.student, assessment__subject__pk=subject_id).order_by('created_at', 'assessment__grading_period')
-                        second_grading_assessments = StudentAssessment.objects.filter(
-                            assessment__academic_year=current_academic, assessment__grading_period='SECOND_GRADING', student=register_user.student, assessment__subject__pk=subject_id).order_by('created_at', 'assessment__grading_period')
-                        third_grading_assessments = StudentAssessment.objects.filter(
-                            assessment__academic_year=current_academic, assessment__grading_period='THIRD_GRADING', student=register_user.student, assessment__subject__pk=subject_id).order_by('created_at', 'assessment__grading_period')
-                        fourth_grading_assessments = StudentAssessment.objects.filter(
-                            assessment__academic_year=current_academic, assessment__grading_period='FOURTH_GRADING', student=register_user.student, assessment__subject__pk=subject_id).order_by('created_at', 'assessment__grading_period')
-
-                        data = {
-                            'first_grading': self.get_calculate_gap(first_grading_assessments),
-                            'second_grading': self.get_calculate_gap(second_grading_assessments),
-                            'third_grading': self.get_calculate_gap(third_grading_assessments),
-                            'fourth_grading': self.get_calculate_gap(fourth_grading_assessments),
-                        }
-                        if not 'N/A' in data.values():
-                            temp_total_gpa = 0
-                            for value in data.values():
-                                temp_total_gpa += float(value)
-                            temp_total_gpa = temp_total_gpa / \
-                                len(data.values())
-                            data['total_gpa'] = str(round(temp_total_gpa, 2))
-                        else:
-                            data['total_gpa'] = 'N/A'
+                        data = student_period_grades(
+                            register_user.student_id, subject.pk, current_academic.pk)
                         data['is_view_grade'] = True
 
                     else:
@@ -254,18 +195,18 @@ class StudentOverAllGPAView(APIView):
         return response.Response(data, status=status.HTTP_400_BAD_REQUEST)
 
 
-class StudentChatTeacherListView(generics.ListAPIView):
+class StudentChatTeacherListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = TeacherChatSerialzers
     queryset = Schedule.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    select_related_fields = ['teacher__user']
     pagination_class = ExtraSmallResultsSetPagination
 
     def get_queryset(self):
-        academic_years = AcademicYear.objects.all()
+        current_academic = current_academic_year(self.request)
 
-        if academic_years.exists():
+        if current_academic:
             user = self.request.user
-            current_academic = academic_years.first()
             register_users = Registration.objects.filter(
                 academic_year=current_academic, student__user__pk=user.pk)
 
@@ -1,29 +1,81 @@
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 
-from class_information.models import Section
+from django.db import transaction
+from django.db.models import Q
+
+from academic_record.academic_year import academic_year_on
 from registration.models import Registration
-from .models import AcademicYear, Attendance, Schedule
+from user_profile.models import PushEvent
+from user_profile.push import push_queue
+from .models import Attendance, Schedule
+
+ABSENTEE_BATCH_SIZE = 1000
+
+
+def schedule_day_filter(target_date):
+    # Schedule.day is free text, accept "Monday", "MONDAY" and "Mon"
+    return Q(day__iexact=target_date.strftime('%A')) | Q(day__iexact=target_date.strftime('%a'))
+
+
+def perform_end_of_day_tasks(target_date=None, batch_size=ABSENTEE_BATCH_SIZE):
+    """
+        Mark every registered student absent for the schedules of their own
+        section that were due on target_date (default today) and that have no
+        attendance yet, in the academic year holding target_date. Safe to run
+        more than once for the same day.
+        Returns a report with row counts and timing.
+    """
+    started = time.monotonic()
+    if target_date is None:
+        target_date = datetime.now().date()
 
+    report = {
+        'date': target_date.isoformat(),
+        'schedules': 0,
+        'due': 0,
+        'existing': 0,
+        'created': 0,
+    }
 
-def perform_end_of_day_tasks():
-    academic_years = AcademicYear.objects.all()
-    sections = Section.objects.all()
+    # a backfilled day may belong to an earlier academic year than the current one
+    recent_academic_year = academic_year_on(target_date)
 
     # perform student absent
-    if academic_years.exists():
-        current_date = datetime.now()
-        recent_academic_year = academic_years.first()
-        schedules = Schedule.objects.filter(
-            section__in=sections, academic_year=recent_academic_year)
-        registered_students = Registration.objects.filter(
-            academic_year=recent_academic_year)
-        if schedules.exists():
-            for registered_student in registered_students:
-                for schedule in schedules:
-                    # validate student if he/she already have attendance
-                    attendances = Attendance.objects.filter(
-                        student__pk=registered_student.student.pk, time_in__date=current_date, schedule=schedule)
-                    if not attendances.exists():
-                        # perform creation of student absent
-                        Attendance.objects.create(
-                            student=registered_student.student, schedule=schedule, is_present=False, time_in=None)
+    if recent_academic_year:
+        # section_id -> schedule ids due that day
+        section_schedules = {}
+        for schedule_id, section_id in Schedule.objects.filter(
+                schedule_day_filter(target_date), academic_year=recent_academic_year).values_list('pk', 'section_id'):
+            section_schedules.setdefault(section_id, []).append(schedule_id)
+            report['schedules'] += 1
+
+        due = set()
+        for student_id, section_id in Registration.objects.filter(
+                academic_year=recent_academic_year, section__in=section_schedules.keys()).values_list('student_id', 'section_id'):
+            for schedule_id in section_schedules[section_id]:
+                due.add((student_id, schedule_id))
+
+        # validate student if he/she already have attendance
+        existing = set(Attendance.objects.filter(
+            attendance_date=target_date,
+            schedule__in=[schedule_id for schedule_ids in section_schedules.values()
+                          for schedule_id in schedule_ids]).values_list('student_id', 'schedule_id'))
+
+        missing = sorted(due - existing)
+        report['due'] = len(due)
+        report['existing'] = len(due & existing)
+
+        # perform creation of student absent
+        with transaction.atomic():
+            for start in range(0, len(missing), batch_size):
+                Attendance.objects.bulk_create([
+                    Attendance(student_id=student_id, schedule_id=schedule_id, is_present=False,
+                               time_in=None, attendance_date=target_date)
+                    for student_id, schedule_id in missing[start:start + batch_size]
+                ])
+            push_queue.enqueue([student_id for student_id, _ in missing], PushEvent.ATTENDANCE)
+        report['created'] = len(missing)
+
+    report['seconds'] = round(time.monotonic() - started, 3)
+    return report
@@ -1,3 +1,1016 @@
-from django.test import TestCase
+import random
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from urllib.parse import parse_qsl, urlparse
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from academic_record.academic_year import clear_current_academic_year, current_academic_year
+from academic_record.gpa_caluclate import gpa_calculate
+from academic_record.grade_engine import (GRADING_PERIODS, calculate_gpa, calculate_section_grades,
+                                          calculate_student_grades)
+from academic_record.period_grade import student_period_grades, verify_period_grades
+from academic_record.tasks import perform_end_of_day_tasks
+from aes.aes_implementation import decrypt_qr, derive_key, encrypt, encrypt_qr
+from base.models import User
+from class_information.models import Department, Section, Subject
+from registration.models import Registration
+from user_profile.models import Parent, PushEvent, Student, Teacher
+from .models import AcademicYear, Assessment, Attendance, PeriodGrade, Schedule, StudentAssessment
+
+
+class SchoolFixtureMixin:
+    """
+        Minimal school: one academic year, one section with a subject schedule
+        and a teacher. Students are added with create_student.
+    """
+
+    def create_user(self, username, **kwargs):
+        return User.objects.create_user(
+            username=username, email=f'{username}@example.com', password='p4ssw0rD',
+            first_name=username, last_name='Tester', **kwargs)
+
+    def create_school(self):
+        self.academic_year = AcademicYear.objects.create(
+            name='2024-2025', start_date=date(2024, 6, 1), end_date=date(2025, 3, 31))
+        self.department = Department.objects.create(name='Science', code='SCI')
+        self.subject = Subject.objects.create(
+            name='Biology', code='BIO', department=self.department,
+            written_work=30, performance_task=50, quartery_assessment=20)
+        self.section = Section.objects.create(name='Rizal')
+        self.teacher_user = self.create_user('teacher')
+        self.teacher = Teacher.objects.create(
+            user=self.teacher_user, department=self.department,
+            address='Manila', contact_number='09170000000', age=35)
+        self.schedule = Schedule.objects.create(
+            academic_year=self.academic_year, subject=self.subject, teacher=self.teacher,
+            section=self.section, day='Monday', time_start=time(8), time_end=time(9),
+            is_view_grade=True)
+
+    def create_student(self, username, section=None):
+        student = Student.objects.create(
+            user=self.create_user(username), address='Manila',
+            contact_number=f'0917{random.randint(0, 9999999):07d}', age=14)
+        Registration.objects.create(
+            student=student, section=section or self.section, academic_year=self.academic_year)
+        return student
+
+    def create_assessment(self, grading_period, assessment_type, max_marks, subject=None):
+        return Assessment.objects.create(
+            academic_year=self.academic_year, subject=subject or self.subject,
+            teacher=self.teacher, name=f'{grading_period} {assessment_type}',
+            assessment_type=assessment_type, max_marks=Decimal(max_marks),
+            grading_period=grading_period)
+
+
+def legacy_calculate_gap(student_assessments):
+    # copy of the per row loop the GPA views used before grade_engine
+    written_works_marks = []
+    performance_tasks_marks = []
+    quarterly_assessments_marks = []
+    written_weightage = 0
+    performance_task_weightage = 0
+    quarterly_assessment_weightage = 0
+
+    for sa in student_assessments:
+        if sa.assessment.assessment_type == 'WRITTEN_WORKS':
+            written_works_marks.append(
+                sa.obtained_marks/sa.assessment.max_marks)
+            if written_weightage == 0:
+                written_weightage = sa.assessment.subject.written_work / 100
+        if sa.assessment.assessment_type == 'PERFORMANCE_TASK':
+            performance_tasks_marks.append(
+                sa.obtained_marks/sa.assessment.max_marks)
+            if performance_task_weightage == 0:
+                performance_task_weightage = sa.assessment.subject.performance_task / 100
+        if sa.assessment.assessment_type == 'QUARTERLY_ASSESSMENT':
+            quarterly_assessments_marks.append(
+                sa.obtained_marks/sa.assessment.max_marks)
+            if quarterly_assessment_weightage == 0:
+                quarterly_assessment_weightage = sa.assessment.subject.quartery_assessment / 100
+
+    return gpa_calculate(
+        {"weightage": written_weightage, "obtained_marks": written_works_marks, },
+        {"weightage": performance_task_weightage,
+            "obtained_marks": performance_tasks_marks, },
+        {"weightage": quarterly_assessment_weightage, "obtained_marks": quarterly_assessments_marks, })
+
+
+def legacy_over_all(student, subject, academic_year):
+    data = {}
+    for grading_period in GRADING_PERIODS:
+        data[grading_period.lower()] = legacy_calculate_gap(StudentAssessment.objects.filter(
+            assessment__academic_year=academic_year, assessment__grading_period=grading_period,
+            student=student, assessment__subject=subject).order_by('created_at', 'assessment__grading_period'))
+
+    if not 'N/A' in data.values():
+        temp_total_gpa = 0
+        for value in data.values():
+            temp_total_gpa += float(value)
+        data['total_gpa'] = str(round(temp_total_gpa / len(data.values()), 2))
+    else:
+        data['total_gpa'] = 'N/A'
+    return data
+
+
+class GradeEngineEquivalenceTestCase(SchoolFixtureMixin, TestCase):
+    def setUp(self):
+        random.seed(20240501)
+        self.create_school()
+        self.students = [self.create_student(f'student{index}') for index in range(6)]
+
+        for grading_period in GRADING_PERIODS:
+            for assessment_type, _ in Assessment.ASSESSMENT_TYPE_CHOICES:
+                for _ in range(3):
+                    max_marks = random.choice([10, 15, 20, 25, 50, 100])
+                    assessment = self.create_assessment(
+                        grading_period, assessment_type, max_marks)
+                    for student in self.students:
+                        obtained_marks = Decimal(random.randint(0, max_marks * 4)) / 4
+                        StudentAssessment.objects.create(
+                            assessment=assessment, student=student, obtained_marks=obtained_marks)
+
+    def student_assessments(self, **kwargs):
+        return StudentAssessment.objects.filter(
+            assessment__academic_year=self.academic_year, assessment__subject=self.subject,
+            **kwargs).order_by('created_at')
+
+    def test_student_grades_match_legacy(self):
+        for student in self.students:
+            expected = legacy_over_all(student, self.subject, self.academic_year)
+            self.assertEqual(calculate_student_grades(
+                self.student_assessments(student=student)), expected)
+
+    def test_section_grades_match_legacy(self):
+        grades = calculate_section_grades(self.student_assessments())
+
+        self.assertEqual(len(grades), len(self.students))
+        for student in self.students:
+            self.assertEqual(grades[student.pk], legacy_over_all(
+                student, self.subject, self.academic_year))
+
+    def test_single_period_gpa_matches_legacy(self):
+        student = self.students[0]
+        for grading_period in GRADING_PERIODS:
+            student_assessments = self.student_assessments(
+                student=student, assessment__grading_period=grading_period)
+            self.assertEqual(calculate_gpa(student_assessments),
+                             legacy_calculate_gap(student_assessments))
+
+    def test_missing_assessment_type_is_not_available(self):
+        student = self.create_student('late_enrollee')
+        assessment = Assessment.objects.filter(
+            grading_period='FIRST_GRADING', assessment_type='WRITTEN_WORKS').first()
+        StudentAssessment.objects.create(
+            assessment=assessment, student=student, obtained_marks=Decimal('7.5'))
+
+        grades = calculate_student_grades(self.student_assessments(student=student))
+
+        self.assertEqual(grades, legacy_over_all(student, self.subject, self.academic_year))
+        self.assertEqual(grades['first_grading'], 'N/A')
+        self.assertEqual(grades['total_gpa'], 'N/A')
+
+    def test_no_marks(self):
+        student = self.create_student('no_marks')
+        grades = calculate_student_grades(self.student_assessments(student=student))
+
+        self.assertEqual(grades, legacy_over_all(student, self.subject, self.academic_year))
+        self.assertEqual(calculate_gpa([]), 'N/A')
+
+    def test_student_grades_single_query(self):
+        with self.assertNumQueries(1):
+            calculate_student_grades(self.student_assessments(student=self.students[0]))
+        with self.assertNumQueries(1):
+            calculate_section_grades(self.student_assessments())
+
+
+class TeacherSectionGradeSheetTestCase(SchoolFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_school()
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher_user)
+        self.assessments = [
+            self.create_assessment(grading_period, assessment_type, 20)
+            for grading_period in GRADING_PERIODS
+            for assessment_type, _ in Assessment.ASSESSMENT_TYPE_CHOICES]
+
+    def add_students(self, count):
+        for index in range(count):
+            student = self.create_student(f'graded{Student.objects.count()}_{index}')
+            for assessment in self.assessments:
+                StudentAssessment.objects.create(
+                    assessment=assessment, student=student, obtained_marks=Decimal(10 + index))
+
+    def get_grade_sheet(self):
+        return self.client.get(reverse('api:teacher-section-grade-sheet'),
+                               {'schedule_id': str(self.schedule.pk)})
+
+    def test_grade_sheet_matches_over_all_gpa(self):
+        self.add_students(3)
+        self.create_student('no_marks')
+
+        response = self.get_grade_sheet()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['students']), 4)
+        for row in response.data['students']:
+            student = Student.objects.get(pk=row['student']['pk'])
+            expected = legacy_over_all(student, self.subject, self.academic_year)
+            self.assertEqual({key: row[key] for key in expected}, expected)
+
+    def test_grade_sheet_query_count_is_constant(self):
+        self.add_students(2)
+        with CaptureQueriesContext(connection) as small_section:
+            self.get_grade_sheet()
+
+        self.add_students(8)
+        with CaptureQueriesContext(connection) as large_section:
+            response = self.get_grade_sheet()
+
+        self.assertEqual(len(response.data['students']), 10)
+        self.assertEqual(len(small_section), len(large_section))
+
+    def test_other_teacher_schedule_not_found(self):
+        self.client.force_authenticate(self.create_user('other_teacher'))
+        self.assertEqual(self.get_grade_sheet().status_code, 404)
+
+
+class PeriodGradeTestCase(SchoolFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_school()
+        self.student = self.create_student('student')
+        self.client = APIClient()
+        self.marks = {}
+        for assessment_type, _ in Assessment.ASSESSMENT_TYPE_CHOICES:
+            assessment = self.create_assessment('FIRST_GRADING', assessment_type, 30)
+            self.marks[assessment_type] = StudentAssessment.objects.create(
+                assessment=assessment, student=self.student, obtained_marks=Decimal('21.5'))
+
+    def expected_grades(self):
+        return legacy_over_all(self.student, self.subject, self.academic_year)
+
+    def stored_grades(self):
+        return student_period_grades(self.student.pk, self.subject.pk, self.academic_year.pk)
+
+    def test_saved_marks_update_period_grade(self):
+        self.assertEqual(PeriodGrade.objects.count(), 1)
+        self.assertEqual(self.stored_grades(), self.expected_grades())
+
+        period_grade = PeriodGrade.objects.get()
+        self.assertEqual(period_grade.written_works_count, 1)
+        self.assertNotEqual(period_grade.grade, 'N/A')
+
+    def test_update_or_create_view_updates_period_grade(self):
+        self.client.force_authenticate(self.teacher_user)
+        student_assessment = self.marks['WRITTEN_WORKS']
+
+        self.client.post(reverse('api:update-create-student-assessment'), {
+            'id': str(student_assessment.pk),
+            'assessment_id': str(student_assessment.assessment_id),
+            'student_id': str(self.student.pk),
+            'obtained_marks': '3.25',
+        })
+
+        self.assertEqual(StudentAssessment.objects.get(
+            pk=student_assessment.pk).obtained_marks, Decimal('3.25'))
+        self.assertEqual(self.stored_grades(), self.expected_grades())
+
+    def test_max_marks_and_weight_changes_update_period_grade(self):
+        before = self.stored_grades()['first_grading']
+
+        assessment = self.marks['PERFORMANCE_TASK'].assessment
+        assessment.max_marks = Decimal('50')
+        assessment.save()
+        self.assertEqual(self.stored_grades(), self.expected_grades())
+        self.assertNotEqual(self.stored_grades()['first_grading'], before)
+
+        after_max_marks = self.stored_grades()['first_grading']
+        self.subject.written_work = 60
+        self.subject.performance_task = 20
+        self.subject.save()
+        self.assertEqual(self.stored_grades(), self.expected_grades())
+        self.assertNotEqual(self.stored_grades()['first_grading'], after_max_marks)
+
+    def test_moving_assessment_to_other_period(self):
+        assessment = self.marks['QUARTERLY_ASSESSMENT'].assessment
+        assessment.grading_period = 'SECOND_GRADING'
+        assessment.save()
+
+        self.assertEqual(PeriodGrade.objects.count(), 2)
+        self.assertEqual(self.stored_grades(), self.expected_grades())
+
+    def test_deleted_marks_update_period_grade(self):
+        self.marks['WRITTEN_WORKS'].delete()
+        self.assertEqual(self.stored_grades()['first_grading'], 'N/A')
+
+        Assessment.objects.all().delete()
+        self.assertFalse(PeriodGrade.objects.exists())
+
+    def test_rebuild_command_matches(self):
+        PeriodGrade.objects.all().delete()
+        call_command('rebuild_period_grades', stdout=StringIO())
+
+        self.assertEqual(self.stored_grades(), self.expected_grades())
+        self.assertEqual(verify_period_grades(), [])
+
+    def test_verify_reports_stale_rows(self):
+        PeriodGrade.objects.update(grade='99.99')
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_period_grades', '--verify-only',
+                         stdout=StringIO(), stderr=StringIO())
+
+    def test_student_over_all_reads_period_grades(self):
+        self.client.force_authenticate(self.student.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('api:student-gpa'),
+                                       {'subject_id': str(self.subject.pk)})
+
+        tables = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('academic_record_studentassessment', tables)
+        self.assertIn('academic_record_periodgrade', tables)
+
+        expected = self.expected_grades()
+        self.assertEqual({key: response.data[key] for key in expected}, expected)
+
+
+@override_settings(AES_SECRET_KEY='test-aes-secret-key')
+class AttendanceQrScanTestCase(SchoolFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_school()
+        self.student = self.create_student('student')
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher_user)
+
+    def legacy_code(self, plain_text):
+        encrypted = encrypt(plain_text, settings.AES_SECRET_KEY)
+        return f'{encrypted["cipher_text"]}${encrypted["salt"]}${encrypted["nonce"]}${encrypted["tag"]}'
+
+    def scan(self, code):
+        return self.client.post('/api/qr_code/', {'student': code}, format='json')
+
+    def test_decrypt_qr_formats(self):
+        student_id = str(self.student.pk)
+        v2_code = encrypt_qr(student_id, settings.AES_SECRET_KEY)
+
+        self.assertTrue(v2_code.startswith('v2$'))
+        self.assertEqual(decrypt_qr(v2_code, settings.AES_SECRET_KEY).decode(), student_id)
+        self.assertEqual(decrypt_qr(self.legacy_code(student_id),
+                                    settings.AES_SECRET_KEY).decode(), student_id)
+
+        with self.assertRaises(ValueError):
+            decrypt_qr(v2_code, 'another-deployment-key')
+        with self.assertRaises(ValueError):
+            decrypt_qr('not-a-qr-code', settings.AES_SECRET_KEY)
+
+    def test_legacy_key_is_derived_once_per_salt(self):
+        code = self.legacy_code(str(self.student.pk))
+        derive_key.cache_clear()
+
+        decrypt_qr(code, settings.AES_SECRET_KEY)
+        decrypt_qr(code, settings.AES_SECRET_KEY)
+
+        self.assertEqual(derive_key.cache_info().misses, 1)
+        self.assertEqual(derive_key.cache_info().hits, 1)
+
+    def test_scan_creates_attendance_for_both_formats(self):
+        response = self.scan(encrypt_qr(str(self.student.pk), settings.AES_SECRET_KEY))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('error_message', response.data)
+
+        response = self.scan(self.legacy_code(str(self.student.pk)))
+        self.assertEqual(response.data['error_message'], 'Student already time in')
+        self.assertEqual(Attendance.objects.filter(student=self.student).count(), 1)
+
+    def test_scan_invalid_code(self):
+        response = self.scan('v2$00000000$bad$code$here')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error_message'], 'QR Code is invalid')
+
+        # what a client may send instead of the code string
+        for code in (12345, ['v2'], {'student': 'x'}, True):
+            response = self.scan(code)
+            self.assertEqual(response.status_code, 400, code)
+            self.assertEqual(response.data['error_message'], 'QR Code is invalid')
+
+
+@override_settings(AES_SECRET_KEY='test-aes-secret-key')
+class AttendanceBatchScanTestCase(SchoolFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_school()
+        # an offline scan synced an hour later
+        self.scanned_at = (timezone.now() - timedelta(hours=1)).replace(microsecond=0)
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher_user)
+
+    def scans_for(self, students, scanned_at=None):
+        scanned_at = scanned_at or self.scanned_at.isoformat()
+        return [{'student': encrypt_qr(str(student.pk), settings.AES_SECRET_KEY),
+                 'scanned_at': scanned_at} for student in students]
+
+    def post_batch(self, scans):
+        return self.client.post('/api/qr_code/batch/', {'scans': scans}, format='json')
+
+    def test_batch_results(self):
+        students = [self.create_student(f'student{index}') for index in range(3)]
+        other_section = Section.objects.create(name='Bonifacio')
+        unscheduled = self.create_student('unscheduled', section=other_section)
+        unregistered = Student.objects.create(
+            user=self.create_user('unregistered'), address='Manila', contact_number='09179999999', age=14)
+
+        scans = self.scans_for(students + students[:1] + [unscheduled, unregistered])
+        scans.append({'student': 'garbage', 'scanned_at': self.scanned_at.isoformat()})
+
+        response = self.post_batch(scans)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.data['results']], [
+            'created', 'created', 'created', 'already_timed_in', 'no_schedule', 'not_registered', 'invalid'])
+        self.assertEqual(response.data['summary']['created'], 3)
+        self.assertEqual(Attendance.objects.filter(is_present=True).count(), 3)
+        self.assertEqual(Attendance.objects.first().time_in, self.scanned_at)
+        self.assertEqual(Attendance.objects.first().attendance_date, timezone.localtime(self.scanned_at).date())
+
+        # replaying the same sync does not create duplicates
+        response = self.post_batch(self.scans_for(students))
+        self.assertEqual(response.data['summary'], {'already_timed_in': 3})
+        self.assertEqual(Attendance.objects.count(), 3)
+
+    def test_batch_query_count_is_constant(self):
+        small_class = [self.create_student(f'small{index}') for index in range(2)]
+        current_academic_year()
+        with CaptureQueriesContext(connection) as small_batch:
+            self.post_batch(self.scans_for(small_class))
+
+        large_class = [self.create_student(f'large{index}') for index in range(20)]
+        with CaptureQueriesContext(connection) as large_batch:
+            self.post_batch(self.scans_for(large_class))
+
+        self.assertEqual(Attendance.objects.count(), 22)
+        self.assertEqual(len(small_batch), len(large_batch))
+
+    def test_batch_picks_the_same_schedule_as_the_single_scan(self):
+        for day in ('Tuesday', 'Wednesday', 'Thursday'):
+            Schedule.objects.create(
+                academic_year=self.academic_year, subject=self.subject, teacher=self.teacher,
+                section=self.section, day=day, time_start=time(8), time_end=time(9))
+        single, batched = self.create_student('single'), self.create_student('batched')
+
+        self.client.post('/api/qr_code/', {'student': encrypt_qr(str(single.pk), settings.AES_SECRET_KEY)},
+                         format='json')
+        self.post_batch(self.scans_for([batched]))
+
+        first_schedule = Schedule.objects.filter(section=self.section).order_by('pk').first()
+        self.assertEqual(Attendance.objects.get(student=single).schedule, first_schedule)
+        self.assertEqual(Attendance.objects.get(student=batched).schedule, first_schedule)
+
+    def test_scan_times_outside_the_sync_window_use_the_server_time(self):
+        students = [self.create_student(f'student{index}') for index in range(4)]
+        scans = self.scans_for(students[:1]) + [
+            {**scan, 'scanned_at': scanned_at} for scan, scanned_at in zip(self.scans_for(students[1:]), [
+                (timezone.now() - timedelta(days=30)).isoformat(),
+                (timezone.now() + timedelta(days=1)).isoformat(),
+                '2024-13-45T08:00:00'])]
+
+        started = timezone.now()
+        response = self.post_batch(scans)
+
+        self.assertEqual(response.data['summary'], {'created': 4})
+        times = {attendance.student_id: attendance.time_in for attendance in Attendance.objects.all()}
+        self.assertEqual(times.pop(students[0].pk), self.scanned_at)
+        self.assertTrue(all(time_in >= started for time_in in times.values()))
+
+    def test_batch_requires_list(self):
+        self.assertEqual(self.post_batch('not a list').status_code, 400)
+
+
+class EndOfDayAbsenteeTestCase(SchoolFixtureMixin, TestCase):
+    # 2024-07-01 is a Monday, the fixture schedule day
+    monday = date(2024, 7, 1)
+
+    def setUp(self):
+        self.create_school()
+        self.students = [self.create_student(f'student{index}') for index in range(3)]
+        other_section = Section.objects.create(name='Bonifacio')
+        self.other_student = self.create_student('other', section=other_section)
+        Schedule.objects.create(
+            academic_year=self.academic_year, subject=self.subject, teacher=self.teacher,
+            section=self.section, day='Tuesday', time_start=time(8), time_end=time(9))
+
+    def test_marks_only_due_pairs_and_is_idempotent(self):
+        Attendance.objects.create(
+            student=self.students[0], schedule=self.schedule, is_present=True,
+            time_in=timezone.make_aware(datetime(2024, 7, 1, 8, 5)), attendance_date=self.monday)
+
+        report = perform_end_of_day_tasks(self.monday)
+
+        self.assertEqual(report['schedules'], 1)
+        self.assertEqual(report['due'], 3)
+        self.assertEqual(report['existing'], 1)
+        self.assertEqual(report['created'], 2)
+        absentees = Attendance.objects.filter(is_present=False)
+        self.assertEqual({attendance.student_id for attendance in absentees},
+                         {self.students[1].pk, self.students[2].pk})
+        self.assertTrue(all(attendance.attendance_date == self.monday and attendance.time_in is None
+                            for attendance in absentees))
+
+        self.assertEqual(perform_end_of_day_tasks(self.monday)['created'], 0)
+        self.assertEqual(Attendance.objects.count(), 3)
+
+    def test_query_count_is_constant(self):
+        current_academic_year()
+        with CaptureQueriesContext(connection) as few_students:
+            perform_end_of_day_tasks(self.monday)
+
+        for index in range(20):
+            self.create_student(f'late{index}')
+        with CaptureQueriesContext(connection) as many_students:
+            perform_end_of_day_tasks(self.monday + timedelta(days=7))
+
+        self.assertEqual(len(few_students), len(many_students))
+
+    def test_backfill_command(self):
+        out = StringIO()
+        call_command('perform_end_of_day_tasks', date='2024-07-01', until='2024-07-02', stdout=out)
+
+        # monday and tuesday schedules, three students each
+        self.assertEqual(Attendance.objects.filter(attendance_date=self.monday).count(), 3)
+        self.assertEqual(Attendance.objects.filter(attendance_date=date(2024, 7, 2)).count(), 3)
+        self.assertIn('2024-07-02', out.getvalue())
+
+        with self.assertRaises(CommandError):
+            call_command('perform_end_of_day_tasks', date='yesterday')
+
+    def test_uses_the_academic_year_of_the_day(self):
+        next_year = AcademicYear.objects.create(
+            name='2025-2026', start_date=date(2025, 6, 1), end_date=date(2026, 3, 31))
+        next_schedule = Schedule.objects.create(
+            academic_year=next_year, subject=self.subject, teacher=self.teacher,
+            section=self.section, day='Monday', time_start=time(8), time_end=time(9))
+        Registration.objects.create(student=self.students[0], section=self.section, academic_year=next_year)
+
+        # the last Monday of the current year, the first of the next and one between them
+        perform_end_of_day_tasks(date(2025, 3, 31))
+        perform_end_of_day_tasks(date(2025, 6, 2))
+        perform_end_of_day_tasks(date(2025, 5, 5))
+
+        self.assertEqual(set(Attendance.objects.filter(attendance_date=date(2025, 3, 31)).values_list(
+            'schedule_id', flat=True)), {self.schedule.pk})
+        self.assertEqual(Attendance.objects.filter(attendance_date=date(2025, 3, 31)).count(), 3)
+        self.assertEqual(list(Attendance.objects.filter(attendance_date=date(2025, 6, 2)).values_list(
+            'student_id', 'schedule_id')), [(self.students[0].pk, next_schedule.pk)])
+        self.assertFalse(Attendance.objects.filter(attendance_date=date(2025, 5, 5)).exists())
+
+
+class TeacherAttendanceTimeOutTestCase(SchoolFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_school()
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher_user)
+
+    def time_in(self, student):
+        return Attendance.objects.create(
+            student=student, schedule=self.schedule, is_present=True, time_in=timezone.now())
+
+    def post_time_out(self, student_ids):
+        return self.client.post(
+            f'/api/teacher/attendance/timeout?schedule_id={self.schedule.pk}',
+            {'student_ids': student_ids}, format='json')
+
+    def test_time_out_and_absentees(self):
+        present, absent = self.create_student('present'), self.create_student('absent')
+        self.time_in(present)
+
+        response = self.post_time_out([str(present.pk), str(absent.pk)])
+
+        self.assertEqual(response.status_code, 201)
+        attendances = {row['student']['pk']: row['attendance'] for row in response.data}
+        self.assertIsNotNone(attendances[str(present.pk)]['time_out'])
+        self.assertFalse(attendances[str(absent.pk)]['is_present'])
+        self.assertIsNotNone(Attendance.objects.get(student=present).time_out)
+        self.assertFalse(Attendance.objects.get(student=absent).is_present)
+
+        # ending the class again does not duplicate the absentee
+        self.post_time_out([str(present.pk), str(absent.pk)])
+        self.assertEqual(Attendance.objects.count(), 2)
+
+    def test_non_canonical_ids(self):
+        present = self.create_student('present')
+        self.time_in(present)
+
+        response = self.post_time_out([str(present.pk).upper(), present.pk.hex])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Attendance.objects.count(), 1)
+        self.assertIsNotNone(Attendance.objects.get().time_out)
+
+    def test_unknown_student(self):
+        student = self.create_student('student')
+        response = self.post_time_out([str(student.pk), '00000000-0000-0000-0000-000000000000'])
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Attendance.objects.exists())
+
+    def test_query_count_is_constant(self):
+        def end_class(prefix, size):
+            students = [self.create_student(f'{prefix}{index}') for index in range(size)]
+            for student in students[::2]:
+                self.time_in(student)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post_time_out([str(student.pk) for student in students])
+            self.assertEqual(len(response.data), size)
+            return len(queries)
+
+        self.assertEqual(end_class('small', 2), end_class('large', 20))
+
+
+@override_settings(AES_SECRET_KEY='test-aes-secret-key')
+class PushEventHooksTestCase(SchoolFixtureMixin, TestCase):
+    # every attendance and grade change is queued for the student and the parent
+    def setUp(self):
+        self.create_school()
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher_user)
+        self.parent = Parent.objects.create(
+            user=self.create_user('parent'), address='Manila', contact_number='09170000001', age=40)
+        self.student = self.create_student('student')
+        Student.objects.filter(pk=self.student.pk).update(parent=self.parent)
+
+    def events(self, kind):
+        return sorted(PushEvent.objects.filter(kind=kind, student=self.student).values_list(
+            'recipient__username', flat=True))
+
+    def test_saved_attendance_and_marks(self):
+        Attendance.objects.create(
+            student=self.student, schedule=self.schedule, is_present=True, time_in=timezone.now())
+        StudentAssessment.objects.create(
+            assessment=self.create_assessment('FIRST_GRADING', 'WRITTEN_WORKS', 30),
+            student=self.student, obtained_marks=Decimal('20'))
+
+        self.assertEqual(self.events(PushEvent.ATTENDANCE), ['parent', 'student'])
+        self.assertEqual(self.events(PushEvent.GRADES), ['parent', 'student'])
+
+    def test_updated_marks(self):
+        student_assessment = StudentAssessment.objects.create(
+            assessment=self.create_assessment('FIRST_GRADING', 'WRITTEN_WORKS', 30),
+            student=self.student, obtained_marks=Decimal('20'))
+        PushEvent.objects.all().delete()
+
+        self.client.post(reverse('api:update-create-student-assessment'), {
+            'id': str(student_assessment.pk),
+            'assessment_id': str(student_assessment.assessment_id),
+            'student_id': str(self.student.pk),
+            'obtained_marks': '25',
+        })
+
+        self.assertEqual(self.events(PushEvent.GRADES), ['parent', 'student'])
+
+    def test_bulk_attendance_paths(self):
+        self.client.post('/api/qr_code/batch/', {'scans': [
+            {'student': encrypt_qr(str(self.student.pk), settings.AES_SECRET_KEY)}]}, format='json')
+        self.assertEqual(self.events(PushEvent.ATTENDANCE), ['parent', 'student'])
+
+        self.client.post(f'/api/teacher/attendance/timeout?schedule_id={self.schedule.pk}',
+                         {'student_ids': [str(self.student.pk)]}, format='json')
+        self.assertEqual(len(self.events(PushEvent.ATTENDANCE)), 4)
+
+        absent = self.create_student('absent')
+        perform_end_of_day_tasks(date(2024, 7, 1))
+        self.assertEqual(PushEvent.objects.filter(student=absent, kind=PushEvent.ATTENDANCE).count(), 1)
+
+
+class CurrentAcademicYearTestCase(TestCase):
+    def setUp(self):
+        clear_current_academic_year()
+
+    def create_academic_year(self, name):
+        return AcademicYear.objects.create(
+            name=name, start_date=date(2024, 6, 1), end_date=date(2025, 3, 31))
+
+    def test_cached_and_invalidated(self):
+        self.assertIsNone(current_academic_year())
+        academic_year = self.create_academic_year('2024-2025')
+
+        self.assertEqual(current_academic_year(), academic_year)
+        with self.assertNumQueries(0):
+            self.assertEqual(current_academic_year(), academic_year)
+
+        academic_year.name = '2024-2025 renamed'
+        academic_year.save()
+        self.assertEqual(current_academic_year().name, '2024-2025 renamed')
+
+        academic_year.delete()
+        self.assertIsNone(current_academic_year())
+
+    @override_settings(ACADEMIC_YEAR_CACHE_ALIAS='default', ACADEMIC_YEAR_CACHE_TIMEOUT=0)
+    def test_shared_cache(self):
+        academic_year = self.create_academic_year('2024-2025')
+        self.assertEqual(current_academic_year(), academic_year)
+
+        # another worker with a cold local cache reads the shared one
+        with self.assertNumQueries(0):
+            self.assertEqual(current_academic_year(), academic_year)
+
+    def test_request_override(self):
+        self.create_academic_year('2024-2025')
+        other = self.create_academic_year('2025-2026')
+        request = RequestFactory().get('/')
+        request.current_academic_year = other
+
+        self.assertEqual(current_academic_year(request), other)
+        self.assertNotEqual(current_academic_year(), other)
+
+
+class ListQueryCeilingTestCase(SchoolFixtureMixin, TestCase):
+    """
+        Each list endpoint runs the same number of queries for a single row
+        and for a full page, and stays under its ceiling.
+    """
+
+    def setUp(self):
+        self.create_school()
+        self.student = self.create_student('student')
+        self.rows = 0
+        current_academic_year()
+
+    def assertQueryCeiling(self, user, url, params, add_rows, ceiling):
+        client = APIClient()
+        client.force_authenticate(user)
+        counts = []
+
+        for size in (1, 15):
+            add_rows(size)
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url, {'page_size': 100, **params})
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+
+        self.assertEqual(response.data['count'], self.rows)
+        self.assertEqual(counts[0], counts[1], url)
+        self.assertLessEqual(counts[1], ceiling, url)
+
+    def add_schedules(self, size):
+        for _ in range(size):
+            self.rows += 1
+            Schedule.objects.create(
+                academic_year=self.academic_year, subject=self.subject, teacher=self.teacher,
+                section=self.section, day='Tuesday', time_start=time(8), time_end=time(9))
+
+    def add_teacher_schedules(self, size):
+        for _ in range(size):
+            self.rows += 1
+            teacher = Teacher.objects.create(
+                user=self.create_user(f'teacher{self.rows}'), department=self.department,
+                address='Manila', contact_number='09170000000', age=35)
+            Schedule.objects.create(
+                academic_year=self.academic_year, subject=self.subject, teacher=teacher,
+                section=self.section, day='Tuesday', time_start=time(8), time_end=time(9))
+
+    def add_attendances(self, size):
+        for _ in range(size):
+            self.rows += 1
+            Attendance.objects.create(
+                student=self.student, schedule=self.schedule, is_present=True)
+
+    def add_assessments(self, size):
+        for _ in range(size):
+            self.rows += 1
+            self.create_assessment('FIRST_GRADING', 'WRITTEN_WORKS', 10)
+
+    def add_student_assessments(self, size):
+        for _ in range(size):
+            self.rows += 1
+            StudentAssessment.objects.create(
+                assessment=self.create_assessment('FIRST_GRADING', 'WRITTEN_WORKS', 10),
+                student=self.student, obtained_marks=Decimal(8))
+
+    def add_time_out_students(self, size):
+        for _ in range(size):
+            self.rows += 1
+            student = self.create_student(f'timeout{self.rows}')
+            Attendance.objects.create(
+                student=student, schedule=self.schedule, is_present=True)
+
+    def test_teacher_endpoints(self):
+        self.rows = 1
+        self.assertQueryCeiling(self.teacher_user, '/api/teacher/schedules', {}, self.add_schedules, 2)
+        self.rows = 0
+        self.assertQueryCeiling(self.teacher_user, '/api/teacher/students/attendance', {},
+                                self.add_attendances, 3)
+        self.rows = 0
+        self.assertQueryCeiling(self.teacher_user, '/api/teacher/web/assessments', {},
+                                self.add_assessments, 3)
+
+    def test_teacher_student_assessment_endpoints(self):
+        self.assertQueryCeiling(self.teacher_user, '/api/teacher/assessments', {
+            'grading_period': 'FIRST_GRADING', 'student_id': self.student.user.pk},
+            self.add_student_assessments, 9)
+        self.assertQueryCeiling(self.teacher_user, '/api/teacher/student/assessments', {
+            'section_id': self.section.pk, 'subject_id': self.subject.pk},
+            self.add_student_assessments, 6)
+
+    def test_teacher_time_out_list(self):
+        self.rows = 1
+        self.assertQueryCeiling(self.teacher_user, '/api/teacher/attendance/timeout', {
+            'schedule_id': self.schedule.pk}, self.add_time_out_students, 4)
+
+    def test_student_endpoints(self):
+        self.rows = 1
+        self.assertQueryCeiling(self.student.user, '/api/student/schedule', {},
+                                self.add_schedules, 5)
+        self.rows = 0
+        self.assertQueryCeiling(self.student.user, '/api/student/attendance', {
+            'subject_id': self.subject.pk}, self.add_attendances, 5)
+        self.rows = 0
+        self.assertQueryCeiling(self.student.user, '/api/student/assessments', {
+            'grading_period': 'FIRST_GRADING', 'subject_id': self.subject.pk},
+            self.add_student_assessments, 6)
+        self.rows = Schedule.objects.count()
+        self.assertQueryCeiling(self.student.user, '/api/student/chat-list', {},
+                                self.add_teacher_schedules, 5)
+
+
+class StudentAttendanceCursorTestCase(SchoolFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_school()
+        self.student = self.create_student('student')
+        time_in = timezone.make_aware(datetime(2024, 7, 1, 8, 5))
+        attendances = []
+        for day in range(8):
+            attendance_date = date(2024, 7, 1) + timedelta(days=day)
+            # absences have no time_in, keep them on the same days as presences
+            attendances.append(Attendance(
+                student=self.student, schedule=self.schedule, is_present=True,
+                time_in=time_in + timedelta(days=day), attendance_date=attendance_date))
+            attendances.append(Attendance(
+                student=self.student, schedule=self.schedule, is_present=False,
+                time_in=None, attendance_date=attendance_date))
+        Attendance.objects.bulk_create(attendances)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student.user)
+
+    def test_cursor_pages_cover_every_row_once(self):
+        seen = []
+        params = {'subject_id': self.subject.pk, 'cursor': '', 'page_size': 3}
+        while True:
+            response = self.client.get('/api/student/attendance', params)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            seen += response.data['results']
+            if not response.data['next']:
+                break
+            params = dict(parse_qsl(urlparse(response.data['next']).query))
+
+        self.assertEqual(len({row['id'] for row in seen}), 16)
+        keys = [(row['attendance_date'], row['time_in'] is not None) for row in seen]
+        # newest day first, the absence (no time_in) before the presence
+        self.assertEqual(keys, sorted(keys, key=lambda key: (key[0], not key[1]), reverse=True))
+        self.assertEqual(keys[0], ('2024-07-08', False))
+
+    def test_page_numbers_still_work(self):
+        response = self.client.get('/api/student/attendance', {'subject_id': self.subject.pk, 'page': 2})
+        self.assertEqual(response.data['count'], 16)
+        self.assertEqual(len(response.data['results']), 6)
+
+
+class BenchmarkLookupsTestCase(TestCase):
+    def test_benchmark_leaves_no_rows_and_keeps_indexes(self):
+        out = StringIO()
+        call_command('benchmark_lookups', students=12, sections=2, subjects=3, days=2, repeat=1, stdout=out)
+
+        self.assertIn('schedules of a teacher', out.getvalue())
+        self.assertFalse(Student.objects.exists())
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Schedule._meta.db_table)
+        self.assertIn('schedule_teacher_year_idx', constraints)
+
+    def test_refuses_a_live_database(self):
+        name = connection.settings_dict['NAME']
+        connection.settings_dict['NAME'] = '/srv/ease_studyante.sqlite3'
+        try:
+            with self.assertRaisesMessage(CommandError, '--force'):
+                call_command('benchmark_lookups', students=2, repeat=1, stdout=StringIO())
+        finally:
+            connection.settings_dict['NAME'] = name
+
+    @override_settings(DEBUG=True)
+    def test_refuses_a_live_database_with_debug_on(self):
+        name = connection.settings_dict['NAME']
+        connection.settings_dict['NAME'] = '/srv/ease_studyante.sqlite3'
+        try:
+            with self.assertRaisesMessage(CommandError, '--force'):
+                call_command('benchmark_lookups', students=2, repeat=1, stdout=StringIO())
+        finally:
+            connection.settings_dict['NAME'] = name
+
+
+class SparseFieldsTestCase(SchoolFixtureMixin, TestCase):
+    def setUp(self):
+        self.create_school()
+        self.student = self.create_student('student')
+        for index in range(3):
+            StudentAssessment.objects.create(
+                assessment=self.create_assessment('FIRST_GRADING', 'WRITTEN_WORKS', 10),
+                student=self.student, obtained_marks=Decimal(8 + index))
+        self.client = APIClient()
+        self.client.force_authenticate(self.student.user)
+        current_academic_year()
+
+    def assessments(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/student/assessments', {
+                'grading_period': 'FIRST_GRADING', 'subject_id': self.subject.pk, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'], queries
+
+    def test_default_payload_is_unchanged(self):
+        row = self.assessments()[0][0]
+
+        self.assertEqual(set(row), {'pk', 'assessment', 'obtained_marks', 'student', 'created_at'})
+        self.assertEqual(row['assessment']['teacher']['user']['username'], 'teacher')
+        self.assertEqual(row['student']['user']['username'], 'student')
+
+    def test_empty_expand_flattens_relations_to_ids(self):
+        rows, queries = self.assessments(expand='')
+
+        self.assertEqual(rows[0]['student'], self.student.pk)
+        self.assertIn(rows[0]['assessment'], set(Assessment.objects.values_list('pk', flat=True)))
+        # collapsed relations are not joined any more
+        self.assertNotIn('user_profile_student', queries[-1]['sql'])
+
+    def test_expand_keeps_the_listed_relations(self):
+        row = self.assessments(expand='assessment.subject')[0][0]
+
+        self.assertEqual(row['assessment']['subject']['name'], 'Biology')
+        self.assertEqual(row['assessment']['subject']['department'], self.department.pk)
+        self.assertEqual(row['assessment']['teacher'], self.teacher.pk)
+        self.assertEqual(row['student'], self.student.pk)
+
+    def test_fields_picks_fields_at_every_level(self):
+        rows, _ = self.assessments(fields='pk,obtained_marks,assessment.name,assessment.subject.code')
+
+        self.assertEqual(rows[0], {'pk': rows[0]['pk'], 'obtained_marks': '8.00',
+                                   'assessment': {'name': 'FIRST_GRADING WRITTEN_WORKS',
+                                                  'subject': {'code': 'BIO'}}})
+
+    def test_queries_do_not_grow_when_collapsed(self):
+        _, full = self.assessments()
+        _, flat = self.assessments(expand='')
+
+        self.assertEqual(len(flat), len(full))
+
+
+class BenchmarkPayloadsTestCase(TestCase):
+    def test_reports_every_page_and_variant(self):
+        out = StringIO()
+        call_command('benchmark_payloads', students=6, sections=2, subjects=2, days=2, assessments=1,
+                     repeat=1, stdout=out)
+
+        self.assertIn('student assessments    flat ids', out.getvalue())
+        self.assertIn('student schedule       sparse', out.getvalue())
+        self.assertFalse(Student.objects.exists())
+
+
+class SeedSchoolCommandTestCase(TestCase):
+    def test_seeds_weighted_subjects_and_parents(self):
+        out = StringIO()
+        call_command('seed_school', prefix='demo', students=6, sections=2, subjects=3, days=2, assessments=1,
+                     chat_messages=2, weights='30/50/20,40/40/20', stdout=out)
+
+        self.assertIn('6 students', out.getvalue())
+        self.assertEqual(Student.objects.filter(parent__isnull=False).count(), 6)
+        self.assertEqual(Parent.objects.count(), 3)
+        self.assertEqual(list(Subject.objects.order_by('name').values_list(
+            'written_work', 'performance_task', 'quartery_assessment')),
+            [(30, 50, 20), (40, 40, 20), (30, 50, 20)])
+        self.assertTrue(PeriodGrade.objects.exists())
+
+        with self.assertRaises(CommandError):
+            call_command('seed_school', prefix='demo', students=1, stdout=out)
+
+    def test_rejects_weights_not_adding_up(self):
+        for weights in ('30/50/30', '30/70', 'a/b/c'):
+            with self.assertRaises(CommandError):
+                call_command('seed_school', prefix='demo', students=1, weights=weights, stdout=StringIO())
+        self.assertFalse(AcademicYear.objects.exists())
+
+    @override_settings(DEBUG=True)
+    def test_refuses_a_live_database(self):
+        name = connection.settings_dict['NAME']
+        connection.settings_dict['NAME'] = '/srv/ease_studyante.sqlite3'
+        try:
+            with self.assertRaisesMessage(CommandError, '--force'):
+                call_command('seed_school', prefix='demo', students=1, stdout=StringIO())
+        finally:
+            connection.settings_dict['NAME'] = name
+        self.assertFalse(AcademicYear.objects.exists())
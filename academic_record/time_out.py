@@ -0,0 +1,69 @@
+import uuid
+
+from django.db import transaction
+from django.utils import timezone
+
+from academic_record.uuid_checker import is_valid_uuid
+from user_profile.models import PushEvent, Student
+from user_profile.push import push_queue
+from .models import Attendance
+
+
+def day_attendances(schedule, student_ids, current_date):
+    """
+        {student_id: attendance} of the students for the schedule on a day,
+        loaded in one query.
+    """
+    attendances = {}
+    for attendance in Attendance.objects.filter(
+            student__pk__in=student_ids, schedule=schedule, attendance_date=current_date).order_by('created_at'):
+        attendances.setdefault(str(attendance.student_id), attendance)
+
+    return attendances
+
+
+def time_out_students(schedule, student_ids, now=None):
+    """
+        End a class for the given students in a constant number of queries.
+        Present students without time_out are timed out with one bulk_update,
+        students without attendance for the day are marked absent with one
+        bulk_create. Returns {student_id: attendance} for the response, or
+        None when one of the ids is not a student.
+    """
+    now = now or timezone.localtime()
+    current_date = now.date()
+    student_ids = [str(student_id) for student_id in student_ids]
+    if not all(is_valid_uuid(student_id) for student_id in student_ids):
+        return None
+    # day_attendances is keyed on the canonical uuid string
+    student_ids = list(dict.fromkeys(str(uuid.UUID(student_id)) for student_id in student_ids))
+
+    if Student.objects.filter(pk__in=student_ids).count() != len(student_ids):
+        return None
+
+    attendances = day_attendances(schedule, student_ids, current_date)
+
+    timed_out = []
+    for attendance in attendances.values():
+        if not attendance.time_out and attendance.is_present:
+            # bulk_update skips auto_now, keep updated_at in step by hand
+            attendance.time_out = now
+            attendance.updated_at = now
+            timed_out.append(attendance)
+
+    absentees = [
+        Attendance(student_id=student_id, schedule=schedule, is_present=False,
+                   time_in=None, attendance_date=current_date)
+        for student_id in student_ids if student_id not in attendances
+    ]
+
+    with transaction.atomic():
+        Attendance.objects.bulk_update(timed_out, ['time_out', 'updated_at'])
+        Attendance.objects.bulk_create(absentees)
+        push_queue.enqueue([attendance.student_id for attendance in timed_out + absentees],
+                           PushEvent.ATTENDANCE)
+
+    for attendance in absentees:
+        attendances[attendance.student_id] = attendance
+
+    return attendances
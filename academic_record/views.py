@@ -1,18 +1,30 @@
 from datetime import datetime
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework import generics, permissions,  status, viewsets, response, filters
+from rest_framework.decorators import action
 
+from academic_record.academic_year import current_academic_year
 from academic_record.custom_filter_assessment import CustomFilterAssessment, CustomFilterStudentAssessment
-from academic_record.gpa_caluclate import gpa_calculate
+from academic_record.grade_engine import (calculate_gpa, calculate_section_grades, calculate_student_grades,
+                                          grades_from_periods)
+from academic_record.period_grade import refresh_assessment_period_grades
+from academic_record.qr_attendance import ingest_scans
+from academic_record.time_out import day_attendances, time_out_students
 from academic_record.uuid_checker import is_valid_uuid
-from aes.aes_implementation import decrypt
+from aes.aes_implementation import decrypt_qr
 from class_information.models import Subject
+from core.eager_loading import EagerLoadingMixin
 from core.paginate import ExtraSmallResultsSetPagination
-from ease_studyante_core import settings
-from user_profile.models import  Student, Teacher
+from django.conf import settings
+from user_profile.models import  PushEvent, Student, Teacher
+from user_profile.push import push_queue
+from user_profile.serializers import StudentSerializer
 from .serializers import (StudentAssessmentSerializers, TeacherScheduleSerialzers, AttendanceSerializers,
-                           AssessmentSerializers, TimeOutAttendanceSerializers)
-from .models import Schedule, AcademicYear, Attendance, StudentAssessment, Assessment
+                           AssessmentSerializers, TimeOutAttendanceSerializers, ASSESSMENT_RELATED_FIELDS,
+                           ATTENDANCE_RELATED_FIELDS, SCHEDULE_RELATED_FIELDS, STUDENT_ASSESSMENT_RELATED_FIELDS)
+from .models import Schedule, Attendance, StudentAssessment, Assessment
 from registration.models import Registration
 from rest_framework.response import Response
 from drf_yasg.utils import swagger_auto_schema
@@ -24,29 +36,30 @@ from django.db.models import Q
 import uuid
 
 
-class TeacherScheduleListView(generics.ListAPIView):
+class TeacherScheduleListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = TeacherScheduleSerialzers
     queryset = Schedule.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    select_related_fields = SCHEDULE_RELATED_FIELDS
     pagination_class = ExtraSmallResultsSetPagination
 
     def get_queryset(self):
         queryset = []
 
-        academic_years = AcademicYear.objects.all()
+        current_academic = current_academic_year(self.request)
 
-        if academic_years.exists():
+        if current_academic:
             user = self.request.user
-            current_academic = academic_years.first()
             return Schedule.objects.filter(academic_year=current_academic, teacher__user__pk=user.pk)
 
         return queryset
 
 
-class AttendanceTeacherListView(generics.ListAPIView):
+class AttendanceTeacherListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = AttendanceSerializers
     queryset = Attendance.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    select_related_fields = ATTENDANCE_RELATED_FIELDS
     pagination_class = ExtraSmallResultsSetPagination
 
     @swagger_auto_schema(
@@ -66,16 +79,16 @@ class AttendanceTeacherListView(generics.ListAPIView):
         ]
     )
     def get_queryset(self):
-        academic_years = AcademicYear.objects.all()
+        academic_year = current_academic_year(self.request)
         student = self.request.GET.get('student_id', None)
         subject = self.request.GET.get('subject_id', None)
 
         attendance = []
         user = self.request.user
 
-        if academic_years.exists():
+        if academic_year:
             register_students = Registration.objects.filter(
-                student__user__pk=student, academic_year=academic_years.first())
+                student__user__pk=student, academic_year=academic_year)
             if register_students.exists():
                 if student and subject:
                     attendance = Attendance.objects.filter(
@@ -87,6 +100,10 @@ class AttendanceTeacherListView(generics.ListAPIView):
         return attendance
 
 
+# upper bound of scans replayed in one batch request
+MAX_BATCH_SCANS = 200
+
+
 class AttendanceTeacherViewSet(viewsets.ViewSet):
     serializer_class = AttendanceSerializers
     queryset = Attendance.objects.all()
@@ -96,24 +113,18 @@ class AttendanceTeacherViewSet(viewsets.ViewSet):
     def create(self, request):
         # student will be aes 256
         student = request.data.get('student', None)
-        academic_years = AcademicYear.objects.all()
-
-        aes_256_split = student.split('$')
+        academic_year = current_academic_year(request)
 
-        temp_encrpyted = {
-            'cipher_text': aes_256_split[0],
-            'salt': aes_256_split[1],
-            'nonce': aes_256_split[2],
-            'tag': aes_256_split[3]
-        }
-
-        decrypted = decrypt(temp_encrpyted, settings.AES_SECRET_KEY)
-        student = bytes.decode(decrypted)
+        try:
+            decrypted = decrypt_qr(student or '', settings.AES_SECRET_KEY)
+            student = bytes.decode(decrypted)
+        except (ValueError, KeyError):
+            student = None
 
         if is_valid_uuid(student):
-            if academic_years.exists():
+            if academic_year:
                 register_students = Registration.objects.filter(
-                    student__pk=student, academic_year=academic_years.first())
+                    student__pk=student, academic_year=academic_year)
 
             if register_students.exists():
                 teacher = self.request.user
@@ -126,7 +137,7 @@ class AttendanceTeacherViewSet(viewsets.ViewSet):
                 if schedules.exists():
                     schedule = schedules.first()
                     attendances = Attendance.objects.filter(
-                        student__pk=register_student.student.pk, time_in__date=current_date, schedule=schedule)
+                        student__pk=register_student.student.pk, attendance_date=current_date.date(), time_in__isnull=False, schedule=schedule)
 
                     if not attendances.exists():
 
@@ -157,20 +168,57 @@ class AttendanceTeacherViewSet(viewsets.ViewSet):
         return Response(data=error, status=status.HTTP_400_BAD_REQUEST)
 
 
-class TeacherStudentAssessmentListView(generics.ListAPIView):
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'scans': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    description='Offline scans, each with the encrypted QR code (student) and the client time of the scan (scanned_at)',
+                    items=openapi.Schema(
+                        type=openapi.TYPE_OBJECT,
+                        properties={
+                            'student': openapi.Schema(type=openapi.TYPE_STRING),
+                            'scanned_at': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+                        }
+                    )
+                ),
+            }
+        )
+    )
+    @action(detail=False, methods=['post'], url_path='batch')
+    def batch(self, request):
+        scans = request.data.get('scans', None)
+
+        if not isinstance(scans, list) or len(scans) > MAX_BATCH_SCANS:
+            error = {
+                "error_message": f"scans must be a list of at most {MAX_BATCH_SCANS} items",
+            }
+            return Response(data=error, status=status.HTTP_400_BAD_REQUEST)
+
+        results = ingest_scans(request.user, [
+            scan if isinstance(scan, dict) else {} for scan in scans])
+        summary = {}
+        for result in results:
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+
+        return Response(data={'results': results, 'summary': summary}, status=status.HTTP_200_OK)
+
+
+class TeacherStudentAssessmentListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = StudentAssessmentSerializers
     queryset = StudentAssessment.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    select_related_fields = STUDENT_ASSESSMENT_RELATED_FIELDS
     pagination_class = ExtraSmallResultsSetPagination
 
     def get_queryset(self):
-        academic_years = AcademicYear.objects.all()
+        current_academic = current_academic_year(self.request)
         grading_period = self.request.GET.get('grading_period', None)
         student_id = self.request.GET.get('student_id', None)
 
-        if academic_years.exists() and grading_period and student_id:
+        if current_academic and grading_period and student_id:
             user = self.request.user
-            current_academic = academic_years.first()
             register_users = Registration.objects.filter(
                 academic_year=current_academic, student__user__pk=student_id)
 
@@ -187,41 +235,7 @@ class TeacherStudentAssessmentListView(generics.ListAPIView):
 
         # Get all student assessment results
         student_assessments = self.get_queryset()
-
-        written_works_marks = []
-        performance_tasks_marks = []
-        quarterly_assessments_marks = []
-        written_weightage = 0
-        performance_task_weightage = 0
-        quarterly_assessment_weightage = 0
-
-        # Calculate the total weighted marks
-        for sa in student_assessments:
-            if sa.assessment.assessment_type == 'WRITTEN_WORKS':
-                written_works_marks.append(
-                    sa.obtained_marks/sa.assessment.max_marks)
-                if written_weightage == 0:
-                    written_weightage = sa.assessment.subject.written_work / 100
-            if sa.assessment.assessment_type == 'PERFORMANCE_TASK':
-                performance_tasks_marks.append(
-                    sa.obtained_marks/sa.assessment.max_marks)
-                if performance_task_weightage == 0:
-                    performance_task_weightage = sa.assessment.subject.performance_task / 100
-            if sa.assessment.assessment_type == 'QUARTERLY_ASSESSMENT':
-                quarterly_assessments_marks.append(
-                    sa.obtained_marks/sa.assessment.max_marks)
-                if quarterly_assessment_weightage == 0:
-                    quarterly_assessment_weightage = sa.assessment.subject.quartery_assessment / 100
-
-        written_works = {"weightage": written_weightage,
-                         "obtained_marks": written_works_marks, }
-        performance_tasks = {"weightage": performance_task_weightage,
-                             "obtained_marks": performance_tasks_marks, }
-        quarterly_assessments = {
-            "weightage": quarterly_assessment_weightage, "obtained_marks": quarterly_assessments_marks, }
-
-        my_gap = gpa_calculate(
-            written_works, performance_tasks, quarterly_assessments)
+        my_gap = calculate_gpa(student_assessments)
 
         # Modify the response data to include the average GPA
         response.data['gpa'] = my_gap
@@ -231,43 +245,6 @@ class TeacherStudentAssessmentListView(generics.ListAPIView):
 class TeacherStudentOverAllGPAView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    def get_calculate_gap(self, student_assessments):
-
-        written_works_marks = []
-        performance_tasks_marks = []
-        quarterly_assessments_marks = []
-        written_weightage = 0
-        performance_task_weightage = 0
-        quarterly_assessment_weightage = 0
-
-        # Calculate the total weighted marks
-        for sa in student_assessments:
-            if sa.assessment.assessment_type == 'WRITTEN_WORKS':
-                written_works_marks.append(
-                    sa.obtained_marks/sa.assessment.max_marks)
-                if written_weightage == 0:
-                    written_weightage = sa.assessment.subject.written_work / 100
-            if sa.assessment.assessment_type == 'PERFORMANCE_TASK':
-                performance_tasks_marks.append(
-                    sa.obtained_marks/sa.assessment.max_marks)
-                if performance_task_weightage == 0:
-                    performance_task_weightage = sa.assessment.subject.performance_task / 100
-            if sa.assessment.assessment_type == 'QUARTERLY_ASSESSMENT':
-                quarterly_assessments_marks.append(
-                    sa.obtained_marks/sa.assessment.max_marks)
-                if quarterly_assessment_weightage == 0:
-                    quarterly_assessment_weightage = sa.assessment.subject.quartery_assessment / 100
-
-        written_works = {"weightage": written_weightage,
-                         "obtained_marks": written_works_marks, }
-        performance_tasks = {"weightage": performance_task_weightage,
-                             "obtained_marks": performance_tasks_marks, }
-        quarterly_assessments = {
-            "weightage": quarterly_assessment_weightage, "obtained_marks": quarterly_assessments_marks, }
-
-        return gpa_calculate(
-            written_works, performance_tasks, quarterly_assessments)
-
     @swagger_auto_schema(
         manual_parameters=[
             openapi.Parameter(
@@ -288,56 +265,28 @@ class TeacherStudentOverAllGPAView(APIView):
     )
     def get(self, request, *args, **kwargs):
         user = self.request.user
-        academic_years = AcademicYear.objects.all()
+        current_academic = current_academic_year(request)
         subject_id = request.query_params.get('subject_id', None)
         student_id = request.query_params.get('student_id', None)
 
-        if academic_years.exists() and subject_id and student_id:
+        if current_academic and subject_id and student_id:
             user = self.request.user
-            current_academic = academic_years.first()
             register_users = Registration.objects.filter(
                 academic_year=current_academic, student__user__pk=student_id)
 
             if register_users.exists():
                 register_user = register_users.first()
-                first_grading_assessments = None
-                second_grading_assessments = None
-                third_grading_assessments = None
-                fourth_grading_assessments = None
 
                 if subject_id:
                     subject = get_object_or_404(Subject, pk=subject_id)
                     schedule = Schedule.objects.get(
                         academic_year=current_academic, subject=subject, section=register_user.section)
 
-                    first_grading_assessments = StudentAssessment.objects.filter(
-                        assessment__teacher__user__pk=user.pk,
-                        assessment__academic_year=current_academic, assessment__grading_period='FIRST_GRADING', student=register_user.student, assessment__subject__pk=subject_id).order_by('created_at', 'assessment__grading_period')
-                    second_grading_assessments = StudentAssessment.objects.filter(
+                    student_assessments = StudentAssessment.objects.filter(
                         assessment__teacher__user__pk=user.pk,
-                        assessment__academic_year=current_academic, assessment__grading_period='SECOND_GRADING', student=register_user.student, assessment__subject__pk=subject_id).order_by('created_at', 'assessment__grading_period')
-                    third_grading_assessments = StudentAssessment.objects.filter(
-                        assessment__teacher__user__pk=user.pk,
-                        assessment__academic_year=current_academic, assessment__grading_period='THIRD_GRADING', student=register_user.student, assessment__subject__pk=subject_id).order_by('created_at', 'assessment__grading_period')
-                    fourth_grading_assessments = StudentAssessment.objects.filter(
-                        assessment__teacher__user__pk=user.pk,
-                        assessment__academic_year=current_academic, assessment__grading_period='FOURTH_GRADING', student=register_user.student, assessment__subject__pk=subject_id).order_by('created_at', 'assessment__grading_period')
-
-                    data = {
-                        'first_grading': self.get_calculate_gap(first_grading_assessments),
-                        'second_grading': self.get_calculate_gap(second_grading_assessments),
-                        'third_grading': self.get_calculate_gap(third_grading_assessments),
-                        'fourth_grading': self.get_calculate_gap(fourth_grading_assessments),
-                    }
-                    if not 'N/A' in data.values():
-                        temp_total_gpa = 0
-                        for value in data.values():
-                            temp_total_gpa += float(value)
-                        temp_total_gpa = temp_total_gpa / \
-                            len(data.values())
-                        data['total_gpa'] = str(round(temp_total_gpa, 2))
-                    else:
-                        data['total_gpa'] = 'N/A'
+                        assessment__academic_year=current_academic, student=register_user.student, assessment__subject__pk=subject_id).order_by('created_at')
+
+                    data = calculate_student_grades(student_assessments)
                     data['is_view_grade'] = True
 
                     return response.Response(data, status=status.HTTP_200_OK)
@@ -349,31 +298,86 @@ class TeacherStudentOverAllGPAView(APIView):
 
 
 
-class TeacherAssessmentListView(generics.ListAPIView):
+class TeacherSectionGradeSheetView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'schedule_id',
+                openapi.IN_QUERY,
+                description='Pass schedule id of the teacher to get the grade sheet of every registered student of the section',
+                type=openapi.TYPE_STRING,
+                required=True
+            ),
+        ]
+    )
+    def get(self, request, *args, **kwargs):
+        user = self.request.user
+        schedule_id = request.query_params.get('schedule_id', None)
+
+        if not is_valid_uuid(schedule_id):
+            data = {'error_message': 'Schedule not found'}
+            return response.Response(data, status=status.HTTP_400_BAD_REQUEST)
+
+        schedule = get_object_or_404(Schedule.objects.select_related(
+            'subject', 'section'), pk=schedule_id, teacher__user__pk=user.pk)
+
+        register_students = Registration.objects.filter(
+            academic_year=schedule.academic_year_id, section=schedule.section_id).select_related(
+            'student__user').order_by('student__user__last_name', 'student__user__first_name')
+
+        # every mark of the section for this subject is read once and reduced in memory
+        student_assessments = StudentAssessment.objects.filter(
+            assessment__teacher__user__pk=user.pk,
+            assessment__academic_year=schedule.academic_year_id, assessment__subject=schedule.subject_id,
+            student__in=register_students.values('student')).order_by('created_at')
+        section_grades = calculate_section_grades(student_assessments)
+
+        students = []
+        for register_student in register_students:
+            student = register_student.student
+            data = section_grades.get(student.pk) or grades_from_periods({})
+            data['student'] = StudentSerializer(
+                student, context={'request': request}).data
+            students.append(data)
+
+        data = {
+            'schedule_id': str(schedule.pk),
+            'subject': schedule.subject.name,
+            'section': schedule.section.name,
+            'students': students,
+        }
+
+        return response.Response(data, status=status.HTTP_200_OK)
+
+
+class TeacherAssessmentListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = AssessmentSerializers
     queryset = Assessment.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    select_related_fields = ASSESSMENT_RELATED_FIELDS
     pagination_class = ExtraSmallResultsSetPagination
     filter_backends = [CustomFilterAssessment, filters.OrderingFilter]
     ordering_fileds = ['name',]
 
     def get_queryset(self):
-        academic_years = AcademicYear.objects.all()
-        if academic_years.exists():
+        current_academic = current_academic_year(self.request)
+        if current_academic:
             user = self.request.user
             teacher = get_object_or_404(Teacher, user=user)
 
-            current_academic = academic_years.first()
 
             return self.queryset.filter(
                 academic_year=current_academic, teacher=teacher)
         return []
 
 
-class TeacherAssessmentStudentListView(generics.ListAPIView):
+class TeacherAssessmentStudentListView(EagerLoadingMixin, generics.ListAPIView):
     serializer_class = StudentAssessmentSerializers
     queryset = StudentAssessment.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    select_related_fields = STUDENT_ASSESSMENT_RELATED_FIELDS
     pagination_class = ExtraSmallResultsSetPagination
     filter_backends = [CustomFilterStudentAssessment]
 
@@ -381,8 +385,8 @@ class TeacherAssessmentStudentListView(generics.ListAPIView):
         section_id = self.request.GET.get('section_id', None)
         subject_id = self.request.GET.get('subject_id', None)
 
-        academic_years = AcademicYear.objects.all()
-        if academic_years.exists():
+        current_academic = current_academic_year(self.request)
+        if current_academic:
             user = self.request.user
             teacher = get_object_or_404(Teacher, user=user)
             schedules = Schedule.objects.filter(
@@ -390,7 +394,6 @@ class TeacherAssessmentStudentListView(generics.ListAPIView):
 
             if schedules.exists():
                 schedule = schedules.first()
-                current_academic = academic_years.first()
                 students = Registration.objects.filter(
                     section=schedule.section).values('student')
 
@@ -424,30 +427,43 @@ class StudentAssessmentUpdateOrCreateView(APIView):
             pk=student_assessment_id,
             student=student, assessment=assessment)
         student_assessments.update(obtained_marks=obtained_marks)
+        # queryset update skips post_save, refresh the materialized grade and notify here
+        refresh_assessment_period_grades(assessment, student_ids=[student.pk])
+        push_queue.enqueue([student.pk], PushEvent.GRADES)
 
         serializer = StudentAssessmentSerializers(
             student_assessments.first())
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class TeacherAttendaceListCreateView(generics.ListCreateAPIView):
+class TeacherAttendaceListCreateView(EagerLoadingMixin, generics.ListCreateAPIView):
     serializer_class = TimeOutAttendanceSerializers
     queryset = Registration.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    select_related_fields = ['student__user']
     pagination_class = ExtraSmallResultsSetPagination
 
     def get_queryset(self):
-        academic_years = AcademicYear.objects.all()
+        academic_year = current_academic_year(self.request)
 
-        if academic_years.exists():
+        if academic_year:
             schedule_id = self.request.GET.get('schedule_id', None)
-            academic_year = academic_years.first()
-            schedule = get_object_or_404(Schedule, pk=schedule_id)
+            self.schedule = get_object_or_404(Schedule, pk=schedule_id)
 
-            return self.queryset.filter(section=schedule.section, academic_year=academic_year)
+            return self.queryset.filter(section=self.schedule.section_id, academic_year=academic_year)
 
         return []
 
+    def get_serializer(self, *args, **kwargs):
+        schedule = getattr(self, 'schedule', None)
+        if kwargs.get('many') and args and schedule:
+            # the attendance of the whole page in one query
+            kwargs['context'] = self.get_serializer_context()
+            kwargs['context']['attendances'] = day_attendances(
+                schedule, [registration.student_id for registration in args[0]], timezone.localdate())
+
+        return super().get_serializer(*args, **kwargs)
+
     def get_serializer_context(self):
         """
         Add request to serializer context
@@ -459,28 +475,24 @@ class TeacherAttendaceListCreateView(generics.ListCreateAPIView):
     def post(self, request, *args, **kwargs):
         student_ids = request.data.get('student_ids', None)
         schedule_id = request.GET.get('schedule_id', None)
-        current_date = datetime.now()
         schedule = get_object_or_404(Schedule, pk=schedule_id)
-        is_created = True if student_ids else False
 
-        time_out_students = []
+        if not isinstance(student_ids, list):
+            error = {
+                "error_message": "student_ids must be a list"
+            }
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
 
-        for student_id in student_ids:
-            attendances = Attendance.objects.filter(
-                student__pk=student_id, time_in__date=current_date, schedule=schedule)
-            if attendances.exists():
-                attendance = attendances.first()
-                if not attendance.time_out and attendance.is_present:
-                    attendance.time_out = current_date
-                    attendance.save()
-            else:
-                student = get_object_or_404(Student, pk=student_id)
-                Attendance.objects.create(
-                    student=student, schedule=schedule, is_present=False, time_in=None)
-            time_out_students.append(student_id)
+        is_created = True if student_ids else False
+
+        attendances = time_out_students(schedule, student_ids)
+        if attendances is None:
+            raise Http404
 
-        serializer = TimeOutAttendanceSerializers(Registration.objects.filter(
-            student__pk__in=time_out_students), many=True, context={'request': request})
+        registrations = Registration.objects.filter(
+            student__pk__in=attendances.keys(), academic_year=schedule.academic_year_id).select_related('student__user')
+        serializer = TimeOutAttendanceSerializers(registrations, many=True, context={
+            'request': request, 'attendances': attendances})
 
         return Response(serializer.data,
                         status=status.HTTP_201_CREATED if is_created else status.HTTP_200_OK)
@@ -1,11 +1,21 @@
 # AES 256 encryption/decryption using pycryptodome library
 
 from base64 import b64encode, b64decode
+from functools import lru_cache
 import hashlib
 from Cryptodome.Cipher import AES
 import os
 from Cryptodome.Random import get_random_bytes
 
+# QR payload versions
+#   legacy: cipher_text$salt$nonce$tag, random salt per code
+#   v2:     v2$key_id$nonce$cipher_text$tag, one salt per deployment key
+QR_VERSION = 'v2'
+QR_SEPARATOR = '$'
+
+# derived keys kept per process, one entry per (password, salt)
+KEY_CACHE_SIZE = 4096
+
 
 # pad with spaces at the end of the text
 # beacuse AES needs 16 byte blocks
@@ -22,13 +32,36 @@ def unpad(s):
     return s.rstrip()
 
 
+def scrypt_key(password, salt):
+    # ~16 MB and tens of milliseconds per call, use derive_key instead
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=2**14, r=8, p=1, dklen=32)
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def derive_key(password, salt):
+    # salts are unique per legacy QR code and fixed for v2 codes,
+    # so a student scanning every day only pays for scrypt once per process
+    return scrypt_key(password, salt)
+
+
+def deployment_salt(password):
+    # fixed salt for v2 codes, derived from the deployment key itself
+    return hashlib.sha256(b'ease-studyante-qr-salt' + password.encode()).digest()[:AES.block_size]
+
+
+def key_id(password):
+    # short identifier of the deployment key, lets a rotated key be detected
+    return hashlib.sha256(b'ease-studyante-qr-kid' + password.encode()).hexdigest()[:8]
+
+
 def encrypt(plain_text, password):
     # generate a random salt
     salt = get_random_bytes(AES.block_size)
 
-    # use the Scrypt KDF to get a private key from the password
-    private_key = hashlib.scrypt(
-        password.encode(), salt=salt, n=2**14, r=8, p=1, dklen=32)
+    # use the Scrypt KDF to get a private key from the password,
+    # not cached since the salt is new on every call
+    private_key = scrypt_key(password, salt)
 
     # create cipher config
     cipher_config = AES.new(private_key, AES.MODE_GCM)
@@ -52,8 +85,7 @@ def decrypt(enc_dict, password):
     tag = b64decode(enc_dict['tag'])
 
     # generate the private key from the password and salt
-    private_key = hashlib.scrypt(
-        password.encode(), salt=salt, n=2**14, r=8, p=1, dklen=32)
+    private_key = derive_key(password, salt)
 
     # create the cipher config
     cipher = AES.new(private_key, AES.MODE_GCM, nonce=nonce)
@@ -64,6 +96,48 @@ def decrypt(enc_dict, password):
     return decrypted
 
 
+def encrypt_qr(plain_text, password):
+    # v2 payload, decrypting it only needs AES-GCM once the key is cached
+    private_key = derive_key(password, deployment_salt(password))
+    cipher_config = AES.new(private_key, AES.MODE_GCM)
+    cipher_text, tag = cipher_config.encrypt_and_digest(
+        bytes(plain_text, 'utf-8'))
+
+    return QR_SEPARATOR.join([
+        QR_VERSION,
+        key_id(password),
+        b64encode(cipher_config.nonce).decode('utf-8'),
+        b64encode(cipher_text).decode('utf-8'),
+        b64encode(tag).decode('utf-8'),
+    ])
+
+
+def decrypt_qr(payload, password):
+    # accepts v2 payloads and the legacy four part codes already printed
+    if not isinstance(payload, str):
+        raise ValueError('QR code must be a string')
+    parts = payload.split(QR_SEPARATOR)
+
+    if len(parts) == 5 and parts[0] == QR_VERSION:
+        _, payload_key_id, nonce, cipher_text, tag = parts
+        if payload_key_id != key_id(password):
+            raise ValueError('QR code was encrypted with another key')
+
+        private_key = derive_key(password, deployment_salt(password))
+        cipher = AES.new(private_key, AES.MODE_GCM, nonce=b64decode(nonce))
+        return cipher.decrypt_and_verify(b64decode(cipher_text), b64decode(tag))
+
+    if len(parts) == 4:
+        return decrypt({
+            'cipher_text': parts[0],
+            'salt': parts[1],
+            'nonce': parts[2],
+            'tag': parts[3]
+        }, password)
+
+    raise ValueError('Unknown QR code format')
+
+
 # def main():
 #     password = "SECRET_KEY"
 #     student = "JR2"
@@ -0,0 +1,255 @@
+import json
+import statistics
+import time
+from collections import namedtuple
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Min
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlencode, urlsafe_base64_encode
+from rest_framework.test import APIClient
+
+from academic_record.academic_year import clear_current_academic_year
+from academic_record.models import AcademicYear, Attendance, Schedule, StudentAssessment
+from academic_record.seed import seed_school
+from aes.aes_implementation import encrypt_qr
+from api import urls as api_urls
+from base.models import User
+from chat.models import ChatSession
+from core.benchmark import check_benchmark_database
+from core.instrumentation import percentile
+from registration.models import Registration
+
+# the password of the change-password user, valid for the change-password rules
+PASSWORD = 'b3nchmark'
+
+# a request of the benchmark, user names a fixture of the school (None is anonymous)
+# and kwargs, query and body take the fixtures and return the url kwargs, query or JSON body
+Route = namedtuple('Route', 'name method user kwargs query body', defaults=(None, None, None))
+
+# every route of api/urls.py with the parameters the apps send
+ROUTES = [
+    Route('api-root', 'get', 'admin'),
+    Route('student-attendance-list', 'post', 'teacher',
+          body=lambda school: {'student': school.qr_code}),
+    Route('student-attendance-batch', 'post', 'teacher',
+          body=lambda school: {'scans': [{'student': school.qr_code}]}),
+    Route('change-password', 'put', 'password_user',
+          body=lambda school: {'old_password': PASSWORD, 'new_password': PASSWORD}),
+    Route('forgot-password ', 'post', None,
+          body=lambda school: {'email_address': school.student.user.email}),
+    Route('password-reset-confirm', 'get', None,
+          kwargs=lambda school: {'uidb64': urlsafe_base64_encode(force_bytes(school.student.user_id)),
+                                 'token': default_token_generator.make_token(school.student.user)}),
+    Route('metrics', 'get', 'admin'),
+    Route('department', 'get', 'admin',
+          kwargs=lambda school: {'pk': school.schedule.subject.department_id}),
+    Route('student-profile', 'get', 'student'),
+    Route('student-schedule', 'get', 'student'),
+    Route('student-attendance', 'get', 'student',
+          query=lambda school: {'subject_id': school.schedule.subject_id}),
+    Route('student-attendance-detail', 'get', 'student',
+          kwargs=lambda school: {'pk': school.attendance.pk}),
+    Route('student-assessments', 'get', 'student',
+          query=lambda school: {'grading_period': 'FIRST_GRADING', 'subject_id': school.schedule.subject_id}),
+    Route('student-gpa', 'get', 'student',
+          query=lambda school: {'subject_id': school.schedule.subject_id}),
+    Route('student-chat-list', 'get', 'student'),
+    Route('student-qr-code', 'get', 'student',
+          kwargs=lambda school: {'pk': school.student.pk}),
+    Route('teacher-profile', 'get', 'teacher'),
+    Route('teacher-schedules', 'get', 'teacher'),
+    Route('teacher-registered-students', 'get', 'teacher',
+          query=lambda school: {'section': school.schedule.section_id}),
+    Route('teacher-assessments', 'get', 'teacher',
+          query=lambda school: {'grading_period': 'FIRST_GRADING', 'student_id': school.student.user_id}),
+    Route('teacher-assessments-student', 'get', 'teacher',
+          query=lambda school: {'section_id': school.schedule.section_id,
+                                'subject_id': school.schedule.subject_id}),
+    Route('teacher-web-assessments', 'get', 'teacher'),
+    Route('teacher-attendance-timeout', 'get', 'teacher',
+          query=lambda school: {'schedule_id': school.schedule.pk}),
+    Route('teacher-attendance-timeout', 'post', 'teacher',
+          query=lambda school: {'schedule_id': school.schedule.pk},
+          body=lambda school: {'student_ids': [str(school.student.pk)]}),
+    Route('teacher-students-attendance', 'get', 'teacher',
+          query=lambda school: {'student_id': school.student.user_id, 'subject_id': school.schedule.subject_id}),
+    Route('teacher-student-gpa', 'get', 'teacher',
+          query=lambda school: {'student_id': school.student.user_id, 'subject_id': school.schedule.subject_id}),
+    Route('teacher-section-grade-sheet', 'get', 'teacher',
+          query=lambda school: {'schedule_id': school.schedule.pk}),
+    Route('update-create-student-assessment', 'post', 'teacher',
+          body=lambda school: {'id': str(school.student_assessment.pk),
+                               'assessment_id': str(school.student_assessment.assessment_id),
+                               'student_id': str(school.student.pk),
+                               'obtained_marks': school.student_assessment.obtained_marks}),
+    Route('parent-profile', 'get', 'parent'),
+    Route('chat-sessions', 'get', 'teacher'),
+    Route('chat-messages', 'get', 'teacher',
+          query=lambda school: {'session_id': school.chat_session.pk}),
+    Route('chat-session', 'get', 'teacher',
+          query=lambda school: {'room_name': school.chat_session.room_name}),
+    Route('chat-sessions-search', 'get', 'teacher',
+          query=lambda school: {'q': school.student.user.first_name}),
+]
+
+
+def api_route_names():
+    # the router adds a format suffix pattern of the same name to its routes
+    return list(dict.fromkeys(pattern.name for pattern in api_urls.urlpatterns if pattern.name))
+
+
+def school_fixtures(prefix):
+    """
+        The users and rows the requests are made with: a registered student
+        of the seeded school, one of its schedules and that teacher, the
+        parent, an attendance, a graded assessment and a chat of the teacher.
+        The seeded academic year is made the current one.
+    """
+    academic_year = AcademicYear.objects.filter(name__startswith=f'{prefix} ').first()
+    if academic_year is None:
+        raise CommandError(f'No school was seeded with prefix {prefix!r}')
+
+    earliest = AcademicYear.objects.aggregate(earliest=Min('created_at'))['earliest']
+    AcademicYear.objects.filter(pk=academic_year.pk).update(created_at=earliest - timedelta(seconds=1))
+    clear_current_academic_year()
+
+    registration = Registration.objects.select_related('student__user', 'student__parent__user').filter(
+        academic_year=academic_year).order_by('student__user__username').first()
+    if registration is None:
+        raise CommandError(f'The school of prefix {prefix!r} has no registered students')
+    student = registration.student
+    schedule = Schedule.objects.select_related('subject', 'teacher__user').filter(
+        academic_year=academic_year, section_id=registration.section_id).order_by('subject__name').first()
+    teacher = schedule.teacher.user
+
+    admin = User.objects.create_superuser(f'{prefix}-admin', f'{prefix}-admin@example.com', PASSWORD)
+    password_user = User.objects.create_user(f'{prefix}-password', f'{prefix}-password@example.com', PASSWORD)
+
+    return SimpleNamespace(
+        academic_year=academic_year, student=student, schedule=schedule,
+        qr_code=encrypt_qr(str(student.pk), settings.AES_SECRET_KEY),
+        attendance=Attendance.objects.filter(student=student, schedule=schedule).first(),
+        student_assessment=StudentAssessment.objects.filter(
+            student=student, assessment__teacher=schedule.teacher).first(),
+        chat_session=ChatSession.objects.filter(teacher=teacher).first() or ChatSession.objects.filter(
+            room_name__startswith=f'{prefix}-').first(),
+        users={'admin': admin, 'password_user': password_user, 'student': student.user, 'teacher': teacher,
+               'parent': student.parent.user if student.parent else None})
+
+
+class Command(BaseCommand):
+    help = ('Seed a school in a transaction that is rolled back, request every route of api/urls.py '
+            'with the test client and report latency percentiles, queries and response size as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='benchmark', help='Start of the seeded names')
+        parser.add_argument('--existing', action='store_true',
+                            help='Use the school seed_school loaded with --prefix instead of seeding one')
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--sections', type=int, default=25)
+        parser.add_argument('--subjects', type=int, default=8)
+        parser.add_argument('--days', type=int, default=20, help='School days of attendance')
+        parser.add_argument('--assessments', type=int, default=2, help='Assessments per type and grading period')
+        parser.add_argument('--chat-messages', type=int, default=20, help='Messages per chat session')
+        parser.add_argument('--repeat', type=int, default=20, help='Measured requests of every route')
+        parser.add_argument('--output', help='Write the report to this file instead of stdout')
+        parser.add_argument('--baseline', help='Report of an earlier run to compare with')
+        parser.add_argument('--force', action='store_true',
+                            help='Run against a database that is not a test one')
+
+    def measure(self, client, route, school, repeat):
+        kwargs = route.kwargs(school) if route.kwargs else None
+        url = reverse(f'api:{route.name}', kwargs=kwargs)
+        if route.query:
+            url = f'{url}?{urlencode(route.query(school))}'
+        body = route.body(school) if route.body else None
+
+        timings = []
+        # the first request warms the caches and is not counted
+        for _ in range(repeat + 1):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                if route.method == 'get':
+                    response = client.get(url)
+                else:
+                    response = getattr(client, route.method)(url, body, format='json')
+                timings.append((time.perf_counter() - started) * 1000)
+
+        timings = timings[1:]
+        return {
+            'path': url,
+            'status': response.status_code,
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'queries': len(queries),
+            'bytes': 0 if response.streaming else len(response.content),
+        }
+
+    def compare(self, endpoints, baseline_path):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)['endpoints']
+
+        for name, result in endpoints.items():
+            before = baseline.get(name)
+            if before:
+                result['baseline'] = {key: before[key] for key in ('p50_ms', 'p95_ms', 'queries', 'bytes')}
+                result['p50_change'] = round(result['p50_ms'] / before['p50_ms'] - 1, 3) if before['p50_ms'] else None
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        # the seeded school and the requests hold their row locks until the rollback
+        check_benchmark_database(options['force'])
+
+        report = {'repeat': options['repeat']}
+        # the seeded year is made the current one in this process only, the shared cache
+        # would hand it to the other workers until the rollback
+        with override_settings(ACADEMIC_YEAR_CACHE_ALIAS=None):
+            try:
+                with transaction.atomic():
+                    if not options['existing']:
+                        started = time.perf_counter()
+                        report['school'] = seed_school(
+                            prefix=options['prefix'], students=options['students'], sections=options['sections'],
+                            subjects=options['subjects'], days=options['days'], assessments=options['assessments'],
+                            chat_messages=options['chat_messages'], parents=max(1, options['students'] // 2))
+                        report['seed_seconds'] = round(time.perf_counter() - started, 1)
+
+                    school = school_fixtures(options['prefix'])
+                    clients = {}
+                    for name, user in school.users.items():
+                        clients[name] = APIClient(raise_request_exception=False)
+                        clients[name].force_authenticate(user)
+                    clients[None] = APIClient(raise_request_exception=False)
+
+                    endpoints = {}
+                    for route in ROUTES:
+                        endpoints[f'{route.name.strip()} {route.method.upper()}'] = self.measure(
+                            clients[route.user], route, school, options['repeat'])
+
+                    transaction.set_rollback(True)
+            finally:
+                # the seeded year was the current one until the rollback
+                clear_current_academic_year()
+
+        covered = {route.name for route in ROUTES}
+        report['skipped'] = [name for name in api_route_names() if name not in covered]
+        report['endpoints'] = endpoints
+        if options['baseline']:
+            self.compare(endpoints, options['baseline'])
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+            self.stdout.write(f'Wrote {len(endpoints)} endpoints to {options["output"]}')
+        else:
+            self.stdout.write(output)
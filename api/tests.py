@@ -1,3 +1,144 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from academic_record.academic_year import CACHE_KEY
+from api.management.commands.benchmark_api import api_route_names
+from base.models import User
+from core.instrumentation import MS_BUCKETS, Histogram, registry
+from user_profile.models import Parent, Student
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=0)
+class InstrumentationTestCase(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'p4ssw0rD')
+        self.parent = Parent.objects.create(
+            user=User.objects.create_user('parent', 'parent@example.com', 'p4ssw0rD'),
+            address='Manila', contact_number='09170000010', age=40)
+        for index in range(3):
+            Student.objects.create(
+                user=User.objects.create_user(f'student{index}', f'student{index}@example.com', 'p4ssw0rD'),
+                address='Manila', contact_number=f'0917000002{index}', age=13, parent=self.parent)
+        self.client = APIClient()
+
+    def metrics(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse('api:metrics'))
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_requests_are_grouped_by_url_name(self):
+        self.client.force_authenticate(self.parent.user)
+        for _ in range(3):
+            response = self.client.get(reverse('api:parent-profile'))
+
+        endpoint = self.metrics()['endpoints']['api:parent-profile']
+        self.assertEqual(endpoint['requests'], 3)
+        self.assertEqual(endpoint['errors'], 0)
+        self.assertGreater(endpoint['queries']['max'], 0)
+        self.assertGreater(endpoint['serializer_ms']['max'], 0)
+        self.assertEqual(endpoint['bytes']['max'], len(response.content))
+        self.assertEqual(sum(endpoint['wall_ms']['buckets'].values()), 3)
+        self.assertEqual(endpoint['samples'], [])
+
+    def test_metrics_include_the_email_and_push_queues(self):
+        metrics = self.metrics()
+        self.assertIn('outbox', metrics['email_queue'])
+        self.assertIn('events', metrics['push_queue'])
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1, INSTRUMENTATION_SAMPLE_QUERIES=2)
+    def test_sampled_requests_keep_their_slowest_queries(self):
+        self.client.force_authenticate(self.parent.user)
+        with self.assertLogs('core.instrumentation', 'INFO') as logs:
+            self.client.get(reverse('api:parent-profile'))
+            sample = self.metrics()['endpoints']['api:parent-profile']['samples'][0]
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['endpoint'], line['status']), ('api:parent-profile', 200))
+        self.assertEqual(len(line['sql']), 2)
+        self.assertEqual(sample['path'], reverse('api:parent-profile'))
+        self.assertGreaterEqual(sample['sql'][0][0], sample['sql'][1][0])
+
+    def test_unsampled_fast_requests_log_at_debug(self):
+        self.client.force_authenticate(self.parent.user)
+        with self.assertLogs('core.instrumentation', 'DEBUG') as logs:
+            self.client.get(reverse('api:parent-profile'))
+
+        self.assertEqual(logs.records[0].levelname, 'DEBUG')
+        self.assertNotIn('sql', json.loads(logs.records[0].getMessage()))
+
+    def test_only_admins_read_and_reset(self):
+        self.client.force_authenticate(self.parent.user)
+        self.assertEqual(self.client.get(reverse('api:metrics')).status_code, 403)
+
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.delete(reverse('api:metrics')).status_code, 204)
+        self.assertEqual(list(self.metrics()['endpoints']), ['api:metrics'])
+
+    @override_settings(INSTRUMENTATION_ENABLED=False)
+    def test_can_be_turned_off(self):
+        self.client.force_authenticate(self.parent.user)
+        self.client.get(reverse('api:parent-profile'))
+
+        self.assertNotIn('api:parent-profile', registry.summary()['endpoints'])
+
+    def test_histogram_percentiles(self):
+        histogram = Histogram(MS_BUCKETS)
+        for value in [1.5] * 90 + [40] * 9 + [3000]:
+            histogram.add(value)
+
+        summary = histogram.summary()
+        self.assertEqual((summary['p50'], summary['p95'], summary['p99']), (2, 50, 50))
+        self.assertEqual(summary['max'], 3000)
+        self.assertEqual(summary['buckets']['5000'], 1)
+
+
+@override_settings(INSTRUMENTATION_SAMPLE_RATE=0, AES_SECRET_KEY='test-aes-secret-key')
+class BenchmarkApiTestCase(TestCase):
+    def test_reports_every_api_route(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, 'baseline.json')
+            call_command('benchmark_api', students=6, sections=2, subjects=2, days=2, assessments=1,
+                         chat_messages=2, repeat=1, output=baseline, stdout=StringIO())
+            out = StringIO()
+            call_command('benchmark_api', students=6, sections=2, subjects=2, days=2, assessments=1,
+                         chat_messages=2, repeat=2, baseline=baseline, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['skipped'], [])
+        self.assertEqual({name.rsplit(' ', 1)[0] for name in report['endpoints']},
+                         {name.strip() for name in api_route_names()})
+        for name, result in report['endpoints'].items():
+            self.assertLess(result['status'], 400, name)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+            self.assertIn('baseline', result)
+        self.assertFalse(User.objects.exists())
+
+    @override_settings(ACADEMIC_YEAR_CACHE_ALIAS='default')
+    def test_keeps_the_seeded_year_out_of_the_shared_cache(self):
+        caches['default'].set(CACHE_KEY, ('shared',))
+        call_command('benchmark_api', students=2, sections=1, subjects=1, days=1, assessments=1,
+                     chat_messages=1, repeat=1, stdout=StringIO())
+
+        self.assertEqual(caches['default'].get(CACHE_KEY), ('shared',))
+
+    @override_settings(DEBUG=True)
+    def test_refuses_a_live_database(self):
+        name = connection.settings_dict['NAME']
+        connection.settings_dict['NAME'] = '/srv/ease_studyante.sqlite3'
+        try:
+            with self.assertRaisesMessage(CommandError, '--force'):
+                call_command('benchmark_api', students=2, repeat=1, stdout=StringIO())
+        finally:
+            connection.settings_dict['NAME'] = name
@@ -3,10 +3,12 @@ from rest_framework.routers import DefaultRouter
 
 from chat.views import ChatMessageListView, ChatMessageRetrieveView, ChatSessionListCreateView, SearchChatUserListView
 from class_information.views import DepartmentListCreateView
-from user_profile.views import ChangePasswordView, RequestPasswordResetEmail, StudentProfileView, TeacherProfileView, ParentProfileView
+from user_profile.views import (
+    ChangePasswordView, RequestPasswordResetEmail, StudentProfileView, StudentQRCodeView, TeacherProfileView,
+    ParentProfileView)
 from academic_record.views import (
     TeacherScheduleListView, AttendanceTeacherViewSet, TeacherStudentAssessmentListView,
-    AttendanceTeacherListView, TeacherStudentOverAllGPAView, 
+    AttendanceTeacherListView, TeacherStudentOverAllGPAView, TeacherSectionGradeSheetView,
     TeacherAssessmentListView, TeacherAssessmentStudentListView, StudentAssessmentUpdateOrCreateView,
     TeacherAttendaceListCreateView)
 from academic_record.student_views import (
@@ -15,6 +17,8 @@ from academic_record.student_views import (
 from registration.views import RegisteredStudentListView
 from django.contrib.auth import views as auth_views
 
+from api.views import MetricsView
+
 app_name = 'api'
 
 router = DefaultRouter()
@@ -33,6 +37,8 @@ urlpatterns += [
          name='password-reset-confirm'),
 
 
+    path('metrics', MetricsView.as_view(), name='metrics'),
+
     # DEPARTMENT
     path('department/list/<pk>', DepartmentListCreateView.as_view(),
          name='department'),
@@ -52,6 +58,8 @@ urlpatterns += [
          name='student-gpa'),
     path('student/chat-list', StudentChatTeacherListView.as_view(),
          name='student-chat-list'),
+    path('student/<uuid:pk>/qr-code', StudentQRCodeView.as_view(),
+         name='student-qr-code'),
 
 
 
@@ -74,6 +82,8 @@ urlpatterns += [
          name='teacher-students-attendance'),
     path('teacher/student/over-all-gpa', TeacherStudentOverAllGPAView.as_view(),
          name='teacher-student-gpa'),
+    path('teacher/section/grade-sheet', TeacherSectionGradeSheetView.as_view(),
+         name='teacher-section-grade-sheet'),
     path('teacher/update-create-student-assessment', StudentAssessmentUpdateOrCreateView.as_view(),
          name='update-create-student-assessment'),
 
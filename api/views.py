@@ -1,3 +1,21 @@
-from django.shortcuts import render
+from rest_framework import permissions, response, status, views
 
-# Create your views here.
+from core.instrumentation import registry
+from user_profile.email import email_queue
+from user_profile.push import push_queue
+
+
+class MetricsView(views.APIView):
+    """
+        Request metrics per endpoint of the process answering, with the
+        email and push queues. DELETE starts the histograms over.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return response.Response({**registry.summary(), 'email_queue': email_queue.metrics(),
+                                  'push_queue': push_queue.metrics()})
+
+    def delete(self, request, *args, **kwargs):
+        registry.reset()
+        return response.Response(status=status.HTTP_204_NO_CONTENT)
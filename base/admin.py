@@ -12,6 +12,8 @@ from django.db.models import QuerySet
 from django.http import Http404
 from django.template.response import TemplateResponse
 from django.utils.translation import gettext_lazy as _
+from fcm_django.admin import DeviceAdmin
+from fcm_django.models import FCMDevice
 from reversion.admin import VersionAdmin
 from django.contrib.admin.utils import NestedObjects
 
@@ -20,6 +22,7 @@ from base.models import (
     User,
     AppIcon,
 )
+from core.firebase import firebase_app
 
 
 class BaseModelInline(admin.StackedInline):
@@ -408,3 +411,18 @@ class AppIconAdmin(BaseAdmin):
         }),
     )
     readonly_fields = ('width', 'height', 'created_at', 'updated_at',)
+
+
+class FCMDeviceAdmin(DeviceAdmin):
+    # the test notification actions are the first push of the process
+    def send_messages(self, request, queryset, bulk=False):
+        firebase_app()
+        return super().send_messages(request, queryset, bulk)
+
+    def handle_topic_subscription(self, request, queryset, should_subscribe, bulk=False):
+        firebase_app()
+        return super().handle_topic_subscription(request, queryset, should_subscribe, bulk)
+
+
+admin.site.unregister(FCMDevice)
+admin.site.register(FCMDevice, FCMDeviceAdmin)
@@ -0,0 +1,118 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROFILES = ['ease_studyante_core.settings', 'ease_studyante_core.settings_api']
+
+# what a worker does before its first request: the ASGI application and the url patterns,
+# the wall time is printed on the last line
+STARTUP_SCRIPT = '''
+import json
+import time
+started = time.perf_counter()
+import ease_studyante_core.asgi
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(json.dumps({'ms': (time.perf_counter() - started) * 1000}))
+'''
+
+
+def import_times(stderr):
+    """
+        Self time in ms of every top level package in the -X importtime
+        output, and the number of modules imported.
+    """
+    packages = Counter()
+    modules = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        packages[name.strip().split('.')[0]] += int(self_us) / 1000
+        modules += 1
+    return packages, modules
+
+
+class Command(BaseCommand):
+    help = ('Start a fresh interpreter per settings profile with -X importtime, report the cold start '
+            'time and the packages it goes to as JSON and fail when it is slower than allowed')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', dest='profiles',
+                            help=f'Settings module to start, repeatable, {" and ".join(PROFILES)} by default')
+        parser.add_argument('--repeat', type=int, default=5, help='Starts per profile, the median is reported')
+        parser.add_argument('--top', type=int, default=15, help='Slowest packages reported per profile')
+        parser.add_argument('--max-ms', type=float, help='Fail when a profile starts slower than this')
+        parser.add_argument('--baseline', help='Report of an earlier run to compare with')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Fraction a profile may be slower than in the baseline')
+        parser.add_argument('--output', help='Write the report to this file instead of stdout')
+
+    def start(self, profile):
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT], cwd=settings.BASE_DIR,
+            env=dict(os.environ, DJANGO_SETTINGS_MODULE=profile), capture_output=True, text=True)
+        if completed.returncode:
+            raise CommandError(f'{profile} did not start:\n{completed.stderr[-2000:]}')
+        return json.loads(completed.stdout.splitlines()[-1])['ms'], completed.stderr
+
+    def profile(self, profile, repeat, top):
+        runs = sorted((self.start(profile) for _ in range(repeat)), key=lambda run: run[0])
+        # the imports of the median start
+        packages, modules = import_times(runs[len(runs) // 2][1])
+        timings = [ms for ms, _ in runs]
+        return {
+            'cold_start_ms': {
+                'median': round(statistics.median(timings), 1),
+                'min': round(timings[0], 1),
+                'max': round(timings[-1], 1),
+            },
+            'modules': modules,
+            'import_ms': round(sum(packages.values()), 1),
+            'packages_ms': {name: round(ms, 1) for name, ms in packages.most_common(top)},
+        }
+
+    def regressions(self, report, options):
+        failures = []
+        baseline = {}
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)['profiles']
+
+        for profile, result in report['profiles'].items():
+            median = result['cold_start_ms']['median']
+            if options['max_ms'] is not None and median > options['max_ms']:
+                failures.append(f'{profile} starts in {median}ms, more than {options["max_ms"]}ms')
+            if profile in baseline:
+                allowed = baseline[profile]['cold_start_ms']['median'] * (1 + options['tolerance'])
+                if median > allowed:
+                    failures.append(f'{profile} starts in {median}ms, more than {allowed:.1f}ms '
+                                    f'allowed by the baseline')
+        return failures
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+
+        report = {'python': sys.version.split()[0], 'repeat': options['repeat'], 'profiles': {
+            profile: self.profile(profile, options['repeat'], options['top'])
+            for profile in options['profiles'] or PROFILES}}
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+            self.stdout.write(', '.join(f'{profile} {result["cold_start_ms"]["median"]}ms'
+                                        for profile, result in report['profiles'].items()))
+        else:
+            self.stdout.write(output)
+
+        failures = self.regressions(report, options)
+        if failures:
+            raise CommandError('Startup regressed: ' + '; '.join(failures))
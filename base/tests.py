@@ -1,7 +1,18 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+import firebase_admin
 from django.contrib import admin
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase, Client
 
+from base.management.commands.profile_startup import PROFILES
+from core.firebase import firebase_app
+
 
 class AdminPagesTestCase(TestCase):
     def setUp(self):
@@ -32,3 +43,39 @@ class AdminPagesTestCase(TestCase):
             for model in app['models']:
                 print(model['admin_url'])
                 self.client.get(model['admin_url'])
+
+
+class FirebaseAppTestCase(TestCase):
+    def tearDown(self):
+        firebase_admin.delete_app(firebase_app())
+
+    def test_initialized_once_on_first_use(self):
+        with self.assertRaises(ValueError):
+            firebase_admin.get_app()
+
+        app = firebase_app()
+        self.assertIs(firebase_app(), app)
+        self.assertIs(firebase_admin.get_app(), app)
+
+
+class ProfileStartupCommandTestCase(TestCase):
+    def test_reports_every_profile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, 'startup.json')
+            call_command('profile_startup', repeat=1, top=5, output=baseline, stdout=StringIO())
+            with open(baseline) as baseline_file:
+                report = json.load(baseline_file)
+
+            self.assertEqual(list(report['profiles']), PROFILES)
+            full, api_only = (report['profiles'][profile] for profile in PROFILES)
+            self.assertGreater(full['cold_start_ms']['median'], 0)
+            self.assertLessEqual(len(full['packages_ms']), 5)
+            self.assertLess(api_only['modules'], full['modules'])
+
+            # an impossible budget fails the check
+            report['profiles'][PROFILES[1]]['cold_start_ms']['median'] = 1
+            with open(baseline, 'w') as baseline_file:
+                json.dump(report, baseline_file)
+            with self.assertRaisesMessage(CommandError, PROFILES[1]):
+                call_command('profile_startup', profile=[PROFILES[1]], repeat=1, baseline=baseline,
+                             stdout=StringIO())
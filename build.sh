@@ -6,6 +6,9 @@ pip install -r requirements.txt
 
 python manage.py collectstatic --no-input
 python manage.py 
+# PeriodGrade rows are kept up to date by signals. Fill them once, after the
+# deploy that runs academic_record migration 0029:
+#   python manage.py migrate && python manage.py rebuild_period_grades
 
 if [[ $CREATE_SUPERUSER ]];
 then
@@ -1,27 +1,38 @@
 import json
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from django.utils import timezone
+from django.db.models import Q
 
-from base.models import User
+from chat.message_buffer import message_buffer
 from chat.models import ChatMessage, ChatSession
-from asgiref.sync import sync_to_async
+
+TIME_STAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.room_name = self.scope['url_route'].get(
             'kwargs', {}).get('room_name')
-        if self.room_name:
-            self.room_group_name = f"chat_{self.room_name}"
+        self.user = self.scope.get('user')
 
-            await self.channel_layer.group_add(
-                self.room_group_name,
-                self.channel_name
-            )
+        if not self.room_name or not self.user or not self.user.is_authenticated:
+            await self.close()
+            return
 
-            await self.accept()
-        else:
+        # the session stays the same for the whole connection
+        self.chat_session = await self.get_chat_session()
+        if self.chat_session is None:
             await self.close()
+            return
+
+        self.room_group_name = f"chat_{self.room_name}"
+
+        await self.channel_layer.group_add(
+            self.room_group_name,
+            self.channel_name
+        )
+
+        await self.accept()
 
     async def disconnect(self, close_code):
         if hasattr(self, 'room_group_name'):
@@ -30,32 +41,38 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
 
+    @database_sync_to_async
+    def get_chat_session(self):
+        return ChatSession.objects.filter(
+            Q(person=self.user) | Q(teacher=self.user), room_name=self.room_name).first()
+
     async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        message = text_data_json.get('message')
-        username = text_data_json["username"]
-        session_id = text_data_json["id"]
+        try:
+            text_data_json = json.loads(text_data)
+        except ValueError:
+            return
+
+        message = text_data_json.get('message') if isinstance(text_data_json, dict) else None
 
         if message and hasattr(self, 'room_group_name'):
+            # delivered right away, written once later by the message buffer
+            chat_message = ChatMessage(
+                chat_session_id=self.chat_session.pk, user_id=self.user.pk, message=message)
+            message_buffer.add(chat_message)
+
             await self.channel_layer.group_send(
                 self.room_group_name, {
                     "type": "sendMessage",
+                    "id": str(chat_message.pk),
                     "message": message,
-                    "username": username,
-                    "session_id": session_id,
+                    "username": self.user.username,
+                    "time_stamp": chat_message.timestamp.strftime(TIME_STAMP_FORMAT),
                 })
 
     async def sendMessage(self, event):
-        # TODO handle save messages
-        message = event["message"]
-        username = event["username"]
-        session_id = event["session_id"]
-        time_stamp = timezone.now().strftime('%Y-%m-%dT%H:%M:%S.%f')
-        
-        chat_session = await sync_to_async(ChatSession.objects.get)(pk=session_id)
-        user = await sync_to_async(User.objects.get)(username=username)
-        
-        await sync_to_async(ChatMessage.objects.create)(chat_session=chat_session, user=user, message=message)
-        
-        await self.send(text_data=json.dumps({"message": message, "username": username, "time_stamp": time_stamp}))
-   
\ No newline at end of file
+        await self.send(text_data=json.dumps({
+            "id": event["id"],
+            "message": event["message"],
+            "username": event["username"],
+            "time_stamp": event["time_stamp"],
+        }))
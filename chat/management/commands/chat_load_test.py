@@ -0,0 +1,402 @@
+import asyncio
+import json
+import multiprocessing
+import platform
+import secrets
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+
+import channels
+import django
+from channels.db import database_sync_to_async
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from oauth2_provider.models import AccessToken
+
+from base.models import User
+from chat import routing
+from chat.message_buffer import message_buffer
+from chat.models import ChatMessage, ChatSession
+from core.benchmark import check_benchmark_database
+from core.instrumentation import percentile
+
+LOAD_TEST_USERNAMES = ['chat_load_teacher', 'chat_load_person']
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+async def run_clients(users, room_name, messages, total_clients, start_barrier, timeout):
+    application = URLRouter(routing.websocket_urlpatterns)
+    communicators = []
+
+    for user in users:
+        communicator = WebsocketCommunicator(application, f'/ws/chat/{room_name}/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise RuntimeError(f'{user.username} could not join {room_name}')
+        communicators.append(communicator)
+
+    # every worker has joined the group before anyone sends
+    await asyncio.get_running_loop().run_in_executor(None, start_barrier.wait)
+    started = time.perf_counter()
+
+    # every socket of the room receives every message of the room
+    expected = total_clients * messages
+
+    async def client(communicator):
+        for index in range(messages):
+            await communicator.send_to(text_data=json.dumps({'message': f'load test {index}'}))
+        for _ in range(expected):
+            await communicator.receive_from(timeout)
+
+    await asyncio.gather(*(client(communicator) for communicator in communicators))
+    seconds = time.perf_counter() - started
+    await message_buffer.flush()
+
+    for communicator in communicators:
+        await communicator.disconnect()
+
+    return {'sent': len(users) * messages, 'received': len(users) * expected, 'seconds': seconds}
+
+
+def run_worker(user_ids, room_name, messages, total_clients, start_barrier, timeout, results):
+    try:
+        users_by_id = User.objects.in_bulk(set(user_ids))
+        results.put(asyncio.run(run_clients(
+            [users_by_id[user_id] for user_id in user_ids], room_name, messages,
+            total_clients, start_barrier, timeout)))
+    except Exception as error:
+        # the parent waits on the queue, never leave it empty
+        start_barrier.abort()
+        results.put({'error': repr(error)})
+
+
+class QueryCounter:
+    """
+        connection.execute_wrapper hook counting the queries and the writes
+        of every connection it is installed on, whichever thread runs them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries = 0
+        self.writes = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.queries += 1
+            if sql.lstrip().upper().startswith(WRITE_STATEMENTS):
+                self.writes += 1
+        return execute(sql, params, many, context)
+
+    def install(self):
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+
+    def uninstall(self):
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+def summary(values):
+    return {
+        'p50': round(percentile(values, 0.5), 2),
+        'p95': round(percentile(values, 0.95), 2),
+        'p99': round(percentile(values, 0.99), 2),
+        'max': round(max(values, default=0), 2),
+    }
+
+
+async def open_room(application, room, participants, connect_ms):
+    """
+        participants sockets of the room, taking turns between the tokens
+        of its teacher and its student like several devices of the two.
+    """
+    communicators = []
+    for index in range(participants):
+        token = room['tokens'][index % 2]
+        communicator = WebsocketCommunicator(application, f'/ws/chat/{room["room_name"]}/?token={token}')
+        started = time.perf_counter()
+        connected, _ = await communicator.connect()
+        connect_ms.append((time.perf_counter() - started) * 1000)
+        if not connected:
+            raise CommandError(f'Participant {index} could not join {room["room_name"]}')
+        communicators.append(communicator)
+    return communicators
+
+
+async def send_messages(room_name, communicators, messages, rate, sent_at):
+    # one message of the room every 1 / rate seconds, senders take turns
+    started = time.perf_counter()
+    for index in range(messages):
+        delay = started + index / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        message = f'{room_name} {index}'
+        sent_at[message] = time.perf_counter()
+        await communicators[index % len(communicators)].send_to(text_data=json.dumps({'message': message}))
+
+
+async def receive_messages(communicator, messages, timeout, sent_at, latencies):
+    # every socket of the room receives every message of the room, its own too
+    received = 0
+    for _ in range(messages):
+        try:
+            data = json.loads(await communicator.receive_from(timeout))
+        except asyncio.TimeoutError:
+            break
+        latencies.append((time.perf_counter() - sent_at[data['message']]) * 1000)
+        received += 1
+    return received
+
+
+async def run_rooms(application, rooms, participants, messages, rate, timeout, counter):
+    connect_ms = []
+    tracemalloc.start()
+    memory_before = tracemalloc.get_traced_memory()[0]
+    sockets = [await open_room(application, room, participants, connect_ms) for room in rooms]
+    memory = tracemalloc.get_traced_memory()[0] - memory_before
+    # tracing every allocation would slow down the messages
+    tracemalloc.stop()
+
+    await database_sync_to_async(counter.install)()
+    sent_at = {}
+    latencies = []
+    started = time.perf_counter()
+    try:
+        receivers = [receive_messages(communicator, messages, timeout, sent_at, latencies)
+                     for communicators in sockets for communicator in communicators]
+        senders = [send_messages(room['room_name'], communicators, messages, rate, sent_at)
+                   for room, communicators in zip(rooms, sockets)]
+        received = await asyncio.gather(*receivers, *senders)
+        seconds = time.perf_counter() - started
+
+        # write what the consumers buffered, inside the count
+        await asyncio.gather(*message_buffer.tasks)
+        await message_buffer.flush()
+    finally:
+        await database_sync_to_async(counter.uninstall)()
+
+    for communicators in sockets:
+        for communicator in communicators:
+            await communicator.disconnect()
+
+    return {
+        'connect_ms': connect_ms,
+        'memory': memory,
+        'sent': len(sent_at),
+        'delivered': sum(received[:len(receivers)]),
+        'latencies': latencies,
+        'seconds': seconds,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Measure chat messages per second with websocket clients of one room spread over worker '
+            'processes, or with --rooms the fan-out of many rooms sending at a fixed rate')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes, more than one needs a shared channel layer (REDIS_URL)')
+        parser.add_argument('--clients', type=int, default=10,
+                            help='Websocket clients per worker, or per room with --rooms')
+        parser.add_argument('--messages', type=int, default=20,
+                            help='Messages sent by each client, or in each room with --rooms')
+        parser.add_argument('--room', default='chat-load-test',
+                            help='Room name of the load test chat session')
+        parser.add_argument('--timeout', type=float, default=10,
+                            help='Seconds a client waits for the next message')
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Delete the load test session, messages and users afterwards')
+        parser.add_argument('--rooms', type=int,
+                            help='Open this many rooms through the ASGI application with access tokens and '
+                                 'report fan-out latency, database writes per message and memory per '
+                                 'connection as JSON')
+        parser.add_argument('--rate', type=float, default=5, help='With --rooms, messages per second in each room')
+        parser.add_argument('--prefix', default='chat-load',
+                            help='With --rooms, start of the usernames and room names')
+        parser.add_argument('--output', help='With --rooms, write the report to this file instead of stdout')
+        parser.add_argument('--keep', action='store_true',
+                            help='With --rooms, keep the load test users, rooms, tokens and messages')
+        parser.add_argument('--force', action='store_true',
+                            help='With --rooms, run against a database that is not a test one')
+
+    def handle(self, *args, **options):
+        if options['rooms'] is not None:
+            return self.handle_rooms(options)
+
+        workers = options['workers']
+        clients = options['clients']
+        if workers < 1 or clients < 1 or options['messages'] < 1:
+            raise CommandError('--workers, --clients and --messages must be at least 1')
+
+        if workers > 1 and isinstance(get_channel_layer(), InMemoryChannelLayer):
+            raise CommandError(
+                'The in memory channel layer does not reach other processes, set REDIS_URL')
+
+        users = [User.objects.get_or_create(username=username, defaults={
+            'email': f'{username}@example.com'})[0] for username in LOAD_TEST_USERNAMES]
+        chat_session, _ = ChatSession.objects.get_or_create(
+            room_name=options['room'], defaults={'teacher': users[0], 'person': users[1]})
+        participants = [chat_session.teacher_id, chat_session.person_id]
+        persisted_before = ChatMessage.objects.filter(chat_session=chat_session).count()
+
+        total_clients = workers * clients
+        worker_users = [[participants[index % 2] for index in range(clients)]
+                        for _ in range(workers)]
+        args = (options['room'], options['messages'], total_clients)
+
+        if workers == 1:
+            results = [self.run_inline(worker_users[0], *args, options['timeout'])]
+        else:
+            results = self.run_processes(worker_users, *args, options['timeout'])
+
+        persisted = ChatMessage.objects.filter(
+            chat_session=chat_session).count() - persisted_before
+        self.report(results, persisted)
+
+        if options['cleanup']:
+            chat_session.delete()
+            User.objects.filter(username__in=LOAD_TEST_USERNAMES).delete()
+
+    def create_rooms(self, prefix, count):
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}-{index}-{role}', email=f'{prefix}-{index}-{role}@example.com',
+                 first_name=role.title(), last_name=f'{prefix} {index}', password='!')
+            for index in range(count) for role in ('teacher', 'student')])
+        users_by_name = {user.username: user for user in users}
+
+        ChatSession.objects.bulk_create([
+            ChatSession(room_name=f'{prefix}-{index}', teacher=users_by_name[f'{prefix}-{index}-teacher'],
+                        person=users_by_name[f'{prefix}-{index}-student'])
+            for index in range(count)])
+        expires = timezone.now() + timedelta(hours=1)
+        # real bearer tokens of the users, as unguessable as the ones the OAuth views hand out
+        tokens = {user.username: secrets.token_urlsafe(32) for user in users}
+        AccessToken.objects.bulk_create([
+            AccessToken(user=user, token=tokens[user.username], scope='read write', expires=expires)
+            for user in users])
+
+        return [{'room_name': f'{prefix}-{index}',
+                 'tokens': [tokens[f'{prefix}-{index}-teacher'], tokens[f'{prefix}-{index}-student']]}
+                for index in range(count)]
+
+    def handle_rooms(self, options):
+        if min(options['rooms'], options['clients'], options['messages']) < 1 or options['rate'] <= 0:
+            raise CommandError('--rooms, --clients, --messages and --rate must be positive')
+        if options['workers'] != 1:
+            raise CommandError('--rooms runs in one process, leave out --workers')
+        # the rooms are real users with live access tokens and sessions
+        check_benchmark_database(options['force'])
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(f'Users of prefix {prefix!r} exist, remove them or use another --prefix')
+
+        # the full websocket stack: session and access token authentication, then the router
+        from ease_studyante_core.asgi import application
+
+        rooms = self.create_rooms(prefix, options['rooms'])
+        counter = QueryCounter()
+        try:
+            result = asyncio.run(run_rooms(
+                application, rooms, options['clients'], options['messages'], options['rate'],
+                options['timeout'], counter))
+            persisted = ChatMessage.objects.filter(chat_session__room_name__startswith=f'{prefix}-').count()
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__startswith=f'{prefix}-').delete()
+
+        connections_count = options['rooms'] * options['clients']
+        expected = connections_count * options['messages']
+        report = {
+            'config': {
+                'rooms': options['rooms'],
+                'participants': options['clients'],
+                'messages_per_room': options['messages'],
+                'rate_per_room': options['rate'],
+                'channel_layer': type(get_channel_layer()).__name__,
+                'chat_flush_size': message_buffer.flush_size,
+                'chat_flush_interval': message_buffer.flush_interval,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'channels': channels.__version__,
+            },
+            'connections': {
+                'count': connections_count,
+                'connect_ms': summary(result['connect_ms']),
+                # tracemalloc of the server and test client side of a socket together
+                'memory_per_connection_kb': round(result['memory'] / connections_count / 1024, 1),
+            },
+            'messages': {
+                'sent': result['sent'],
+                'expected_deliveries': expected,
+                'delivered': result['delivered'],
+                'lost': expected - result['delivered'],
+                'persisted': persisted,
+                'messages_per_s': round(result['sent'] / result['seconds'], 1),
+                'deliveries_per_s': round(result['delivered'] / result['seconds'], 1),
+            },
+            'fan_out_ms': summary(result['latencies']),
+            'database': {
+                'queries': counter.queries,
+                'writes': counter.writes,
+                'writes_per_message': round(counter.writes / result['sent'], 3),
+            },
+        }
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+            self.stdout.write(f'Wrote the report of {connections_count} connections to {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+    def run_inline(self, user_ids, room_name, messages, total_clients, timeout):
+        users_by_id = User.objects.in_bulk(set(user_ids))
+        return asyncio.run(run_clients(
+            [users_by_id[user_id] for user_id in user_ids], room_name, messages,
+            total_clients, threading.Barrier(1), timeout))
+
+    def run_processes(self, worker_users, room_name, messages, total_clients, timeout):
+        context = multiprocessing.get_context('fork')
+        start_barrier = context.Barrier(len(worker_users))
+        results = context.Queue()
+        # forked workers open their own database connections
+        connections.close_all()
+
+        processes = [context.Process(target=run_worker, args=(
+            user_ids, room_name, messages, total_clients, start_barrier, timeout, results))
+            for user_ids in worker_users]
+        for process in processes:
+            process.start()
+
+        worker_results = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        errors = [result['error'] for result in worker_results if 'error' in result]
+        if errors:
+            raise CommandError(f'{len(errors)} workers failed: {errors[0]}')
+        return worker_results
+
+    def report(self, results, persisted):
+        sent = sum(result['sent'] for result in results)
+        received = sum(result['received'] for result in results)
+        seconds = max(result['seconds'] for result in results)
+
+        for index, result in enumerate(results):
+            self.stdout.write(
+                f"worker {index}: {result['sent']} sent, {result['received']} received "
+                f"in {result['seconds']:.2f}s")
+
+        self.stdout.write(
+            f'{len(results)} workers: {sent / seconds:.1f} messages/s, '
+            f'{received / seconds:.1f} deliveries/s, {persisted} of {sent} messages persisted')
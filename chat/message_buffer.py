@@ -0,0 +1,173 @@
+import asyncio
+import atexit
+import logging
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from chat.models import ChatMessage, ChatSession
+
+logger = logging.getLogger(__name__)
+
+
+def write_messages(chat_messages):
+    """
+        Insert a batch of messages and bump each of their sessions once.
+        Rows written by an earlier attempt are skipped by id, so a batch
+        can be retried as a whole.
+    """
+    with transaction.atomic():
+        ChatMessage.objects.bulk_create(chat_messages, ignore_conflicts=True)
+        ChatSession.objects.filter(
+            pk__in={chat_message.chat_session_id for chat_message in chat_messages}).update(
+            updated_at=timezone.now())
+
+
+def write_each(chat_messages):
+    """
+        Write the messages of a batch the database refused one by one and
+        drop the ones it still refuses, e.g. of a session deleted since.
+        Returns how many were written.
+    """
+    written = []
+    for chat_message in chat_messages:
+        try:
+            write_messages([chat_message])
+        except IntegrityError:
+            logger.exception('Dropped chat message %s of session %s',
+                             chat_message.pk, chat_message.chat_session_id)
+        else:
+            written.append(chat_message)
+    return len(written)
+
+
+def write_batch(chat_messages):
+    # a refused row must not hold back the rest of the batch
+    try:
+        write_messages(chat_messages)
+    except IntegrityError:
+        return write_each(chat_messages)
+    return len(chat_messages)
+
+
+class MessageBuffer:
+    """
+        Write-behind store of the chat messages of this process. Consumers
+        add messages that were already delivered, they are written with
+        write_messages once CHAT_FLUSH_SIZE are pending or CHAT_FLUSH_INTERVAL
+        seconds after the first one. Rows the database refuses are written
+        one by one and dropped when they still fail. Other failures keep the
+        messages for the next flush, up to CHAT_FLUSH_MAX_ATTEMPTS times, and
+        whatever is left is written on exit.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.flush_handle = None
+        self.flush_loop = None
+        self.tasks = set()
+        # failed flushes per message id
+        self.attempts = {}
+
+    @property
+    def flush_size(self):
+        return getattr(settings, 'CHAT_FLUSH_SIZE', 50)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'CHAT_FLUSH_INTERVAL', 0.5)
+
+    @property
+    def max_attempts(self):
+        return getattr(settings, 'CHAT_FLUSH_MAX_ATTEMPTS', 20)
+
+    def add(self, chat_message):
+        # the same message id is only kept once
+        self.pending.setdefault(chat_message.pk, chat_message)
+
+        if len(self.pending) >= self.flush_size:
+            self.start_flush()
+        else:
+            self.schedule_flush()
+
+    def schedule_flush(self):
+        loop = asyncio.get_running_loop()
+        # a handle of a closed loop would never fire
+        if self.flush_handle is None or self.flush_loop is not loop:
+            self.flush_loop = loop
+            self.flush_handle = loop.call_later(self.flush_interval, self.start_flush)
+
+    def start_flush(self):
+        task = asyncio.get_running_loop().create_task(self.flush())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def take(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        chat_messages = list(self.pending.values())
+        self.pending = {}
+        return chat_messages
+
+    def restore(self, chat_messages):
+        for chat_message in chat_messages:
+            self.pending.setdefault(chat_message.pk, chat_message)
+
+    def retry_later(self, chat_messages):
+        # keeps the messages for the next flush unless they failed too often, returns whether any are left
+        retried = []
+        for chat_message in chat_messages:
+            attempts = self.attempts.get(chat_message.pk, 0) + 1
+            if attempts >= self.max_attempts:
+                self.attempts.pop(chat_message.pk, None)
+                logger.error('Giving up on chat message %s of session %s after %s attempts',
+                             chat_message.pk, chat_message.chat_session_id, attempts)
+            else:
+                self.attempts[chat_message.pk] = attempts
+                retried.append(chat_message)
+
+        self.restore(retried)
+        return bool(retried)
+
+    def written(self, chat_messages):
+        for chat_message in chat_messages:
+            self.attempts.pop(chat_message.pk, None)
+
+    async def flush(self):
+        chat_messages = self.take()
+        if not chat_messages:
+            return 0
+
+        try:
+            written = await database_sync_to_async(write_batch)(chat_messages)
+        except Exception:
+            logger.exception('Could not write %s chat messages', len(chat_messages))
+            if self.retry_later(chat_messages):
+                self.schedule_flush()
+            return 0
+
+        self.written(chat_messages)
+        return written
+
+    def flush_sync(self):
+        chat_messages = self.take()
+        if not chat_messages:
+            return 0
+
+        try:
+            written = write_batch(chat_messages)
+        except Exception:
+            logger.exception('Could not write %s chat messages', len(chat_messages))
+            self.retry_later(chat_messages)
+            return 0
+
+        self.written(chat_messages)
+        return written
+
+
+message_buffer = MessageBuffer()
+atexit.register(message_buffer.flush_sync)
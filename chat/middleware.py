@@ -0,0 +1,33 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from oauth2_provider.models import AccessToken
+
+
+@database_sync_to_async
+def get_token_user(token):
+    access_token = AccessToken.objects.select_related('user').filter(token=token).first()
+
+    if access_token is None or access_token.is_expired():
+        return AnonymousUser()
+    return access_token.user
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """
+        Websocket counterpart of OAuth2Authentication, the mobile apps pass
+        their access token as ws/chat/<room_name>/?token=<access token>.
+        Runs inside AuthMiddlewareStack so browser sessions keep working.
+    """
+
+    async def __call__(self, scope, receive, send):
+        user = scope.get('user')
+
+        if user is None or not user.is_authenticated:
+            token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+            if token:
+                scope = dict(scope, user=await get_token_user(token[0]))
+
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 13:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_chatmessage_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['chat_session', '-timestamp', '-id'], name='chat_message_session_page_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from base.models import BaseModelWithUUID, User
 
 
@@ -18,10 +19,16 @@ class ChatMessage(BaseModelWithUUID):
         ChatSession, on_delete=models.CASCADE, related_name='messages')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     message = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # assigned when the message is received, rows are written in batches later
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            # keyset pages of a session, see ChatMessageListView
+            models.Index(fields=['chat_session', '-timestamp', '-id'],
+                         name='chat_message_session_page_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.timestamp}: {self.message}"
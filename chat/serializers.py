@@ -1,17 +1,18 @@
 from rest_framework import serializers
 
+from core.sparse_fields import SparseFieldsMixin
 from user_profile.serializers import UserSerializer
 from .models import ChatSession, ChatMessage
 
 
-class ChatMessageSerializers(serializers.ModelSerializer):
+class ChatMessageSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer()
     class Meta:
         model = ChatMessage
         fields = ('__all__')
 
 
-class ChatSessionSerializers(serializers.ModelSerializer):
+class ChatSessionSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     person = UserSerializer()
     teacher = UserSerializer()
     
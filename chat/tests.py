@@ -1,3 +1,313 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import timedelta
+from io import StringIO
+from urllib.parse import parse_qsl, urlparse
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.auth import AuthMiddlewareStack
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from oauth2_provider.models import AccessToken
+from rest_framework.test import APIClient
+
+from base.models import User
+from chat import routing
+from chat.message_buffer import message_buffer, write_messages
+from chat.middleware import TokenAuthMiddleware
+from chat.models import ChatMessage, ChatSession
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', password='p4ssw0rD',
+        first_name=username, last_name='Tester')
+
+
+async def connect(user, path='/ws/chat/room-1/', application=None):
+    communicator = WebsocketCommunicator(
+        application or URLRouter(routing.websocket_urlpatterns), path)
+    if user is not None:
+        communicator.scope['user'] = user
+    connected, _ = await communicator.connect()
+    return communicator, connected
+
+
+class ChatConsumerTestCase(TestCase):
+    def setUp(self):
+        self.teacher = create_user('teacher')
+        self.student = create_user('student')
+        self.chat_session = ChatSession.objects.create(
+            room_name='room-1', teacher=self.teacher, person=self.student)
+
+    def test_message_is_saved_once_and_sent_to_the_room(self):
+        async def chat():
+            teacher_socket, _ = await connect(self.teacher)
+            student_socket, _ = await connect(self.student)
+
+            # the username of the payload is not trusted
+            await student_socket.send_to(text_data=json.dumps({
+                'message': 'Good morning', 'username': 'teacher', 'id': 'ignored'}))
+
+            received = []
+            for communicator in (teacher_socket, student_socket):
+                received.append(json.loads(await communicator.receive_from()))
+                await communicator.disconnect()
+            return received
+
+        received = async_to_sync(chat)()
+        message_buffer.flush_sync()
+
+        chat_message = ChatMessage.objects.get(chat_session=self.chat_session)
+        self.assertEqual(chat_message.user, self.student)
+        for data in received:
+            self.assertEqual(data['id'], str(chat_message.pk))
+            self.assertEqual(data['message'], 'Good morning')
+            self.assertEqual(data['username'], 'student')
+
+    def test_rejects_anonymous_and_other_users(self):
+        outsider = create_user('outsider')
+
+        async def connected(user):
+            communicator, connected = await connect(user)
+            await communicator.disconnect()
+            return connected
+
+        self.assertFalse(async_to_sync(connected)(AnonymousUser()))
+        self.assertFalse(async_to_sync(connected)(outsider))
+        self.assertTrue(async_to_sync(connected)(self.teacher))
+
+    def test_access_token_authentication(self):
+        access_token = AccessToken.objects.create(
+            user=self.student, token='student-token', scope='read write',
+            expires=timezone.now() + timedelta(hours=1))
+        application = AuthMiddlewareStack(TokenAuthMiddleware(URLRouter(routing.websocket_urlpatterns)))
+
+        async def connected(path):
+            communicator, connected = await connect(None, path, application)
+            await communicator.disconnect()
+            return connected
+
+        self.assertTrue(async_to_sync(connected)('/ws/chat/room-1/?token=student-token'))
+        self.assertFalse(async_to_sync(connected)('/ws/chat/room-1/?token=wrong'))
+
+        access_token.expires = timezone.now() - timedelta(hours=1)
+        access_token.save()
+        self.assertFalse(async_to_sync(connected)('/ws/chat/room-1/?token=student-token'))
+
+
+class MessageBufferTestCase(TestCase):
+    def setUp(self):
+        self.teacher = create_user('teacher')
+        self.student = create_user('student')
+        self.chat_session = ChatSession.objects.create(
+            room_name='room-1', teacher=self.teacher, person=self.student)
+        self.updated_at = self.chat_session.updated_at
+
+    def chat_message(self, text):
+        return ChatMessage(chat_session=self.chat_session, user=self.student, message=text)
+
+    @override_settings(CHAT_FLUSH_SIZE=3, CHAT_FLUSH_INTERVAL=60)
+    def test_flush_on_size(self):
+        async def send():
+            for index in range(3):
+                message_buffer.add(self.chat_message(f'message {index}'))
+            # let the flush task started by the third message run
+            await asyncio.gather(*message_buffer.tasks)
+            message_buffer.add(self.chat_message('message 3'))
+
+        async_to_sync(send)()
+
+        self.assertEqual(ChatMessage.objects.count(), 3)
+        self.assertEqual(len(message_buffer.pending), 1)
+        message_buffer.flush_sync()
+        self.assertEqual(ChatMessage.objects.count(), 4)
+
+    @override_settings(CHAT_FLUSH_SIZE=50, CHAT_FLUSH_INTERVAL=0.01)
+    def test_flush_on_interval(self):
+        async def send():
+            message_buffer.add(self.chat_message('hello'))
+            await asyncio.sleep(0.05)
+            await asyncio.gather(*message_buffer.tasks)
+
+        async_to_sync(send)()
+
+        self.assertEqual(ChatMessage.objects.count(), 1)
+        self.assertFalse(message_buffer.pending)
+
+    def test_session_bumped_once_per_flush(self):
+        chat_messages = [self.chat_message(f'message {index}') for index in range(5)]
+
+        with self.assertNumQueries(4):
+            # savepoint, insert, session update, release
+            write_messages(chat_messages)
+
+        self.chat_session.refresh_from_db()
+        self.assertGreater(self.chat_session.updated_at, self.updated_at)
+
+    def test_retry_does_not_duplicate(self):
+        chat_messages = [self.chat_message(f'message {index}') for index in range(3)]
+        write_messages(chat_messages[:2])
+
+        # a retried batch and a message added twice are written once
+        message_buffer.restore(chat_messages + chat_messages[:1])
+        self.assertEqual(message_buffer.flush_sync(), 3)
+
+        self.assertEqual(ChatMessage.objects.count(), 3)
+        self.assertEqual(ChatMessage.objects.filter(timestamp=chat_messages[0].timestamp).count(), 1)
+
+
+def refuse_writes(execute, sql, params, many, context):
+    # execute_wrapper of a database that has gone away for inserts
+    if sql.lstrip().upper().startswith('INSERT'):
+        raise OperationalError('database is locked')
+    return execute(sql, params, many, context)
+
+
+class MessageBufferFailureTestCase(TransactionTestCase):
+    def setUp(self):
+        self.teacher = create_user('teacher')
+        self.student = create_user('student')
+        self.chat_session = ChatSession.objects.create(
+            room_name='room-1', teacher=self.teacher, person=self.student)
+        message_buffer.take()
+        message_buffer.attempts = {}
+
+    def chat_message(self, text):
+        return ChatMessage(chat_session=self.chat_session, user=self.student, message=text)
+
+    def test_refused_rows_are_dropped(self):
+        deleted = ChatSession.objects.create(room_name='room-2', teacher=self.teacher, person=self.student)
+        orphan = ChatMessage(chat_session_id=deleted.pk, user=self.student, message='to a deleted session')
+        deleted.delete()
+
+        message_buffer.restore([self.chat_message('first'), orphan, self.chat_message('second')])
+        with self.assertLogs('chat.message_buffer', 'ERROR'):
+            self.assertEqual(message_buffer.flush_sync(), 2)
+
+        self.assertEqual(sorted(ChatMessage.objects.values_list('message', flat=True)), ['first', 'second'])
+        self.assertFalse(message_buffer.pending)
+
+    @override_settings(CHAT_FLUSH_MAX_ATTEMPTS=2)
+    def test_failed_batches_are_retried_then_dropped(self):
+        message_buffer.restore([self.chat_message('hello')])
+
+        with connection.execute_wrapper(refuse_writes), self.assertLogs('chat.message_buffer', 'ERROR'):
+            self.assertEqual(message_buffer.flush_sync(), 0)
+            self.assertEqual(len(message_buffer.pending), 1)
+            self.assertEqual(message_buffer.flush_sync(), 0)
+
+        self.assertFalse(message_buffer.pending)
+        self.assertFalse(message_buffer.attempts)
+        self.assertFalse(ChatMessage.objects.exists())
+
+
+class ChatLoadTestCommandTestCase(TransactionTestCase):
+    def test_single_worker(self):
+        out = StringIO()
+        call_command('chat_load_test', clients=3, messages=4, cleanup=True, stdout=out)
+
+        self.assertIn('12 of 12 messages persisted', out.getvalue())
+        self.assertFalse(ChatSession.objects.exists())
+
+    def test_workers_need_shared_layer(self):
+        with self.assertRaises(CommandError):
+            call_command('chat_load_test', workers=2)
+
+
+class ChatMessageListViewTestCase(TestCase):
+    def setUp(self):
+        self.teacher = create_user('teacher')
+        self.student = create_user('student')
+        self.chat_session = ChatSession.objects.create(
+            room_name='room-1', teacher=self.teacher, person=self.student)
+        sent_at = timezone.now()
+        # pairs of messages sharing a timestamp are ordered by id
+        ChatMessage.objects.bulk_create([
+            ChatMessage(chat_session=self.chat_session, user=self.student, message=f'message {index}',
+                        timestamp=sent_at - timedelta(minutes=index // 2))
+            for index in range(25)])
+        self.client = APIClient()
+        self.client.force_authenticate(self.teacher)
+
+    def get(self, params):
+        return self.client.get('/api/chat-messages', {'session_id': self.chat_session.pk, **params})
+
+    def test_cursor_pages(self):
+        expected = [str(pk) for pk in ChatMessage.objects.filter(
+            chat_session=self.chat_session).order_by('-timestamp', '-id').values_list('pk', flat=True)]
+
+        seen = []
+        params = {'cursor': '', 'page_size': 10}
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.get(params)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+            seen += [row['id'] for row in response.data['results']]
+            if not response.data['next']:
+                break
+            params = dict(parse_qsl(urlparse(response.data['next']).query))
+
+        self.assertEqual(seen, expected)
+
+    def test_page_numbers_and_invalid_cursor(self):
+        response = self.get({'page': 3})
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 5)
+
+        self.assertEqual(self.get({'cursor': 'not-a-cursor'}).status_code, 404)
+
+
+class ChatLoadTestRoomsTestCase(TransactionTestCase):
+    def test_report(self):
+        out = StringIO()
+        call_command('chat_load_test', rooms=3, clients=3, messages=4, rate=200, stdout=out)
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(report['connections']['count'], 9)
+        self.assertEqual(report['messages']['sent'], 12)
+        self.assertEqual(report['messages']['delivered'], 36)
+        self.assertEqual(report['messages']['lost'], 0)
+        self.assertEqual(report['messages']['persisted'], 12)
+        # buffered, far fewer than one insert per message
+        self.assertLess(report['database']['writes_per_message'], 1)
+        self.assertGreater(report['connections']['memory_per_connection_kb'], 0)
+        self.assertLessEqual(report['fan_out_ms']['p50'], report['fan_out_ms']['max'])
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(ChatSession.objects.exists())
+
+    def test_kept_tokens_are_random(self):
+        call_command('chat_load_test', rooms=1, clients=2, messages=1, rate=200, keep=True, stdout=StringIO())
+
+        tokens = list(AccessToken.objects.values_list('token', flat=True))
+        self.assertEqual(len(tokens), 2)
+        self.assertFalse(any('chat-load' in token for token in tokens))
+        self.assertTrue(all(len(token) >= 40 for token in tokens))
+
+    def test_existing_prefix(self):
+        create_user('chat-load-0-teacher')
+        with self.assertRaises(CommandError):
+            call_command('chat_load_test', rooms=1)
+
+    def test_rooms_run_in_one_process(self):
+        with self.assertRaises(CommandError):
+            call_command('chat_load_test', rooms=1, workers=2)
+
+    @override_settings(DEBUG=True)
+    def test_refuses_a_live_database(self):
+        name = connection.settings_dict['NAME']
+        connection.settings_dict['NAME'] = '/srv/ease_studyante.sqlite3'
+        try:
+            with self.assertRaisesMessage(CommandError, '--force'):
+                call_command('chat_load_test', rooms=1, stdout=StringIO())
+        finally:
+            connection.settings_dict['NAME'] = name
+        self.assertFalse(User.objects.filter(username__startswith='chat-load-').exists())
@@ -5,7 +5,7 @@ from drf_yasg import openapi
 from base.models import User
 from chat.models import ChatSession, ChatMessage
 from chat.serializers import ChatSessionSerializers, ChatMessageSerializers
-from core.paginate import ExtraSmallResultsSetPagination
+from core.paginate import KeysetPagination
 from user_profile.serializers import UserSerializer
 from django.db.models import Q
 
@@ -99,7 +99,8 @@ class ChatMessageListView(generics.ListAPIView):
     serializer_class = ChatMessageSerializers
     queryset = ChatMessage.objects.all()
     permission_classes = [permissions.IsAuthenticated,]
-    pagination_class = ExtraSmallResultsSetPagination
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-timestamp', '-id')
 
     def get_queryset(self):
         session_id = self.request.GET.get('session_id', None)
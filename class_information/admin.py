@@ -3,7 +3,8 @@ from django.contrib import admin
 from django.db.models.query import QuerySet
 from django.http import HttpRequest
 
-from academic_record.models import AcademicYear, Schedule
+from academic_record.academic_year import current_academic_year
+from academic_record.models import Schedule
 from base.admin import BaseAdmin
 from base.models import User
 from user_profile.models import Teacher
@@ -84,10 +85,9 @@ class ScheduleTabularInline(admin.TabularInline):
         return False
 
     def get_queryset(self, request: HttpRequest) -> QuerySet[Any]:
-        academic_years = AcademicYear.objects.all()
+        academic_year = current_academic_year(request)
         qs = super(ScheduleTabularInline, self).get_queryset(request)
-        if academic_years.exists():
-            academic_year = academic_years.first()
+        if academic_year:
             return qs.filter(academic_year=academic_year)
 
         return qs
@@ -203,10 +203,9 @@ class RegistrationTabularInline(admin.TabularInline):
         return False
 
     def get_queryset(self, request: HttpRequest) -> QuerySet[Any]:
-        academic_years = AcademicYear.objects.all()
+        academic_year = current_academic_year(request)
         qs = super(RegistrationTabularInline, self).get_queryset(request)
-        if academic_years.exists():
-            academic_year = academic_years.first()
+        if academic_year:
             return qs.filter(academic_year=academic_year)
 
         return qs
@@ -226,10 +225,9 @@ class SubjectTabularInline(admin.TabularInline):
         return False
 
     def get_queryset(self, request: HttpRequest) -> QuerySet[Any]:
-        academic_years = AcademicYear.objects.all()
+        academic_year = current_academic_year(request)
         qs = super(SubjectTabularInline, self).get_queryset(request)
-        if academic_years.exists():
-            academic_year = academic_years.first()
+        if academic_year:
             return qs.filter(academic_year=academic_year)
 
         return qs
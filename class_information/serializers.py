@@ -1,20 +1,22 @@
 from rest_framework import serializers
+
+from core.sparse_fields import SparseFieldsMixin
 from .models import Department, Section, Subject
 
 
-class DepartmentSerializers(serializers.ModelSerializer):
+class DepartmentSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Department
         fields = ('__all__')
 
 
-class SectionSerializers(serializers.ModelSerializer):
+class SectionSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Section
         exclude = ['created_at', 'updated_at']
 
 
-class SubjectSerializers(serializers.ModelSerializer):
+class SubjectSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     department = DepartmentSerializers()
 
     class Meta:
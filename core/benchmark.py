@@ -0,0 +1,29 @@
+"""
+    Guard of the commands that seed synthetic rows into the configured
+    database, or drop its indexes, most of them inside a transaction they
+    roll back. The locks they take are held for the whole run, so they
+    refuse to run unless the database is a test database or --force is
+    given.
+"""
+import os
+
+from django.core.management.base import CommandError
+from django.db import connection
+
+
+def is_test_database():
+    name = str(connection.settings_dict['NAME'])
+    if name == connection.settings_dict.get('TEST', {}).get('NAME'):
+        return True
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        return True
+    return os.path.basename(name).startswith('test_')
+
+
+def check_benchmark_database(force=False):
+    if force or is_test_database():
+        return
+
+    raise CommandError(
+        f'Refusing to run on {connection.settings_dict["NAME"]!r}: the run seeds synthetic rows and '
+        'locks the tables it writes to until it ends. Use a test database, or pass --force.')
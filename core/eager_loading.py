@@ -0,0 +1,46 @@
+from django.db.models import QuerySet
+
+from core.sparse_fields import SparseFieldsMixin, is_expanded, query_list
+
+
+class EagerLoadingMixin:
+    """
+        Generic views declare the relations their serializer walks and they
+        are loaded with the rows, whatever get_queryset returns:
+
+            select_related_fields = ['student__user']
+            prefetch_related_fields = ['schedules']
+
+        With ?expand= on a SparseFieldsMixin serializer only the relations
+        that are still expanded are joined.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    def get_select_related_fields(self):
+        expand = query_list(self.request, 'expand')
+        if expand is None or not issubclass(self.get_serializer_class(), SparseFieldsMixin):
+            return self.select_related_fields
+
+        # student__user stops at student when student is collapsed to its id
+        fields = []
+        for field in self.select_related_fields:
+            names = field.split('__')
+            depth = 0
+            while depth < len(names) and is_expanded(expand, '.'.join(names[:depth + 1])):
+                depth += 1
+            if depth and '__'.join(names[:depth]) not in fields:
+                fields.append('__'.join(names[:depth]))
+        return fields
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+
+        if isinstance(queryset, QuerySet):
+            select_related_fields = self.get_select_related_fields()
+            if select_related_fields:
+                queryset = queryset.select_related(*select_related_fields)
+            if self.prefetch_related_fields:
+                queryset = queryset.prefetch_related(*self.prefetch_related_fields)
+
+        return queryset
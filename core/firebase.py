@@ -0,0 +1,20 @@
+"""
+    The Firebase app push notifications are sent with, initialized the
+    first time a push goes out instead of when the settings are imported,
+    so processes that never send one skip the Google credential discovery.
+    GOOGLE_APPLICATION_CREDENTIALS names the service account file as before.
+"""
+import threading
+
+_lock = threading.Lock()
+
+
+def firebase_app():
+    # imported here, firebase_admin pulls in the google auth libraries
+    import firebase_admin
+
+    with _lock:
+        try:
+            return firebase_admin.get_app()
+        except ValueError:
+            return firebase_admin.initialize_app()
@@ -0,0 +1,244 @@
+"""
+    Per endpoint request metrics kept in this process: wall time, database
+    queries and their time, serializer time and response size, grouped by
+    the resolved URL name (api:student-gpa, admin:index, ...). Every
+    request also writes one JSON line to the core.instrumentation logger,
+    at INFO when it is slower than INSTRUMENTATION_SLOW_MS or sampled and
+    at DEBUG otherwise. A sample of requests, INSTRUMENTATION_SAMPLE_RATE,
+    keeps the SQL of its slowest queries as well.
+"""
+import json
+import logging
+import math
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# bucket upper bounds, the last bucket takes everything above
+MS_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+QUERY_BUCKETS = [0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233]
+BYTE_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+# sampled requests kept per endpoint
+SAMPLES_PER_ENDPOINT = 5
+UNRESOLVED = '<unresolved>'
+
+_current = ContextVar('instrumentation_record', default=None)
+
+
+def percentile(values, fraction):
+    # nearest rank of a list of exact values
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)] if ordered else 0
+
+
+class Histogram:
+    """
+        Counts of values per bucket, percentiles are read as the upper bound
+        of the bucket they fall in, capped at the largest value seen.
+    """
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction):
+        if not self.count:
+            return 0
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'mean': round(self.total / self.count, 2) if self.count else 0,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': round(self.max, 2),
+            'buckets': dict(zip([*map(str, self.bounds), 'inf'], self.buckets)),
+        }
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.histograms = {
+            'wall_ms': Histogram(MS_BUCKETS),
+            'db_ms': Histogram(MS_BUCKETS),
+            'queries': Histogram(QUERY_BUCKETS),
+            'serializer_ms': Histogram(MS_BUCKETS),
+            'bytes': Histogram(BYTE_BUCKETS),
+        }
+        self.samples = deque(maxlen=SAMPLES_PER_ENDPOINT)
+
+    def add(self, record):
+        self.requests += 1
+        if record['status'] >= 500:
+            self.errors += 1
+        for name, histogram in self.histograms.items():
+            histogram.add(record[name])
+        if 'sql' in record:
+            self.samples.append(record)
+
+    def summary(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            **{name: histogram.summary() for name, histogram in self.histograms.items()},
+            'samples': list(self.samples),
+        }
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+            self.since = timezone.now()
+
+    def add(self, record):
+        with self.lock:
+            endpoint = self.endpoints.get(record['endpoint'])
+            if endpoint is None:
+                endpoint = self.endpoints[record['endpoint']] = EndpointMetrics()
+            endpoint.add(record)
+
+    def summary(self):
+        with self.lock:
+            return {
+                'since': self.since.isoformat(),
+                'endpoints': {name: endpoint.summary() for name, endpoint in sorted(self.endpoints.items())},
+            }
+
+
+registry = Registry()
+
+
+class RequestRecord:
+    def __init__(self, sampled):
+        self.queries = 0
+        self.db_seconds = 0
+        self.timers = {}
+        self.active = set()
+        self.sql = [] if sampled else None
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook, runs around every query of the request
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_seconds += elapsed
+            if self.sql is not None:
+                self.sql.append((round(elapsed * 1000, 3), sql[:500]))
+
+
+@contextmanager
+def timed(name):
+    """
+        Add the time spent in the block to the current request under name,
+        blocks nested in one of the same name are counted once.
+    """
+    record = _current.get()
+    if record is None or name in record.active:
+        yield
+        return
+
+    record.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record.active.discard(name)
+        record.timers[name] = record.timers.get(name, 0) + time.perf_counter() - started
+
+
+def sample_rate():
+    return getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 0.01)
+
+
+def sampled_queries():
+    return getattr(settings, 'INSTRUMENTATION_SAMPLE_QUERIES', 20)
+
+
+def slow_ms():
+    return getattr(settings, 'INSTRUMENTATION_SLOW_MS', 500)
+
+
+class InstrumentationMiddleware:
+    """
+        Records every request in the registry and the log, first in
+        MIDDLEWARE so the wall time covers the other middleware too.
+        INSTRUMENTATION_ENABLED = False turns it off.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'INSTRUMENTATION_ENABLED', True):
+            return self.get_response(request)
+
+        record = RequestRecord(sampled=random.random() < sample_rate())
+        token = _current.set(record)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        self.finish(request, response, record, time.perf_counter() - started)
+        return response
+
+    def finish(self, request, response, record, wall_seconds):
+        match = getattr(request, 'resolver_match', None)
+        metrics = {
+            'endpoint': match.view_name if match else UNRESOLVED,
+            'method': request.method,
+            'status': response.status_code,
+            'wall_ms': round(wall_seconds * 1000, 2),
+            'db_ms': round(record.db_seconds * 1000, 2),
+            'queries': record.queries,
+            'serializer_ms': round(record.timers.get('serializer', 0) * 1000, 2),
+            'bytes': 0 if response.streaming else len(response.content),
+        }
+        if record.sql is not None:
+            metrics['path'] = request.path
+            metrics['sql'] = sorted(record.sql, reverse=True)[:sampled_queries()]
+
+        registry.add(metrics)
+        level = logging.INFO if record.sql is not None or metrics['wall_ms'] >= slow_ms() else logging.DEBUG
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps(metrics, default=str))
@@ -1,7 +1,126 @@
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q, QuerySet
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class ExtraSmallResultsSetPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+
+class KeysetPagination(ExtraSmallResultsSetPagination):
+    """
+        Page numbers by default. A request with ?cursor= (empty for the first
+        page) is paginated on a composite key instead, e.g.
+        keyset_ordering = ('-timestamp', '-id') on the view: the cursor holds
+        the key of the last row, the next page is read with a seek predicate
+        instead of OFFSET and nothing is counted.
+        Descending keys keep NULLs first and ascending keys NULLs last, the
+        default order of a b-tree index.
+    """
+    cursor_query_param = 'cursor'
+    ordering = ('-id',)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, view):
+        return getattr(view, 'keyset_ordering', None) or self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        if not isinstance(queryset, QuerySet):
+            # views return [] when there is nothing to list
+            self.has_next = False
+            self.page = list(queryset)[:page_size]
+            return self.page
+
+        self.keys = [(name.lstrip('-'), name.startswith('-'))
+                     for name in self.get_ordering(view)]
+        self.fields = [queryset.model._meta.get_field(name) for name, _ in self.keys]
+
+        queryset = queryset.order_by(*[
+            F(name).desc(nulls_first=True) if descending else F(name).asc(nulls_last=True)
+            for name, descending in self.keys])
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(position))
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def seek_filter(self, position):
+        after = Q(pk__in=[])
+        equal = Q()
+
+        for (name, descending), field, value in zip(self.keys, self.fields, position):
+            if value is None:
+                # NULLs come first on descending keys, last on ascending ones
+                if descending:
+                    after |= equal & Q(**{f'{name}__isnull': False})
+                equal &= Q(**{f'{name}__isnull': True})
+                continue
+
+            beyond = Q(**{f'{name}__lt' if descending else f'{name}__gt': value})
+            if field.null and not descending:
+                beyond |= Q(**{f'{name}__isnull': True})
+            after |= equal & beyond
+            equal &= Q(**{name: value})
+
+        return after
+
+    def encode_cursor(self, row):
+        position = []
+        for (name, _), field in zip(self.keys, self.fields):
+            value = getattr(row, field.attname)
+            position.append(None if value is None else str(
+                value.isoformat() if hasattr(value, 'isoformat') else value))
+
+        return urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode()))
+            if not isinstance(position, list) or len(position) != len(self.fields):
+                raise ValueError(encoded)
+            return [None if value is None else field.to_python(value)
+                    for field, value in zip(self.fields, position)]
+        except (TypeError, ValueError, ValidationError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
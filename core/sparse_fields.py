@@ -0,0 +1,84 @@
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+from core.instrumentation import timed
+
+
+def query_list(request, name):
+    """
+        Comma separated values of a query parameter, None when it is absent:
+        ?expand=a,b&expand=c gives ['a', 'b', 'c'] and ?expand= gives [].
+    """
+    if request is None or name not in request.GET:
+        return None
+    return [value.strip() for values in request.GET.getlist(name)
+            for value in values.split(',') if value.strip()]
+
+
+def is_expanded(expand, path):
+    # expanding assessment.subject expands assessment as well
+    return any(name == path or name.startswith(f'{path}.') for name in expand)
+
+
+class SparseFieldsMixin:
+    """
+        ?fields= and ?expand= on reads, for the serializer and the ones
+        nested in it. Paths are dotted from the outermost serializer:
+
+            ?fields=pk,obtained_marks,assessment.name
+            ?expand=assessment,assessment.subject
+
+        fields keeps only the listed fields, a nested serializer without
+        listed fields of its own keeps all of them. expand keeps only the
+        listed nested serializers and replaces every other one with the
+        primary key of the related object, ?expand= alone flattens them all.
+        Without either parameter the payload is unchanged.
+
+        Every API serializer carries this mixin, so it also times
+        serialization for the request metrics of core.instrumentation.
+    """
+
+    def to_representation(self, instance):
+        with timed('serializer'):
+            return super().to_representation(instance)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return fields
+
+        only = query_list(request, 'fields')
+        expand = query_list(request, 'expand')
+        prefix = self.field_path()
+        prefix = f'{prefix}.' if prefix else ''
+
+        if only is not None:
+            names = {name[len(prefix):].split('.')[0] for name in only if name.startswith(prefix)}
+            if names:
+                for name in list(fields):
+                    if name not in names:
+                        fields.pop(name)
+
+        if expand is not None:
+            for name, field in list(fields.items()):
+                if isinstance(field, serializers.BaseSerializer) and not is_expanded(expand, prefix + name):
+                    fields[name] = self.collapsed_field(field)
+
+        return fields
+
+    def field_path(self):
+        names = []
+        field = self
+        while getattr(field, 'parent', None) is not None:
+            # the child of a many=True serializer is bound without a name
+            if field.field_name:
+                names.append(field.field_name)
+            field = field.parent
+        return '.'.join(reversed(names))
+
+    def collapsed_field(self, field):
+        # reads the foreign key column, the related row is not loaded
+        kwargs = {'source': field.source} if field.source else {}
+        return serializers.PrimaryKeyRelatedField(
+            read_only=True, many=isinstance(field, serializers.ListSerializer), **kwargs)
@@ -0,0 +1,95 @@
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import ExtractMonth
+
+from academic_record.models import Attendance, Schedule
+from base.models import User
+from user_profile.models import Student
+
+STUDENT_GENDERS = ['M', 'F']
+STUDENT_YEAR_LEVELS = ['GRADE 7', 'GRADE 8', 'GRADE 9', 'GRADE 10']
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
+
+
+def student_counts():
+    """
+        Total, per gender and per year level counts of students in one query.
+    """
+    aggregates = {'total': Count('pk')}
+    for gender in STUDENT_GENDERS:
+        aggregates[gender] = Count('pk', filter=Q(gender=gender))
+    for year_level in STUDENT_YEAR_LEVELS:
+        aggregates[year_level] = Count('pk', filter=Q(year_level=year_level))
+    counts = Student.objects.aggregate(**aggregates)
+
+    return {
+        'total': counts['total'],
+        'genders': {gender: counts[gender] for gender in STUDENT_GENDERS},
+        'year_levels': {year_level: counts[year_level] for year_level in STUDENT_YEAR_LEVELS},
+    }
+
+
+def user_counts_per_month():
+    """
+        Accounts created per calendar month, every month present.
+    """
+    month_counts = {month: 0 for month in MONTHS}
+    rows = User.objects.annotate(month=ExtractMonth('created_at')).values(
+        'month').annotate(count=Count('id')).order_by('month')
+    for row in rows:
+        month_counts[MONTHS[row['month'] - 1]] = row['count']
+
+    return month_counts
+
+
+def latest_attendance_ids(students=None):
+    """
+        (student_id, pk of the latest attendance) of every student, None when
+        the student has none. The pk comes from a correlated subquery served
+        by the attendance page index.
+    """
+    latest = Attendance.objects.filter(student=OuterRef('pk')).order_by(
+        '-attendance_date', '-time_in', '-id').values('pk')[:1]
+    students = Student.objects.all() if students is None else students
+
+    return students.annotate(latest_attendance_id=Subquery(latest)).values_list('pk', 'latest_attendance_id')
+
+
+def latest_attendances():
+    """
+        Latest attendance of every student that has one, read in one query.
+    """
+    # students without attendance yield NULL, which IN never matches
+    latest_ids = latest_attendance_ids().values('latest_attendance_id')
+
+    return Attendance.objects.filter(pk__in=latest_ids).select_related('student__user').only(
+        'attendance_date', 'time_in', 'time_out', 'is_present', 'student__user__first_name',
+        'student__user__last_name').order_by('student__created_at')
+
+
+def attendance_row(attendance):
+    return {
+        'student': attendance.student,
+        'latest_attendance_date': attendance.attendance_date,
+        'student_time_in': attendance.time_in,
+        'student_time_out': attendance.time_out,
+        'is_present': attendance.is_present,
+    }
+
+
+def dashboard_summary():
+    students = student_counts()
+    month_counts = user_counts_per_month()
+
+    return {
+        'students_count': students['total'],
+        # schedules are what the dashboard has always counted as teachers
+        'teachers_count': Schedule.objects.count(),
+        'users_count': sum(month_counts.values()),
+        'student_genders': STUDENT_GENDERS,
+        'gender_num': list(students['genders'].values()),
+        'student_year_levels': STUDENT_YEAR_LEVELS,
+        'year_levels_counts': students['year_levels'],
+        'month_counts': month_counts,
+        'students_with_attendance': [attendance_row(attendance) for attendance in latest_attendances()],
+    }
@@ -0,0 +1,73 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from academic_record.models import Attendance, Schedule
+from academic_record.seed import seed_school
+from base.models import User
+from dashboard.aggregation import dashboard_summary
+from user_profile.models import Student
+
+
+def legacy_dashboard():
+    """
+        Query pattern of the dashboard before the aggregation layer, with the
+        .count() calls the template made on the querysets.
+    """
+    students_with_attendance = []
+    for student in Student.objects.all():
+        latest_attendance = Attendance.objects.filter(student=student).order_by('-attendance_date').first()
+        if latest_attendance:
+            students_with_attendance.append((student, latest_attendance))
+
+    return {
+        'students_count': Student.objects.all().count(),
+        'teachers_count': Schedule.objects.all().count(),
+        'gender_num': [Student.objects.filter(gender=gender).count() for gender in ['M', 'F']],
+        'year_levels_counts': {year_level: Student.objects.filter(year_level=year_level).count()
+                               for year_level in ['GRADE 7', 'GRADE 8', 'GRADE 9', 'GRADE 10']},
+        'users_count': User.objects.all().count(),
+        'students_with_attendance': students_with_attendance,
+    }
+
+
+class Command(BaseCommand):
+    help = ('Seed a school in a transaction that is rolled back and compare queries and latency '
+            'of the legacy dashboard against the aggregation layer')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--sections', type=int, default=25)
+        parser.add_argument('--subjects', type=int, default=8)
+        parser.add_argument('--days', type=int, default=20, help='School days of attendance')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs of each implementation')
+
+    def measure(self, label, build):
+        timings = []
+        for _ in range(self.repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                build()
+                timings.append((time.perf_counter() - started) * 1000)
+
+        self.stdout.write(f'{label:<20} {len(queries):>8} {statistics.median(timings):>12.1f}')
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            counts = seed_school(
+                prefix='benchmark', students=options['students'], sections=options['sections'],
+                subjects=options['subjects'], days=options['days'], assessments=0, chat_messages=0)
+            self.stdout.write(f'Seeded in {time.perf_counter() - started:.1f}s: ' + ', '.join(
+                f'{count} {name}' for name, count in counts.items()))
+
+            self.stdout.write(f'{"dashboard":<20} {"queries":>8} {"median ms":>12}')
+            self.measure('legacy (before)', legacy_dashboard)
+            self.measure('aggregated (after)', dashboard_summary)
+
+            transaction.set_rollback(True)
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from dashboard.snapshot import refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Recompute the admin dashboard snapshot, scheduled in CRONJOBS next to perform_end_of_day_tasks'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        snapshot = refresh_snapshot()
+        self.stdout.write(
+            f'Dashboard snapshot refreshed in {time.perf_counter() - started:.2f}s: '
+            f'{snapshot.students_count} students, {snapshot.users_count} users')
@@ -0,0 +1,51 @@
+# Generated by Django 3.2 on 2026-10-18 14:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('academic_record', '0032_backfill_attendance_date'),
+        ('user_profile', '0006_admin'),
+        ('dashboard', '0003_delete_dashboard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardSnapshot',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('students_count', models.PositiveIntegerField(default=0)),
+                ('registrations_count', models.PositiveIntegerField(default=0)),
+                ('teachers_count', models.PositiveIntegerField(default=0)),
+                ('users_count', models.PositiveIntegerField(default=0)),
+                ('gender_counts', models.JSONField(default=dict)),
+                ('year_level_counts', models.JSONField(default=dict)),
+                ('month_counts', models.JSONField(default=dict)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='StudentLatestAttendance',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('attendance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='academic_record.attendance')),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='latest_attendance', to='user_profile.student')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
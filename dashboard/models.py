@@ -1 +1,38 @@
-from django.db import models
\ No newline at end of file
+from django.db import models
+
+from academic_record.models import Attendance
+from base.models import BaseModelWithUUID
+from user_profile.models import Student
+
+
+class DashboardSnapshot(BaseModelWithUUID):
+    """
+        School wide statistics of the admin dashboard, one row refreshed by
+        refresh_dashboard_snapshot and kept current between refreshes by the
+        User signals in dashboard.signals.
+    """
+    students_count = models.PositiveIntegerField(default=0)
+    registrations_count = models.PositiveIntegerField(default=0)
+    teachers_count = models.PositiveIntegerField(default=0)
+    users_count = models.PositiveIntegerField(default=0)
+    gender_counts = models.JSONField(default=dict)
+    year_level_counts = models.JSONField(default=dict)
+    month_counts = models.JSONField(default=dict)
+    refreshed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'Dashboard snapshot {self.refreshed_at}'
+
+
+class StudentLatestAttendance(BaseModelWithUUID):
+    """
+        Pointer to the latest attendance of a student, the row itself is read
+        through the foreign key so time out and status are always current.
+    """
+    student = models.OneToOneField(
+        Student, related_name='latest_attendance', on_delete=models.CASCADE)
+    attendance = models.ForeignKey(
+        Attendance, related_name='+', on_delete=models.CASCADE)
+
+    def __str__(self):
+        return f'{self.student} - {self.attendance.attendance_date}'
@@ -0,0 +1,27 @@
+from rest_framework import serializers
+
+from academic_record.models import Schedule
+from registration.models import Registration
+
+
+class DashboardStudentSerializers(serializers.ModelSerializer):
+    first_name = serializers.CharField(source='student.user.first_name')
+    last_name = serializers.CharField(source='student.user.last_name')
+    year_level = serializers.CharField(source='student.year_level')
+    section = serializers.CharField(source='section.name')
+
+    class Meta:
+        model = Registration
+        fields = ['id', 'first_name', 'last_name', 'year_level', 'section', 'section_id']
+
+
+class DashboardTeacherSerializers(serializers.ModelSerializer):
+    first_name = serializers.CharField(source='teacher.user.first_name')
+    last_name = serializers.CharField(source='teacher.user.last_name')
+    section = serializers.CharField(source='section.name')
+    year_level = serializers.CharField(source='section.year_level')
+    subject = serializers.CharField(source='subject.name')
+
+    class Meta:
+        model = Schedule
+        fields = ['id', 'first_name', 'last_name', 'subject', 'section', 'year_level', 'section_id', 'day']
@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from academic_record.models import Attendance
+from base.models import User
+from .snapshot import count_user, refresh_latest_attendances
+
+
+@receiver(post_save, sender=User)
+def count_created_user(sender, instance, created, **kwargs):
+    if created:
+        count_user(instance.created_at, 1)
+
+
+@receiver(post_delete, sender=User)
+def count_deleted_user(sender, instance, **kwargs):
+    count_user(instance.created_at, -1)
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def refresh_student_latest_attendance(sender, instance, **kwargs):
+    # bulk writes (batch scans, end of day absentees) wait for the next refresh
+    student_id = instance.student_id
+    transaction.on_commit(lambda: refresh_latest_attendances([student_id]))
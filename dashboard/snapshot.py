@@ -0,0 +1,121 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from academic_record.academic_year import current_academic_year
+from academic_record.models import Schedule
+from registration.models import Registration
+from user_profile.models import Student
+from .aggregation import MONTHS, attendance_row, latest_attendance_ids, student_counts, user_counts_per_month
+from .models import DashboardSnapshot, StudentLatestAttendance
+
+BATCH_SIZE = 1000
+
+
+def refresh_latest_attendances(student_ids=None):
+    """
+        Point every student, or the given ones, to their latest attendance.
+    """
+    students = None
+    pointers = StudentLatestAttendance.objects.all()
+    if student_ids is not None:
+        students = Student.objects.filter(pk__in=student_ids)
+        pointers = pointers.filter(student__in=student_ids)
+
+    latest = dict(latest_attendance_ids(students))
+    existing = {pointer.student_id: pointer for pointer in pointers}
+
+    changed = []
+    for student_id, pointer in existing.items():
+        attendance_id = latest.pop(student_id, None)
+        if attendance_id is None:
+            pointer.delete()
+        elif pointer.attendance_id != attendance_id:
+            pointer.attendance_id = attendance_id
+            changed.append(pointer)
+
+    StudentLatestAttendance.objects.bulk_update(changed, ['attendance'], batch_size=BATCH_SIZE)
+    StudentLatestAttendance.objects.bulk_create([
+        StudentLatestAttendance(student_id=student_id, attendance_id=attendance_id)
+        for student_id, attendance_id in latest.items() if attendance_id is not None
+    ], batch_size=BATCH_SIZE)
+
+
+@transaction.atomic
+def refresh_snapshot():
+    """
+        Recompute every dashboard aggregate into the single snapshot row.
+    """
+    students = student_counts()
+    month_counts = user_counts_per_month()
+    academic_year = current_academic_year()
+
+    values = {
+        'students_count': students['total'],
+        'registrations_count': Registration.objects.filter(
+            academic_year=academic_year).count() if academic_year else 0,
+        'teachers_count': Schedule.objects.count(),
+        'users_count': sum(month_counts.values()),
+        'gender_counts': students['genders'],
+        'year_level_counts': students['year_levels'],
+        'month_counts': month_counts,
+        'refreshed_at': timezone.now(),
+    }
+    snapshot = DashboardSnapshot.objects.select_for_update().first()
+    if snapshot is None:
+        snapshot = DashboardSnapshot(**values)
+    else:
+        for field, value in values.items():
+            setattr(snapshot, field, value)
+    snapshot.save()
+
+    refresh_latest_attendances()
+    return snapshot
+
+
+def get_snapshot():
+    """
+        The stored snapshot, computed on the spot when there is none yet or
+        it is older than DASHBOARD_SNAPSHOT_MAX_AGE seconds.
+    """
+    snapshot = DashboardSnapshot.objects.first()
+    max_age = settings.DASHBOARD_SNAPSHOT_MAX_AGE
+
+    if snapshot is None or (max_age and timezone.now() - snapshot.refreshed_at > timedelta(seconds=max_age)):
+        snapshot = refresh_snapshot()
+    return snapshot
+
+
+@transaction.atomic
+def count_user(created_at, delta):
+    """
+        Add delta accounts created at created_at to the snapshot, if any.
+    """
+    snapshot = DashboardSnapshot.objects.select_for_update().first()
+    if snapshot is None:
+        return
+
+    month = MONTHS[timezone.localtime(created_at).month - 1]
+    snapshot.month_counts[month] = max(snapshot.month_counts.get(month, 0) + delta, 0)
+    snapshot.users_count = max(snapshot.users_count + delta, 0)
+    snapshot.save(update_fields=['month_counts', 'users_count', 'updated_at'])
+
+
+def snapshot_context(snapshot):
+    latest_attendances = StudentLatestAttendance.objects.select_related(
+        'attendance__student__user').order_by('attendance__student__created_at')
+
+    return {
+        'students_count': snapshot.students_count,
+        'teachers_count': snapshot.teachers_count,
+        'users_count': snapshot.users_count,
+        'student_genders': list(snapshot.gender_counts.keys()),
+        'gender_num': list(snapshot.gender_counts.values()),
+        'student_year_levels': list(snapshot.year_level_counts.keys()),
+        'year_levels_counts': snapshot.year_level_counts,
+        'month_counts': {month: snapshot.month_counts.get(month, 0) for month in MONTHS},
+        'students_with_attendance': [attendance_row(pointer.attendance) for pointer in latest_attendances],
+        'snapshot_refreshed_at': snapshot.refreshed_at,
+    }
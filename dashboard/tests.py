@@ -1,3 +1,215 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from academic_record.models import Attendance
+from academic_record.seed import seed_school
+from base.models import User
+from class_information.models import Section
+from dashboard.aggregation import MONTHS, dashboard_summary, latest_attendances
+from dashboard.management.commands.benchmark_dashboard import legacy_dashboard
+from dashboard.models import DashboardSnapshot, StudentLatestAttendance
+from dashboard.snapshot import get_snapshot, refresh_snapshot
+from user_profile.models import Student
+
+
+class DashboardSummaryTestCase(TestCase):
+    def setUp(self):
+        seed_school(prefix='dash', students=30, sections=3, subjects=2, days=4,
+                    assessments=0, chat_messages=0)
+
+    def test_matches_legacy_dashboard(self):
+        summary = dashboard_summary()
+        legacy = legacy_dashboard()
+
+        for key in ['students_count', 'teachers_count', 'gender_num', 'year_levels_counts', 'users_count']:
+            self.assertEqual(summary[key], legacy[key], key)
+        self.assertEqual(
+            {(row['student'].pk, row['latest_attendance_date']) for row in summary['students_with_attendance']},
+            {(student.pk, attendance.attendance_date) for student, attendance in legacy['students_with_attendance']})
+        self.assertEqual(sum(summary['month_counts'].values()), User.objects.count())
+
+    def test_queries_do_not_grow_with_students(self):
+        with CaptureQueriesContext(connection) as queries:
+            dashboard_summary()
+        seed_school(prefix='more', students=60, sections=3, subjects=2, days=4,
+                    assessments=0, chat_messages=0)
+        with CaptureQueriesContext(connection) as more_queries:
+            summary = dashboard_summary()
+
+        self.assertEqual(summary['students_count'], 90)
+        self.assertEqual(len(more_queries), len(queries))
+        self.assertLessEqual(len(queries), 4)
+
+    def test_latest_attendance_is_the_newest_day(self):
+        student = Student.objects.first()
+        row = next(row for row in dashboard_summary()['students_with_attendance']
+                   if row['student'].pk == student.pk)
+
+        self.assertEqual(row['latest_attendance_date'],
+                         student.attendance_set.order_by('-attendance_date')[0].attendance_date)
+        self.assertGreater(row['latest_attendance_date'], date(2024, 6, 3))
+
+    def test_view_renders_counts(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'p4ssw0rD'))
+        response = self.client.get(reverse('dashboard'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Students: 30')
+        self.assertContains(response, f'Total Users in System: {User.objects.count()}')
+
+
+class DashboardSnapshotTestCase(TestCase):
+    def setUp(self):
+        seed_school(prefix='snap', students=20, sections=2, subjects=2, days=3,
+                    assessments=0, chat_messages=0)
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'p4ssw0rD')
+
+    def test_snapshot_matches_live_aggregates(self):
+        snapshot = refresh_snapshot()
+        summary = dashboard_summary()
+
+        self.assertEqual(snapshot.students_count, summary['students_count'])
+        self.assertEqual(snapshot.users_count, summary['users_count'])
+        self.assertEqual(snapshot.year_level_counts, summary['year_levels_counts'])
+        self.assertEqual(snapshot.registrations_count, 20)
+        self.assertEqual(
+            dict(StudentLatestAttendance.objects.values_list('student_id', 'attendance_id')),
+            {attendance.student_id: attendance.pk for attendance in latest_attendances()})
+
+    def test_view_renders_the_stored_snapshot(self):
+        refresh_snapshot()
+        self.client.force_login(self.admin)
+        Student.objects.filter(pk=Student.objects.first().pk).delete()
+
+        self.assertContains(self.client.get(reverse('dashboard')), 'Students: 20')
+        self.assertContains(self.client.get(reverse('dashboard'), {'refresh': 1}), 'Students: 19')
+        self.assertEqual(DashboardSnapshot.objects.count(), 1)
+
+    def test_only_superusers_force_a_refresh(self):
+        refreshed_at = refresh_snapshot().refreshed_at
+        staff = User.objects.create_user('staff', 'staff@example.com', 'p4ssw0rD', is_staff=True)
+        self.client.force_login(staff)
+
+        self.client.get(reverse('dashboard'), {'refresh': 1})
+        self.assertEqual(DashboardSnapshot.objects.get().refreshed_at, refreshed_at)
+
+    @override_settings(DASHBOARD_SNAPSHOT_MAX_AGE=60)
+    def test_stale_snapshot_is_recomputed(self):
+        snapshot = refresh_snapshot()
+        DashboardSnapshot.objects.update(refreshed_at=snapshot.refreshed_at - timedelta(minutes=5))
+
+        self.assertGreater(get_snapshot().refreshed_at, snapshot.refreshed_at - timedelta(minutes=5))
+
+    def test_users_are_counted_incrementally(self):
+        snapshot = refresh_snapshot()
+        month = MONTHS[timezone.localtime().month - 1]
+
+        user = User.objects.create_user('late', 'late@example.com', 'p4ssw0rD')
+        updated = DashboardSnapshot.objects.get()
+        self.assertEqual(updated.users_count, snapshot.users_count + 1)
+        self.assertEqual(updated.month_counts[month], snapshot.month_counts[month] + 1)
+        self.assertEqual(updated.refreshed_at, snapshot.refreshed_at)
+
+        user.delete()
+        self.assertEqual(DashboardSnapshot.objects.get().users_count, snapshot.users_count)
+
+    def test_attendance_moves_the_latest_pointer(self):
+        refresh_snapshot()
+        pointer = StudentLatestAttendance.objects.select_related('attendance').first()
+        previous = pointer.attendance
+
+        with self.captureOnCommitCallbacks(execute=True):
+            attendance = Attendance.objects.create(
+                student_id=pointer.student_id, schedule_id=previous.schedule_id, is_present=True,
+                attendance_date=previous.attendance_date + timedelta(days=7))
+        self.assertEqual(StudentLatestAttendance.objects.get(pk=pointer.pk).attendance_id, attendance.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            attendance.delete()
+        self.assertEqual(StudentLatestAttendance.objects.get(student_id=pointer.student_id).attendance_id,
+                         previous.pk)
+
+    def test_refresh_command(self):
+        out = StringIO()
+        call_command('refresh_dashboard_snapshot', stdout=out)
+
+        self.assertIn('20 students', out.getvalue())
+        self.assertEqual(StudentLatestAttendance.objects.count(), 20)
+
+
+class DashboardDetailListTestCase(TestCase):
+    def setUp(self):
+        seed_school(prefix='detail', students=30, sections=3, subjects=2, days=1,
+                    assessments=0, chat_messages=0)
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'p4ssw0rD')
+        self.client.force_login(self.admin)
+        self.section = Section.objects.order_by('name').first()
+
+    def test_students_are_paginated_and_searchable(self):
+        response = self.client.get(reverse('dash_detail_students'), {'page_size': 7})
+        self.assertEqual(response.data['count'], 30)
+        self.assertEqual(len(response.data['results']), 7)
+        self.assertEqual(set(response.data['results'][0]),
+                         {'id', 'first_name', 'last_name', 'year_level', 'section', 'section_id'})
+
+        response = self.client.get(reverse('dash_detail_students'), {'search': 'Student 12'})
+        self.assertEqual([row['first_name'] for row in response.data['results']], ['Student 12'])
+
+    def test_filters_by_section_and_year_level(self):
+        response = self.client.get(reverse('dash_detail_students'), {'section': self.section.pk})
+        self.assertEqual(response.data['count'], 10)
+        self.assertEqual({row['section'] for row in response.data['results']}, {self.section.name})
+
+        response = self.client.get(reverse('dash_detail_teachers'), {'year_level': self.section.year_level})
+        self.assertEqual(response.data['count'], 2)
+
+        response = self.client.get(reverse('dash_detail_students'), {'section': 'not-a-uuid'})
+        self.assertEqual(response.data['count'], 0)
+
+    def test_ordering_is_stable_across_pages(self):
+        seen = []
+        for page in [1, 2, 3]:
+            response = self.client.get(reverse('dash_detail_teachers'),
+                                       {'ordering': 'subject__name', 'page_size': 2, 'page': page})
+            seen += response.data['results']
+
+        self.assertEqual(len({row['id'] for row in seen}), 6)
+        self.assertEqual([row['subject'] for row in seen], sorted(row['subject'] for row in seen))
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.client.get(reverse('dash_detail_students'), {'page_size': 1})
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('dash_detail_students'), {'page_size': 1})
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(reverse('dash_detail_students'), {'page_size': 30})
+
+        self.assertEqual(len(large), len(small))
+
+    def test_only_admins_read_the_tables(self):
+        self.client.force_login(User.objects.create_user('plain', 'plain@example.com', 'p4ssw0rD'))
+
+        self.assertEqual(self.client.get(reverse('dash_detail_students')).status_code, 403)
+
+    def test_detail_page_renders_without_rows(self):
+        response = self.client.get(reverse('dash_detail'))
+
+        self.assertContains(response, 'Total Students: 30')
+        self.assertContains(response, reverse('dash_detail_students'))
+        self.assertNotContains(response, 'Student 12')
+
+
+class BenchmarkDashboardTestCase(TestCase):
+    def test_reports_both_implementations(self):
+        out = StringIO()
+        call_command('benchmark_dashboard', students=10, sections=2, subjects=2, days=2, repeat=1, stdout=out)
+
+        self.assertIn('legacy (before)', out.getvalue())
+        self.assertIn('aggregated (after)', out.getvalue())
+        self.assertFalse(Student.objects.exists())
@@ -1,104 +1,113 @@
 from django.shortcuts import render
-
-from academic_record.models import AcademicYear, Attendance, Schedule
-from base.models import User
-from user_profile.models import Student
+from rest_framework import filters, generics, permissions
+
+from academic_record.academic_year import current_academic_year
+from academic_record.models import Schedule
+from academic_record.uuid_checker import is_valid_uuid
+from class_information.models import YEAR_LEVEL_CHOICES, Section
+from core.eager_loading import EagerLoadingMixin
+from core.paginate import ExtraSmallResultsSetPagination
+from dashboard.aggregation import MONTHS
+from dashboard.snapshot import get_snapshot, refresh_snapshot, snapshot_context
+from dashboard.serializers import DashboardStudentSerializers, DashboardTeacherSerializers
 from registration.models import Registration
 
-from django.db.models import Count
-from django.db.models.functions import ExtractMonth
 import json
 
-def dashboard_view(request):
-    academic_years = AcademicYear.objects.all()
-    students_users = Student.objects.all()
-    # students_users = Registration.objects.filter(academic_year=academic_years.first())
-    teachers_users = Schedule.objects.all()
-    male_students = Student.objects.filter(gender='M')
-    female_students = Student.objects.filter(gender='F')
-    year_levels_counts = {
-        'GRADE 7': Student.objects.filter(year_level='GRADE 7').count(),
-        'GRADE 8': Student.objects.filter(year_level='GRADE 8').count(),
-        'GRADE 9': Student.objects.filter(year_level='GRADE 9').count(),
-        'GRADE 10': Student.objects.filter(year_level='GRADE 10').count()
-    }
-
-    # For Students to retrieve Latest Attendance 
-    students_data = Student.objects.all()
-    students_with_attendance = []
-
-    for student in students_data:
-        latest_attendance = Attendance.objects.filter(student=student).order_by('-attendance_date').first()
-        if latest_attendance:
-            students_with_attendance.append({
-                'student': student,
-                'latest_attendance_date': latest_attendance.attendance_date,
-                'student_time_in': latest_attendance.time_in,
-                'student_time_out':  latest_attendance.time_out,
-                'is_present': latest_attendance.is_present
-            })
-
-
-    # Determine all users stored in system
-    user_count = User.objects.all()
-
-    # Student Genders
-    student_genders = ['M', 'F']
-    gender_num = [male_students, female_students]
 
-    # Student Grade Levels
-    student_year_levels = ['GRADE 7', 'GRADE 8', 'GRADE 9', 'GRADE 10']
-    
-    # Determine no. of Accounts
-    month_lists = ["January","February","March","April","May","June","July","August","September","October","November","December"]
+def request_snapshot(request):
+    # superusers can recompute the statistics with ?refresh=1
+    if request.user.is_superuser and request.GET.get('refresh'):
+        return refresh_snapshot()
+    return get_snapshot()
 
-    user_counts = User.objects.annotate(month=ExtractMonth('created_at')).values('month').annotate(count=Count('id')).order_by('month')
 
-    months = []
-    counts = []
-
-    month_counts = {month: 0 for month in month_lists}
-
-    for user_count in user_counts:
-        month_name = month_lists[user_count['month'] - 1]
-        month_counts[month_name] = user_count['count']
-
-    months = list(month_counts.keys())
-    counts = list(month_counts.values())
+def dashboard_view(request):
+    summary = snapshot_context(request_snapshot(request))
+    month_counts = summary.pop('month_counts')
 
     context = {
-        'students_users': students_users,
-        'teachers_users': teachers_users,
-        'male_students': male_students,
-        'female_students': female_students,
-        'student_genders': student_genders,
-        'gender_num': gender_num,
-        'student_year_levels': student_year_levels,
-        'year_levels_counts': year_levels_counts,
-        'user_count': user_count,
-        'students_with_attendance': students_with_attendance,
-        'month_lists': month_lists,
-        'months': json.dumps(months),
-        'counts': json.dumps(counts),
+        **summary,
+        'month_lists': MONTHS,
+        'months': json.dumps(list(month_counts.keys())),
+        'counts': json.dumps(list(month_counts.values())),
     }
 
-
     return render(request, 'dashboard/dashboard.html', context)
 
 def dashboard_detail_view(request):
-    academic_years = AcademicYear.objects.all()
-    all_students = Registration.objects.filter(academic_year=academic_years.first())
-    teachers_users = Schedule.objects.all()
+    snapshot = request_snapshot(request)
 
     context = {
-        'all_students': all_students,
-        'teachers_users': teachers_users
+        'students_count': snapshot.registrations_count,
+        'teachers_count': snapshot.teachers_count,
+        'snapshot_refreshed_at': snapshot.refreshed_at,
+        'sections': Section.objects.order_by('year_level', 'name'),
+        'year_levels': [year_level for year_level, _ in YEAR_LEVEL_CHOICES],
     }
 
     return render(request, 'dashboard/dashboard_detail_view.html', context)
-    
 
-    
+
+class StableOrderingFilter(filters.OrderingFilter):
+    # rows tied on the chosen columns keep one order across pages
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering and 'id' not in ordering:
+            ordering = [*ordering, 'id']
+        return ordering
+
+
+class DashboardDetailListView(EagerLoadingMixin, generics.ListAPIView):
+    """
+        Page of a dashboard detail table, ?search= on names, ?ordering= on
+        ordering_fields and ?section= / ?year_level= filters. One count and
+        one page query whatever the page size.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    pagination_class = ExtraSmallResultsSetPagination
+    filter_backends = [filters.SearchFilter, StableOrderingFilter]
+    year_level_field = None
+
+    def get_queryset(self):
+        queryset = self.queryset.all()
+        section = self.request.GET.get('section', None)
+        year_level = self.request.GET.get('year_level', None)
+
+        if section:
+            if not is_valid_uuid(section):
+                return queryset.none()
+            queryset = queryset.filter(section__pk=section)
+        if year_level:
+            queryset = queryset.filter(**{self.year_level_field: year_level})
+        return queryset
+
+
+class DashboardStudentListView(DashboardDetailListView):
+    serializer_class = DashboardStudentSerializers
+    queryset = Registration.objects.all()
+    select_related_fields = ['student__user', 'section']
+    search_fields = ['student__user__first_name', 'student__user__last_name']
+    ordering_fields = ['student__user__first_name', 'student__user__last_name', 'section__name']
+    ordering = ['student__user__last_name', 'student__user__first_name', 'id']
+    year_level_field = 'student__year_level'
+
+    def get_queryset(self):
+        academic_year = current_academic_year(self.request)
+        if academic_year is None:
+            return Registration.objects.none()
+        return super().get_queryset().filter(academic_year=academic_year)
+
+
+class DashboardTeacherListView(DashboardDetailListView):
+    serializer_class = DashboardTeacherSerializers
+    queryset = Schedule.objects.all()
+    select_related_fields = ['teacher__user', 'section', 'subject']
+    search_fields = ['teacher__user__first_name', 'teacher__user__last_name', 'subject__name']
+    ordering_fields = ['teacher__user__first_name', 'teacher__user__last_name', 'section__name', 'subject__name']
+    ordering = ['teacher__user__last_name', 'teacher__user__first_name', 'id']
+    year_level_field = 'section__year_level'
+
 
 # def dashboard_detail_view(request, pk):
 #     attendance_data = Attendance.objects.filter(student__pk = pk).order_by('created_at')
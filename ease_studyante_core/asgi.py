@@ -18,6 +18,7 @@ from django.core.asgi import get_asgi_application
 from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from chat import routing
+from chat.middleware import TokenAuthMiddleware
 from channels.security.websocket import AllowedHostsOriginValidator
 from channels.auth import AuthMiddlewareStack
 
@@ -27,8 +28,10 @@ application = ProtocolTypeRouter(
     {
         "http": django_asgi_app,
         "websocket": AuthMiddlewareStack(
-            URLRouter(
-                routing.websocket_urlpatterns
+            TokenAuthMiddleware(
+                URLRouter(
+                    routing.websocket_urlpatterns
+                )
             )
         )
     }
@@ -0,0 +1,16 @@
+# widgets of the admin site, kept apart from the views the API-only settings load
+from dal import autocomplete
+from django.db.models import Q
+
+from base.models import User
+from user_profile.models import Teacher
+
+
+class TeacherAutocomplete(autocomplete.Select2QuerySetView):
+    def get_queryset(self):
+        teachers = Teacher.objects.all().values('user__pk')
+        qs = User.objects.filter(pk__in=teachers)
+        if self.q:
+            qs = qs.filter(Q(first_name__icontains=self.q) | Q(
+                last_name__icontains=self.q))
+        return qs
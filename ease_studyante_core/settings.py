@@ -13,7 +13,6 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 import os
 from pathlib import Path
 import dj_database_url
-from firebase_admin import initialize_app, App
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -62,6 +61,7 @@ INSTALLED_APPS = [
     'drf_yasg',
     'corsheaders',
     'fcm_django',
+    'django_crontab',
 
     'dashboard',
     'base',
@@ -75,15 +75,43 @@ INSTALLED_APPS = [
 
 ASGI_APPLICATION = 'ease_studyante_core.asgi.application'
 
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
+# chat groups only reach sockets of the same process with the in memory layer,
+# set REDIS_URL to share them between daphne workers
+REDIS_URL = os.environ.get('REDIS_URL')
+# messages a socket may have pending before the layer drops new ones
+CHANNEL_LAYER_CAPACITY = int(os.environ.get('CHANNEL_LAYER_CAPACITY', 1500))
+
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {
+                "hosts": [REDIS_URL],
+                "capacity": CHANNEL_LAYER_CAPACITY,
+                "expiry": 10,
+            },
+        }
     }
-}
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+            "CONFIG": {
+                "capacity": CHANNEL_LAYER_CAPACITY,
+            },
+        }
+    }
+
+# chat messages are written in batches of CHAT_FLUSH_SIZE or every CHAT_FLUSH_INTERVAL seconds
+CHAT_FLUSH_SIZE = int(os.environ.get('CHAT_FLUSH_SIZE', 50))
+CHAT_FLUSH_INTERVAL = float(os.environ.get('CHAT_FLUSH_INTERVAL', 0.5))
+# failed flushes after which a message is dropped
+CHAT_FLUSH_MAX_ATTEMPTS = int(os.environ.get('CHAT_FLUSH_MAX_ATTEMPTS', 20))
 
 CORS_ALLOW_ALL_ORIGINS = True
 
 MIDDLEWARE = [
+    'core.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -138,13 +166,11 @@ DATABASES = {
 #     }
 # }
 
-# Optional ONLY IF you have initialized a firebase app already:
-# Visit https://firebase.google.com/docs/admin/setup/#python
-# for more options for the following:
+# The default firebase app is initialized by core.firebase.firebase_app() on the
+# first push, not here, so every process does not pay for it at startup.
 # Store an environment variable called GOOGLE_APPLICATION_CREDENTIALS
 # which is a path that point to a json file with your credentials.
-# Additional arguments are available: credentials, options, name
-FIREBASE_APP = initialize_app()
+# Visit https://firebase.google.com/docs/admin/setup/#python
 # To learn more, visit the docs here:
 # https://cloud.google.com/docs/authentication/getting-started>
 
@@ -185,8 +211,6 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
         'rest_framework.permissions.IsAdminUser',
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 10
@@ -248,5 +272,71 @@ EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_USE_SSL = False
+# outbound email goes through the OutboxEmail table, see user_profile.email.EmailQueue
+EMAIL_QUEUE_WORKERS = int(os.environ.get('EMAIL_QUEUE_WORKERS', 2))
+EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', 20))
+EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', 5))
+EMAIL_RETRY_BACKOFF = int(os.environ.get('EMAIL_RETRY_BACKOFF', 30))
+# days sent and failed emails stay in the outbox
+EMAIL_RETENTION_DAYS = int(os.environ.get('EMAIL_RETENTION_DAYS', 30))
+# attendance and grade pushes to students and parents, see user_profile.push.PushQueue
+PUSH_NOTIFICATIONS_ENABLED = os.environ.get('PUSH_NOTIFICATIONS_ENABLED', 'True') == 'True'
+PUSH_TRANSPORT = os.environ.get('PUSH_TRANSPORT', 'user_profile.push.FirebaseTransport')
+PUSH_QUEUE_WORKERS = int(os.environ.get('PUSH_QUEUE_WORKERS', 1))
+# seconds the changes of a recipient are gathered into one notification
+PUSH_COALESCE_SECONDS = int(os.environ.get('PUSH_COALESCE_SECONDS', 30))
+# tokens per multicast, FCM takes at most 500
+PUSH_BATCH_SIZE = int(os.environ.get('PUSH_BATCH_SIZE', 500))
+PUSH_MAX_ATTEMPTS = int(os.environ.get('PUSH_MAX_ATTEMPTS', 5))
+PUSH_RETRY_BACKOFF = int(os.environ.get('PUSH_RETRY_BACKOFF', 30))
+# days sent, skipped and failed push events are kept
+PUSH_RETENTION_DAYS = int(os.environ.get('PUSH_RETENTION_DAYS', 7))
+# processes hashing passwords of a student import
+STUDENT_IMPORT_WORKERS = int(os.environ.get('STUDENT_IMPORT_WORKERS', min(4, os.cpu_count() or 1)))
+# seconds clients may reuse a student QR code image before revalidating it
+QR_CODE_MAX_AGE = int(os.environ.get('QR_CODE_MAX_AGE', 86400))
+# offline scans are accepted up to this many seconds old, or ahead of the server clock, else timed at the server time
+QR_SCAN_MAX_AGE = int(os.environ.get('QR_SCAN_MAX_AGE', 86400))
+QR_SCAN_MAX_FUTURE = int(os.environ.get('QR_SCAN_MAX_FUTURE', 300))
 DATA_UPLOAD_MAX_MEMORY_SIZE = 26214400
+# current academic year lookup, point the alias at a shared cache (e.g. redis) to share it between workers
+ACADEMIC_YEAR_CACHE_ALIAS = os.environ.get('ACADEMIC_YEAR_CACHE_ALIAS')
+ACADEMIC_YEAR_CACHE_TIMEOUT = int(os.environ.get('ACADEMIC_YEAR_CACHE_TIMEOUT', 60))
+# the dashboard renders from a stored snapshot, recomputed on view when older than this (seconds, 0 never)
+DASHBOARD_SNAPSHOT_MAX_AGE = int(os.environ.get('DASHBOARD_SNAPSHOT_MAX_AGE', 86400))
+# installed with `python manage.py crontab add`
+CRONJOBS = [
+    (os.environ.get('END_OF_DAY_CRON', '0 18 * * *'),
+     'django.core.management.call_command', ['perform_end_of_day_tasks']),
+    (os.environ.get('DASHBOARD_SNAPSHOT_CRON', '*/15 * * * *'),
+     'django.core.management.call_command', ['refresh_dashboard_snapshot']),
+    # emails left pending or waiting for a retry across a restart, and the outbox purge
+    (os.environ.get('EMAIL_QUEUE_CRON', '*/5 * * * *'),
+     'django.core.management.call_command', ['send_queued_emails']),
+    # pushes queued by processes that exit before the coalescing window closes, e.g. the absentees above
+    (os.environ.get('PUSH_QUEUE_CRON', '* * * * *'),
+     'django.core.management.call_command', ['send_push_notifications']),
+]
+# per endpoint request metrics, see core.instrumentation and /api/metrics
+INSTRUMENTATION_ENABLED = os.environ.get('INSTRUMENTATION_ENABLED', 'True') == 'True'
+# share of requests that keep the SQL of their slowest queries
+INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get('INSTRUMENTATION_SAMPLE_RATE', 0.01))
+INSTRUMENTATION_SAMPLE_QUERIES = int(os.environ.get('INSTRUMENTATION_SAMPLE_QUERIES', 20))
+# requests slower than this are logged at INFO, the others at DEBUG
+INSTRUMENTATION_SLOW_MS = int(os.environ.get('INSTRUMENTATION_SLOW_MS', 500))
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # one JSON line per request, set DEBUG to see the fast ones too
+        'core.instrumentation': {
+            'handlers': ['console'],
+            'level': os.environ.get('INSTRUMENTATION_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
 LOGIN_URL = '/admin/login/?next=/admin/'
@@ -0,0 +1,27 @@
+"""
+Settings of the API-only worker processes (the mobile apps' REST API and
+chat websockets): DJANGO_SETTINGS_MODULE=ease_studyante_core.settings_api
+
+Everything comes from ease_studyante_core.settings, without the swagger
+docs, without the admin site, its theme and its autocomplete widgets and
+without the daphne development server, so those are neither imported nor
+checked when a worker starts. The admin
+app stays installed through SimpleAdminConfig, which does not import the
+admin modules of the apps, for the password reset templates it ships.
+
+Run migrate and collectstatic with the full settings, the apps left out
+here still have tables and static files.
+"""
+
+from ease_studyante_core.settings import *  # noqa: F401,F403
+from ease_studyante_core.settings import INSTALLED_APPS
+
+# apps of the admin site and of the swagger docs, and daphne, which is only
+# installed for its runserver; the daphne command sets up its own server
+WEB_ONLY_APPS = ['daphne', 'admin_interface', 'colorfield', 'dal', 'dal_select2', 'drf_yasg']
+
+INSTALLED_APPS = [
+    'django.contrib.admin.apps.SimpleAdminConfig' if app == 'django.contrib.admin' else app
+    for app in INSTALLED_APPS if app not in WEB_ONLY_APPS]
+
+ROOT_URLCONF = 'ease_studyante_core.urls_api'
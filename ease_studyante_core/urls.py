@@ -17,9 +17,8 @@ Including another URLconf
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.contrib.staticfiles import views
-from django.urls import path, include, re_path
+from django.urls import path, re_path
 from rest_framework import permissions
-from django.contrib.auth import views as auth_views
 from rest_framework.routers import DefaultRouter
 from django.conf import settings
 from drf_yasg import openapi
@@ -28,10 +27,12 @@ from drf_yasg.views import get_schema_view
 from django.contrib.auth.decorators import login_required
 
 from base.models import User
-from dashboard.views import dashboard_detail_view, dashboard_view
+from dashboard.views import (DashboardStudentListView, DashboardTeacherListView,
+                             dashboard_detail_view, dashboard_view)
 
 from ease_studyante_core import settings
-from ease_studyante_core.views import TokenViewWithUserId, TeacherAutocomplete
+from ease_studyante_core.urls_api import api_urlpatterns
+from ease_studyante_core.autocomplete import TeacherAutocomplete
 from dal import autocomplete
 
 
@@ -55,15 +56,12 @@ urlpatterns = [
     path('swagger/', schema_view.with_ui('swagger',
          cache_timeout=0), name='schema-swagger-ui'),
     path('admin/', admin.site.urls, name='admin'),
-    path('api/', include('api.urls', namespace='api'),),
-    path('o/login/', TokenViewWithUserId.as_view(), name='token'),
+    *api_urlpatterns,
     # path("", chat_views.chatPage, name="chat-page"),
-    path('password-reset-complete/',
-         auth_views.PasswordResetCompleteView.as_view(
-             template_name='password_reset_complete.html'),
-         name='password_reset_complete'),
     path('', login_required(dashboard_view), name='dashboard'),
     path('dashboard/', login_required(dashboard_detail_view), name='dash_detail'),
+    path('dashboard/students/', DashboardStudentListView.as_view(), name='dash_detail_students'),
+    path('dashboard/teachers/', DashboardTeacherListView.as_view(), name='dash_detail_teachers'),
     path('teacher-autocomplete/', TeacherAutocomplete.as_view(model=User),
          name='teacher-autocomplete'),
 ]
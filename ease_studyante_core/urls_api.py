@@ -0,0 +1,23 @@
+"""
+URLs of the API-only worker processes, see ease_studyante_core.settings_api.
+ease_studyante_core.urls serves these as well, next to the admin site,
+the swagger docs and the dashboard.
+"""
+from django.conf import settings
+from django.conf.urls.static import static
+from django.contrib.auth import views as auth_views
+from django.urls import include, path
+
+from ease_studyante_core.views import TokenViewWithUserId
+
+api_urlpatterns = [
+    path('api/', include('api.urls', namespace='api'),),
+    path('o/login/', TokenViewWithUserId.as_view(), name='token'),
+    path('password-reset-complete/',
+         auth_views.PasswordResetCompleteView.as_view(
+             template_name='password_reset_complete.html'),
+         name='password_reset_complete'),
+]
+
+urlpatterns = api_urlpatterns + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -5,10 +5,7 @@ from django.views.decorators.debug import sensitive_post_parameters
 from oauth2_provider.models import get_access_token_model
 from oauth2_provider.signals import app_authorized
 from oauth2_provider.views.base import TokenView
-from dal import autocomplete
-from django.db.models import Q
 
-from base.models import User
 from user_profile.models import Parent, Student, Teacher
 
 
@@ -68,12 +65,3 @@ class TokenViewWithUserId(TokenView):
             response[k] = v
         return response
 
-
-class TeacherAutocomplete(autocomplete.Select2QuerySetView):
-    def get_queryset(self):
-        teachers = Teacher.objects.all().values('user__pk')
-        qs = User.objects.filter(pk__in=teachers)
-        if self.q:
-            qs = qs.filter(Q(first_name__icontains=self.q) | Q(
-                last_name__icontains=self.q))
-        return qs
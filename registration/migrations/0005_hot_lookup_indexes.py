@@ -0,0 +1,21 @@
+# Generated by Django 3.2 on 2026-10-18 13:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('registration', '0004_alter_registration_academic_year'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='registration',
+            index=models.Index(fields=['student', 'academic_year'], name='registration_student_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registration',
+            index=models.Index(fields=['section', 'academic_year'], name='registration_section_year_idx'),
+        ),
+    ]
@@ -12,5 +12,11 @@ class Registration(BaseModelWithUUID):
     section = models.ForeignKey(Section, on_delete=models.CASCADE)
     academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'academic_year'], name='registration_student_year_idx'),
+            models.Index(fields=['section', 'academic_year'], name='registration_section_year_idx'),
+        ]
+
     def __str__(self):
         return f"{self.student} - {self.section}"
@@ -1,10 +1,11 @@
 from rest_framework import serializers
 
+from core.sparse_fields import SparseFieldsMixin
 from user_profile.serializers import StudentSerializer
 from .models import Registration
 
 
-class RegisterSerializers(serializers.ModelSerializer):
+class RegisterSerializers(SparseFieldsMixin, serializers.ModelSerializer):
     student = StudentSerializer()
 
     class Meta:
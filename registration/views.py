@@ -13,5 +13,5 @@ class RegisteredStudentListView(generics.ListAPIView):
     def get_queryset(self):
         section = self.request.GET.get('section', None)
         if section:
-            return self.queryset.filter(section__pk=section).order_by('student__user__lastname')
+            return self.queryset.filter(section__pk=section).order_by('student__user__last_name')
         return super().get_queryset()
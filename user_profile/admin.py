@@ -1,25 +1,27 @@
-from io import BytesIO
 from typing import Any
 from django import forms
-from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User, Group, Permission
+from django.db import transaction
 from django.db.models import Q
+from django.utils import timezone
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
 from django.template.loader import get_template
 from django.core.validators import EmailValidator
 
 from django.db.models.query import QuerySet
 from django.http import HttpRequest
-import qrcode
 
-# from aes.aes_implementation import encrypt
-from aes.aes_implementation import encrypt
 from base.admin import BaseAdmin, BaseStackedInline, User
-from academic_record.models import AcademicYear, Schedule
-from ease_studyante_core import settings
-from user_profile.email import Util
-from .models import Admin, Student, Teacher, Parent
+from academic_record.academic_year import current_academic_year
+from academic_record.models import Schedule
+from user_profile.credentials import initial_password
+from user_profile.email import Util, email_queue
+from user_profile.push import push_queue
+from user_profile.student_import import IMPORT_COLUMNS, start_student_import
+from .models import Admin, OutboxEmail, PushEvent, Student, StudentImport, Teacher, Parent
 from class_information.models import Department
 from reedsolo import RSCodec, ReedSolomonError
 
@@ -181,9 +183,7 @@ class StudentCreationForm(forms.ModelForm):
             user.email = email
 
         else:
-            last_4_digits = contact_number[-4:]
-            last_name += '_' * max(0, 4 - len(last_name))
-            password = (last_name[:4] + last_4_digits)
+            password = initial_password(last_name, contact_number)
             # Save the user and student objects
             user = User.objects.create_user(
                 username=email,
@@ -194,36 +194,6 @@ class StudentCreationForm(forms.ModelForm):
             )
             instance.user = user
 
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-
-            # You can pass any data you want to encode in the QR code
-            encrypted = encrypt(str(instance.pk), settings.AES_SECRET_KEY)
-            aes_256 = f'{encrypted["cipher_text"]}${encrypted["salt"]}${encrypted["nonce"]}${encrypted["tag"]}'
-
-            # pass the ase_256 F'String
-            qr.add_data(aes_256)
-            qr.make(fit=True)
-            img = qr.make_image(fill_color="black", back_color="white")
-
-            # Save QR code image to ImageField
-            buffer = BytesIO()
-            img.save(buffer)
-            file_name = f'qr_code_{user.first_name}{user.last_name}.png'
-            file_buffer = buffer.getvalue()
-            instance.qr_code_photo.save(file_name, InMemoryUploadedFile(
-                file=BytesIO(file_buffer),
-                field_name=None,
-                name=file_name,
-                content_type='image/png',
-                size=len(file_buffer),
-                charset=None
-            ), save=False)
-
             context_email = {
                 "full_name": f"{user.first_name} {user.last_name}",
                 "password": password,
@@ -429,7 +399,7 @@ class StudentAdmin(admin.ModelAdmin):
     formfield_querysets = {
         'user': lambda: User.objects.all(),
     }
-    readonly_fields = ['qr_code_photo']
+    readonly_fields = ['qr_code']
     autocomplete_fields = ['parent',]
     fieldsets = (
         ('Student Information', {
@@ -444,11 +414,18 @@ class StudentAdmin(admin.ModelAdmin):
                 'parent',
                 'year_level',
                 'profile_photo',
-                'qr_code_photo',
+                'qr_code',
             ],
         }),
     )
 
+    @admin.display(description='QR code')
+    def qr_code(self, obj):
+        if obj is None or obj.pk is None:
+            return '-'
+        return format_html('<img src="{}" width="200" height="200" alt="QR code">',
+                           reverse('api:student-qr-code', kwargs={'pk': obj.pk}))
+
     def get_form(self, request, obj=None, **kwargs):
         form = super(StudentAdmin, self).get_form(request, obj, **kwargs)
         if obj is not None:
@@ -473,10 +450,9 @@ class ScheduleTabularInline(admin.TabularInline):
         return False
 
     def get_queryset(self, request: HttpRequest) -> QuerySet[Any]:
-        academic_years = AcademicYear.objects.all()
+        academic_year = current_academic_year(request)
         qs = super(ScheduleTabularInline, self).get_queryset(request)
-        if academic_years.exists():
-            academic_year = academic_years.first()
+        if academic_year:
             return qs.filter(academic_year=academic_year)
 
         return qs
@@ -561,3 +537,87 @@ class ParentAdmin(BaseAdmin):
                 form.base_fields['last_name'].initial = obj.user.last_name
                 form.base_fields['email'].initial = obj.user.email
         return form
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to_email', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ['status',]
+    search_fields = ['to_email', 'subject']
+    readonly_fields = [field.name for field in OutboxEmail._meta.fields]
+    actions = ['retry_now']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Retry the selected emails now')
+    def retry_now(self, request, queryset):
+        queryset.exclude(status=OutboxEmail.SENT).update(
+            status=OutboxEmail.PENDING, attempts=0, next_attempt_at=timezone.now(), claim_token=None)
+        transaction.on_commit(email_queue.notify)
+
+
+@admin.register(PushEvent)
+class PushEventAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'recipient', 'student', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ['status', 'kind']
+    search_fields = ['recipient__username', 'recipient__last_name']
+    readonly_fields = [field.name for field in PushEvent._meta.fields]
+    actions = ['retry_now']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Retry the selected push notifications now')
+    def retry_now(self, request, queryset):
+        queryset.exclude(status=PushEvent.SENT).update(
+            status=PushEvent.PENDING, attempts=0, due_at=timezone.now(), claim_token=None)
+        transaction.on_commit(push_queue.notify)
+
+
+@admin.register(StudentImport)
+class StudentImportAdmin(admin.ModelAdmin):
+    list_display = ('file', 'status', 'progress', 'created_count', 'error_count', 'created_at')
+    list_filter = ['status',]
+    readonly_fields = ['status', 'progress', 'created_count', 'created_by', 'finished_at', 'error_report']
+
+    def get_fields(self, request, obj=None):
+        if obj is None:
+            return ['file']
+        return ['file', 'status', 'progress', 'created_count', 'created_by', 'finished_at', 'error_report']
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is None:
+            return []
+        return ['file', *self.readonly_fields]
+
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        if obj is None:
+            form.base_fields['file'].help_text = (
+                f'CSV or XLSX with the columns {", ".join(IMPORT_COLUMNS)}. '
+                'Reload this page after saving to follow the progress.')
+        return form
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+        if not change:
+            start_student_import(obj)
+
+    @admin.display(description='Progress')
+    def progress(self, obj):
+        return f'{obj.processed_rows} / {obj.total_rows}'
+
+    @admin.display(description='Errors')
+    def error_count(self, obj):
+        return len(obj.errors)
+
+    @admin.display(description='Error report')
+    def error_report(self, obj):
+        if not obj.errors:
+            return '-'
+        return format_html('<table>{}</table>', format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td>{}</td></tr>',
+            ((error['row'] or '', error['field'] or '', error['message']) for error in obj.errors)))
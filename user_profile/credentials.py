@@ -0,0 +1,40 @@
+"""
+    Per student work of account creation that needs no database: password
+    hashing and the QR image. Nothing here imports models so the functions
+    can run in spawned worker processes.
+"""
+from io import BytesIO
+
+import qrcode
+from django.utils.module_loading import import_string
+
+
+def initial_password(last_name, contact_number):
+    # first 4 letters of the last name padded with _, then the last 4 digits of the contact number
+    last_name += '_' * max(0, 4 - len(last_name))
+    return last_name[:4] + contact_number[-4:]
+
+
+def qr_png(data):
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+
+    buffer = BytesIO()
+    img.save(buffer)
+    return buffer.getvalue()
+
+
+def hash_password(job):
+    """
+        job: (password, hasher class path), returns the hashed password.
+    """
+    password, hasher_path = job
+    hasher = import_string(hasher_path)()
+    return hasher.encode(password, hasher.salt())
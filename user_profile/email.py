@@ -1,23 +1,262 @@
-from django.core.mail import EmailMessage
+import atexit
+import logging
+import threading
+import uuid
+from datetime import timedelta
 
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connections, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
 
-import threading
+from user_profile.models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_RESULT_FIELDS = ['body', 'status', 'attempts', 'next_attempt_at', 'claim_token',
+                        'sent_at', 'last_error', 'updated_at']
+
+
+class EmailQueue:
+    """
+        Outbound email. enqueue stores the message in the OutboxEmail table
+        and, once the transaction commits, wakes up to EMAIL_QUEUE_WORKERS
+        threads of this process. A worker claims due rows in batches of
+        EMAIL_BATCH_SIZE and sends them over one SMTP connection that stays
+        open while there is work. A failed message is retried after
+        EMAIL_RETRY_BACKOFF seconds, doubled on every attempt, and given up
+        after EMAIL_MAX_ATTEMPTS. Rows left SENDING by a process that died
+        are claimed again after EMAIL_CLAIM_TIMEOUT seconds. The body of a
+        sent email is cleared, welcome emails carry the initial password,
+        and purge removes finished rows after EMAIL_RETENTION_DAYS.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.workers = []
+        self.counters = {'sent': 0, 'retried': 0, 'failed': 0, 'batches': 0, 'connections': 0}
+
+    @property
+    def worker_count(self):
+        return getattr(settings, 'EMAIL_QUEUE_WORKERS', 2)
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'EMAIL_BATCH_SIZE', 20)
+
+    @property
+    def max_attempts(self):
+        return getattr(settings, 'EMAIL_MAX_ATTEMPTS', 5)
 
+    @property
+    def retry_backoff(self):
+        return getattr(settings, 'EMAIL_RETRY_BACKOFF', 30)
 
-class EmailThread(threading.Thread):
+    @property
+    def claim_timeout(self):
+        return getattr(settings, 'EMAIL_CLAIM_TIMEOUT', 600)
 
-    def __init__(self, email):
-        self.email = email
-        threading.Thread.__init__(self)
+    @property
+    def poll_interval(self):
+        return getattr(settings, 'EMAIL_QUEUE_POLL_INTERVAL', 30)
+
+    @property
+    def retention_days(self):
+        return getattr(settings, 'EMAIL_RETENTION_DAYS', 30)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def enqueue(self, to_email, subject, body, content_subtype='html'):
+        email = OutboxEmail.objects.create(
+            to_email=to_email, subject=subject, body=body, content_subtype=content_subtype)
+        transaction.on_commit(self.notify)
+        return email
+
+    def enqueue_many(self, messages):
+        """
+            messages: [(to_email, subject, body)] stored with one insert.
+        """
+        emails = OutboxEmail.objects.bulk_create([
+            OutboxEmail(to_email=to_email, subject=subject, body=body)
+            for to_email, subject, body in messages])
+        transaction.on_commit(self.notify)
+        return emails
+
+    def notify(self):
+        self.start()
+        self.wakeup.set()
+
+    def start(self):
+        with self.lock:
+            self.stopping.clear()
+            self.workers = [worker for worker in self.workers if worker.is_alive()]
+            while len(self.workers) < self.worker_count:
+                worker = threading.Thread(
+                    target=self.run, name=f'email-worker-{len(self.workers)}', daemon=True)
+                self.workers.append(worker)
+                worker.start()
+
+    def stop(self, timeout=5):
+        # unsent rows stay in the outbox for the next process
+        self.stopping.set()
+        self.wakeup.set()
+        for worker in self.workers:
+            worker.join(timeout)
+        self.workers = []
 
     def run(self):
-        self.email.send()
+        connection = None
+        try:
+            while not self.stopping.is_set():
+                try:
+                    emails = self.claim()
+                except Exception:
+                    logger.exception('Could not claim queued emails')
+                    emails = []
+
+                if emails:
+                    connection = self.deliver(emails, connection)
+                    continue
+
+                # nothing due, hold neither the SMTP nor the database connection
+                connection = self.close(connection)
+                connections.close_all()
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+        finally:
+            self.close(connection)
+            connections.close_all()
+
+    def claim(self):
+        now = timezone.now()
+        OutboxEmail.objects.filter(
+            status=OutboxEmail.SENDING, claimed_at__lt=now - timedelta(seconds=self.claim_timeout)).update(
+            status=OutboxEmail.PENDING, claim_token=None)
+
+        due = list(OutboxEmail.objects.filter(
+            status=OutboxEmail.PENDING, next_attempt_at__lte=now).order_by(
+            'next_attempt_at').values_list('pk', flat=True)[:self.batch_size])
+        if not due:
+            return []
+
+        # another worker or process may claim the same rows, the token tells whose they are
+        token = uuid.uuid4()
+        OutboxEmail.objects.filter(pk__in=due, status=OutboxEmail.PENDING).update(
+            status=OutboxEmail.SENDING, claim_token=token, claimed_at=now)
+        return list(OutboxEmail.objects.filter(claim_token=token, status=OutboxEmail.SENDING))
+
+    def deliver(self, emails, connection=None):
+        """
+            Send claimed emails over connection, opened when None, and
+            return the connection to reuse for the next batch.
+        """
+        self.count('batches')
+
+        for email in emails:
+            try:
+                if connection is None:
+                    connection = get_connection(fail_silently=False)
+                    connection.open()
+                    self.count('connections')
+
+                message = EmailMessage(
+                    subject=email.subject, body=email.body, to=[email.to_email], connection=connection)
+                message.content_subtype = email.content_subtype
+                message.send()
+            except Exception as error:
+                # the connection may be broken, the next message opens a new one
+                connection = self.close(connection)
+                self.retry_later(email, error)
+            else:
+                email.status = OutboxEmail.SENT
+                email.sent_at = timezone.now()
+                email.last_error = ''
+                # credentials and reset links are not kept once delivered
+                email.body = ''
+                self.count('sent')
+
+            email.attempts += 1
+            email.claim_token = None
+            email.updated_at = timezone.now()
+
+        OutboxEmail.objects.bulk_update(emails, OUTBOX_RESULT_FIELDS)
+        return connection
+
+    def retry_later(self, email, error):
+        email.last_error = repr(error)
+        if email.attempts + 1 >= self.max_attempts:
+            logger.error('Giving up on email %s to %s: %r', email.pk, email.to_email, error)
+            email.status = OutboxEmail.FAILED
+            self.count('failed')
+        else:
+            email.status = OutboxEmail.PENDING
+            email.next_attempt_at = timezone.now() + timedelta(
+                seconds=self.retry_backoff * 2 ** email.attempts)
+            self.count('retried')
+
+    def close(self, connection):
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                logger.exception('Could not close the email connection')
+        return None
+
+    def drain(self):
+        """
+            Send every due email in the calling thread, returns how many were sent.
+        """
+        sent = self.counters['sent']
+        connection = None
+        try:
+            emails = self.claim()
+            while emails:
+                connection = self.deliver(emails, connection)
+                emails = self.claim()
+        finally:
+            self.close(connection)
+
+        return self.counters['sent'] - sent
+
+    def purge(self, now=None):
+        """
+            Delete the sent and failed emails older than EMAIL_RETENTION_DAYS,
+            returns how many were deleted.
+        """
+        before = (now or timezone.now()) - timedelta(days=self.retention_days)
+        return OutboxEmail.objects.filter(
+            status__in=[OutboxEmail.SENT, OutboxEmail.FAILED], updated_at__lt=before).delete()[0]
+
+    def metrics(self):
+        outbox = {status: 0 for status, _ in OutboxEmail.STATUS_CHOICES}
+        for row in OutboxEmail.objects.values('status').annotate(count=Count('pk')):
+            outbox[row['status']] = row['count']
+
+        oldest = OutboxEmail.objects.filter(status=OutboxEmail.PENDING).aggregate(
+            oldest=Min('created_at'))['oldest']
+        with self.lock:
+            counters = dict(self.counters)
+            workers = sum(worker.is_alive() for worker in self.workers)
+
+        return {
+            'outbox': outbox,
+            'oldest_pending_seconds': (timezone.now() - oldest).total_seconds() if oldest else 0,
+            'workers': workers,
+            **counters,
+        }
+
+
+email_queue = EmailQueue()
+atexit.register(email_queue.stop)
 
 
 class Util:
     @staticmethod
     def send_email(data):
-        email = EmailMessage(
-            subject=data['email_subject'], body=data['email_body'], to=[data['to_email']])
-        email.content_subtype = "html"
-        EmailThread(email).start()
+        email_queue.enqueue(
+            to_email=data['to_email'], subject=data['email_subject'], body=data['email_body'])
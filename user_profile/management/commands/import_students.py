@@ -0,0 +1,30 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from user_profile.student_import import import_students, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Onboard students from a CSV or XLSX file, see user_profile.student_import.IMPORT_COLUMNS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file')
+
+    def progress(self, processed, total):
+        self.stdout.write(f'{processed}/{total} rows')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as file:
+                rows = read_rows(file, options['path'])
+        except OSError as error:
+            raise CommandError(f'Could not read {options["path"]}: {error}')
+        except ValidationError as error:
+            raise CommandError(' '.join(error.messages))
+
+        report = import_students(rows, self.progress)
+
+        for error in report['errors']:
+            self.stdout.write(f"row {error['row']} {error['field']}: {error['message']}")
+        self.stdout.write(
+            f"Created {report['created']} of {report['total']} students, {len(report['errors'])} errors")
@@ -0,0 +1,23 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from user_profile.push import push_queue
+
+
+class Command(BaseCommand):
+    help = ('Send the due push notifications and purge the finished ones past PUSH_RETENTION_DAYS, '
+            'scheduled in CRONJOBS for the events no worker of a running process picks up')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stats', action='store_true',
+                            help='Only print the delivery metrics as JSON')
+
+    def handle(self, *args, **options):
+        if not options['stats']:
+            sent = push_queue.drain()
+            self.stdout.write(f'Sent {sent} notifications')
+            purged = push_queue.purge()
+            self.stdout.write(f'Purged {purged} finished push events')
+
+        self.stdout.write(json.dumps(push_queue.metrics(), indent=2))
@@ -0,0 +1,23 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from user_profile.email import email_queue
+
+
+class Command(BaseCommand):
+    help = ('Send the due emails of the outbox and purge the finished ones past EMAIL_RETENTION_DAYS, '
+            'scheduled in CRONJOBS for the rows no worker of a running process picks up')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stats', action='store_true',
+                            help='Only print the delivery metrics as JSON')
+
+    def handle(self, *args, **options):
+        if not options['stats']:
+            sent = email_queue.drain()
+            self.stdout.write(f'Sent {sent} emails')
+            purged = email_queue.purge()
+            self.stdout.write(f'Purged {purged} finished emails')
+
+        self.stdout.write(json.dumps(email_queue.metrics(), indent=2))
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_profile', '0008_student_import'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='student',
+            name='qr_code_photo',
+            field=models.ImageField(blank=True, upload_to='images/qr_code/'),
+        ),
+    ]
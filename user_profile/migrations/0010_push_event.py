@@ -0,0 +1,44 @@
+# Generated by Django 3.2 on 2026-10-18 14:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('user_profile', '0009_student_qr_code_optional'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PushEvent',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('ATTENDANCE', 'Attendance'), ('GRADES', 'Grades')], max_length=10)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('SENDING', 'Sending'), ('SENT', 'Sent'), ('SKIPPED', 'Skipped, no device'), ('FAILED', 'Failed')], default='PENDING', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('due_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claim_token', models.UUIDField(blank=True, editable=False, null=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='push_events', to=settings.AUTH_USER_MODEL)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='user_profile.student')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pushevent',
+            index=models.Index(fields=['status', 'due_at'], name='push_event_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pushevent',
+            index=models.Index(fields=['recipient', 'status'], name='push_event_recipient_idx'),
+        ),
+    ]
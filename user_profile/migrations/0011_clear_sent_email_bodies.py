@@ -0,0 +1,20 @@
+# Generated by Django 3.2 on 2026-10-18 23:10
+
+from django.db import migrations
+
+
+def clear_sent_email_bodies(apps, schema_editor):
+    # sent welcome emails kept the initial password, the queue now clears it on delivery
+    OutboxEmail = apps.get_model('user_profile', 'OutboxEmail')
+    OutboxEmail.objects.filter(status='SENT').exclude(body='').update(body='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_profile', '0010_push_event'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_sent_email_bodies, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils.timezone import now
 from base.models import BaseModelWithUUID, User
 from class_information.models import Department
 
@@ -64,8 +65,9 @@ class Student(BaseProfile):
 
     year_level = models.CharField(
         max_length=10, choices=YEAR_LEVEL_CHOICES, default='GRADE 7')
+    # QR codes are rendered on request, see user_profile.qr_code, older students keep their stored image
     qr_code_photo = models.ImageField(
-        upload_to='images/qr_code/', blank=False, null=False)
+        upload_to='images/qr_code/', blank=True, null=False)
     parent = models.ForeignKey(
         Parent, on_delete=models.SET_NULL, blank=False, null=True)
 
@@ -79,3 +81,125 @@ class Teacher(BaseProfile):
 
     def __str__(self):
         return f'{self.user.last_name}- {self.user.first_name}'
+
+
+class OutboxEmail(BaseModelWithUUID):
+    """
+        Email waiting for delivery by user_profile.email.EmailQueue, so
+        nothing is lost across restarts. The body is cleared once it is sent.
+    """
+    PENDING = 'PENDING'
+    SENDING = 'SENDING'
+    SENT = 'SENT'
+    FAILED = 'FAILED'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    content_subtype = models.CharField(max_length=20, default='html')
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=now)
+    claim_token = models.UUIDField(null=True, blank=True, editable=False)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} - {self.to_email} ({self.status})'
+
+
+class PushEvent(BaseModelWithUUID):
+    """
+        Attendance or grade change of a student that its recipient, the
+        student or the parent, is told about by user_profile.push.PushQueue.
+        The pending events of a recipient go out as one notification.
+    """
+    ATTENDANCE = 'ATTENDANCE'
+    GRADES = 'GRADES'
+
+    KIND_CHOICES = [
+        (ATTENDANCE, 'Attendance'),
+        (GRADES, 'Grades'),
+    ]
+
+    PENDING = 'PENDING'
+    SENDING = 'SENDING'
+    SENT = 'SENT'
+    SKIPPED = 'SKIPPED'
+    FAILED = 'FAILED'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (SKIPPED, 'Skipped, no device'),
+        (FAILED, 'Failed'),
+    ]
+
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='push_events')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # end of the coalescing window, or of the retry backoff
+    due_at = models.DateTimeField(default=now)
+    claim_token = models.UUIDField(null=True, blank=True, editable=False)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'due_at'], name='push_event_due_idx'),
+            models.Index(fields=['recipient', 'status'], name='push_event_recipient_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} of {self.student_id} to {self.recipient_id} ({self.status})'
+
+
+class StudentImport(BaseModelWithUUID):
+    """
+        CSV/XLSX onboarding of students run by user_profile.student_import,
+        progress and the per row error report are kept on the row.
+    """
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    file = models.FileField(upload_to='imports/students/')
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    total_rows = models.PositiveIntegerField(default=0)
+    processed_rows = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+    created_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, editable=False)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.file.name} ({self.status})'
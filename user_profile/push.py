@@ -0,0 +1,381 @@
+import atexit
+import logging
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from fcm_django.models import FCMDevice
+from fcm_django.settings import FCM_DJANGO_SETTINGS
+
+from core.firebase import firebase_app
+from user_profile.models import PushEvent, Student
+
+logger = logging.getLogger(__name__)
+
+PUSH_RESULT_FIELDS = ['status', 'attempts', 'due_at', 'claim_token',
+                      'sent_at', 'last_error', 'updated_at']
+# recipients claimed per round of the worker
+CLAIM_RECIPIENTS = 1000
+# result of a token the device is gone for, the device is removed
+INVALID_TOKEN = 'invalid-token'
+
+TITLES = {
+    (PushEvent.ATTENDANCE,): 'Attendance updated',
+    (PushEvent.GRADES,): 'New grades posted',
+    (PushEvent.ATTENDANCE, PushEvent.GRADES): 'Attendance and grades updated',
+}
+
+
+class FirebaseTransport:
+    """
+        Sends through Firebase Cloud Messaging, one send_each_for_multicast
+        call per batch of tokens. Returns one result per token: None when it
+        was delivered, INVALID_TOKEN or the error otherwise.
+    """
+
+    def send_multicast(self, tokens, title, body, data):
+        from firebase_admin import messaging
+
+        response = messaging.send_each_for_multicast(messaging.MulticastMessage(
+            tokens=tokens, notification=messaging.Notification(title=title, body=body), data=data),
+            app=firebase_app())
+
+        results = []
+        for result in response.responses:
+            if result.success:
+                results.append(None)
+            elif isinstance(result.exception, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+                results.append(INVALID_TOKEN)
+            else:
+                results.append(repr(result.exception))
+        return results
+
+
+class FakeTransport:
+    """
+        Keeps the multicasts in FakeTransport.outbox instead of sending them,
+        like the locmem email backend. Tokens in invalid_tokens come back as
+        INVALID_TOKEN and the ones in failing_tokens with an error.
+    """
+    outbox = []
+    invalid_tokens = set()
+    failing_tokens = set()
+
+    def send_multicast(self, tokens, title, body, data):
+        FakeTransport.outbox.append({'tokens': list(tokens), 'title': title, 'body': body, 'data': data})
+        return [INVALID_TOKEN if token in self.invalid_tokens else
+                'unavailable' if token in self.failing_tokens else None for token in tokens]
+
+    @classmethod
+    def reset(cls):
+        cls.outbox = []
+        cls.invalid_tokens = set()
+        cls.failing_tokens = set()
+
+
+def notification(events):
+    """
+        (title, body, data) of the events of one recipient, data names the
+        changes and students so the app refreshes them instead of polling.
+    """
+    kinds = tuple(sorted({event.kind for event in events}))
+    students = {event.student_id: event.student for event in events}
+    names = sorted(f'{student.user.first_name} {student.user.last_name}' for student in students.values())
+    data = {
+        'kinds': ','.join(kinds),
+        'student_ids': ','.join(sorted(str(student_id) for student_id in students)),
+    }
+    return TITLES[kinds], ', '.join(names), data
+
+
+class PushQueue:
+    """
+        Push notifications of attendance and grade changes. enqueue stores a
+        PushEvent per student and parent and, once the transaction commits,
+        wakes up to PUSH_QUEUE_WORKERS threads of this process. The events
+        of a recipient are held for PUSH_COALESCE_SECONDS after the first
+        one and then sent as one notification to every device of the
+        recipient. Recipients that get the same notification, a student and
+        the parent, share a multicast of up to PUSH_BATCH_SIZE tokens.
+        Devices that are gone are removed, other failures are retried after
+        PUSH_RETRY_BACKOFF seconds, doubled on every attempt, until
+        PUSH_MAX_ATTEMPTS. purge removes finished events after
+        PUSH_RETENTION_DAYS.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.workers = []
+        self.counters = {'notifications': 0, 'multicasts': 0, 'delivered': 0,
+                         'removed_devices': 0, 'retried': 0, 'failed': 0}
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'PUSH_NOTIFICATIONS_ENABLED', True)
+
+    @property
+    def worker_count(self):
+        return getattr(settings, 'PUSH_QUEUE_WORKERS', 1)
+
+    @property
+    def transport(self):
+        return import_string(getattr(settings, 'PUSH_TRANSPORT', 'user_profile.push.FirebaseTransport'))()
+
+    @property
+    def coalesce_seconds(self):
+        return getattr(settings, 'PUSH_COALESCE_SECONDS', 30)
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'PUSH_BATCH_SIZE', 500)
+
+    @property
+    def max_attempts(self):
+        return getattr(settings, 'PUSH_MAX_ATTEMPTS', 5)
+
+    @property
+    def retry_backoff(self):
+        return getattr(settings, 'PUSH_RETRY_BACKOFF', 30)
+
+    @property
+    def claim_timeout(self):
+        return getattr(settings, 'PUSH_CLAIM_TIMEOUT', 600)
+
+    @property
+    def poll_interval(self):
+        return getattr(settings, 'PUSH_QUEUE_POLL_INTERVAL', 30)
+
+    @property
+    def retention_days(self):
+        return getattr(settings, 'PUSH_RETENTION_DAYS', 7)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def enqueue(self, student_ids, kind):
+        """
+            One event per student and per parent of the students, stored
+            with one query for the recipients and one insert.
+        """
+        student_ids = set(student_ids)
+        if not self.enabled or not student_ids:
+            return []
+
+        due_at = timezone.now() + timedelta(seconds=self.coalesce_seconds)
+        events = []
+        for student_id, user_id, parent_user_id in Student.objects.filter(pk__in=student_ids).values_list(
+                'pk', 'user_id', 'parent__user_id'):
+            for recipient_id in filter(None, (user_id, parent_user_id)):
+                events.append(PushEvent(recipient_id=recipient_id, student_id=student_id, kind=kind, due_at=due_at))
+
+        PushEvent.objects.bulk_create(events)
+        transaction.on_commit(self.notify)
+        return events
+
+    def notify(self):
+        self.start()
+        self.wakeup.set()
+
+    def start(self):
+        with self.lock:
+            self.stopping.clear()
+            self.workers = [worker for worker in self.workers if worker.is_alive()]
+            while len(self.workers) < self.worker_count:
+                worker = threading.Thread(
+                    target=self.run, name=f'push-worker-{len(self.workers)}', daemon=True)
+                self.workers.append(worker)
+                worker.start()
+
+    def stop(self, timeout=5):
+        # unsent events stay in the table for the next process
+        self.stopping.set()
+        self.wakeup.set()
+        for worker in self.workers:
+            worker.join(timeout)
+        self.workers = []
+
+    def run(self):
+        try:
+            while not self.stopping.is_set():
+                try:
+                    if self.process():
+                        continue
+                    wait = self.seconds_to_next()
+                except Exception:
+                    logger.exception('Could not send push notifications')
+                    wait = self.poll_interval
+
+                # hold no database connection while waiting for the window to close
+                connections.close_all()
+                self.wakeup.wait(wait)
+                self.wakeup.clear()
+        finally:
+            connections.close_all()
+
+    def seconds_to_next(self):
+        due_at = PushEvent.objects.filter(status=PushEvent.PENDING).aggregate(due_at=Min('due_at'))['due_at']
+        if due_at is None:
+            return self.poll_interval
+        return min(self.poll_interval, max(0, (due_at - timezone.now()).total_seconds()))
+
+    def claim(self, now=None):
+        """
+            Every pending event of the recipients that have one due, those
+            of the window still open ride along.
+        """
+        now = now or timezone.now()
+        PushEvent.objects.filter(
+            status=PushEvent.SENDING, claimed_at__lt=now - timedelta(seconds=self.claim_timeout)).update(
+            status=PushEvent.PENDING, claim_token=None)
+
+        recipients = list(PushEvent.objects.filter(
+            status=PushEvent.PENDING, due_at__lte=now).order_by().values_list(
+            'recipient_id', flat=True).distinct()[:CLAIM_RECIPIENTS])
+        if not recipients:
+            return []
+
+        # another worker or process may claim the same rows, the token tells whose they are
+        token = uuid.uuid4()
+        PushEvent.objects.filter(recipient_id__in=recipients, status=PushEvent.PENDING).update(
+            status=PushEvent.SENDING, claim_token=token, claimed_at=now)
+        return list(PushEvent.objects.filter(
+            claim_token=token, status=PushEvent.SENDING).select_related('student__user'))
+
+    def deliver(self, events, now=None):
+        """
+            Send the claimed events, one notification per recipient, and
+            store the outcome of every event. Returns the notifications sent.
+            Retries are due PUSH_RETRY_BACKOFF seconds or more after now.
+        """
+        recipient_events = {}
+        for event in events:
+            recipient_events.setdefault(event.recipient_id, []).append(event)
+
+        recipient_tokens = {}
+        for user_id, token in FCMDevice.objects.filter(
+                user_id__in=recipient_events, active=True).values_list('user_id', 'registration_id'):
+            recipient_tokens.setdefault(user_id, []).append(token)
+
+        # (title, body, data) -> tokens of every recipient it goes to
+        multicasts = {}
+        for recipient_id, tokens in recipient_tokens.items():
+            title, body, data = notification(recipient_events[recipient_id])
+            multicasts.setdefault((title, body, tuple(sorted(data.items()))), []).extend(tokens)
+
+        results = {}
+        transport = self.transport
+        for (title, body, data), tokens in multicasts.items():
+            for start in range(0, len(tokens), self.batch_size):
+                batch = tokens[start:start + self.batch_size]
+                self.count('multicasts')
+                try:
+                    results.update(zip(batch, transport.send_multicast(batch, title, body, dict(data))))
+                except Exception as error:
+                    logger.exception('Could not send a multicast to %s devices', len(batch))
+                    results.update((token, repr(error)) for token in batch)
+
+        self.remove_devices([token for token, result in results.items() if result == INVALID_TOKEN])
+
+        now = now or timezone.now()
+        sent = 0
+        for recipient_id, recipient_events_ in recipient_events.items():
+            outcomes = [results[token] for token in recipient_tokens.get(recipient_id, [])]
+            errors = [outcome for outcome in outcomes if outcome not in (None, INVALID_TOKEN)]
+            for event in recipient_events_:
+                if None in outcomes:
+                    event.status = PushEvent.SENT
+                    event.sent_at = now
+                    event.last_error = ''
+                elif errors:
+                    self.retry_later(event, errors[0], now)
+                else:
+                    # no device, or only ones that are gone
+                    event.status = PushEvent.SKIPPED
+                event.attempts += 1
+                event.claim_token = None
+                event.updated_at = now
+
+            if None in outcomes:
+                sent += 1
+                self.count('delivered', outcomes.count(None))
+
+        PushEvent.objects.bulk_update(events, PUSH_RESULT_FIELDS)
+        self.count('notifications', sent)
+        return sent
+
+    def retry_later(self, event, error, now):
+        event.last_error = error
+        if event.attempts + 1 >= self.max_attempts:
+            logger.error('Giving up on push event %s to %s: %s', event.pk, event.recipient_id, error)
+            event.status = PushEvent.FAILED
+            self.count('failed')
+        else:
+            event.status = PushEvent.PENDING
+            event.due_at = now + timedelta(seconds=self.retry_backoff * 2 ** event.attempts)
+            self.count('retried')
+
+    def remove_devices(self, tokens):
+        if not tokens:
+            return
+
+        devices = FCMDevice.objects.filter(registration_id__in=tokens)
+        if FCM_DJANGO_SETTINGS['DELETE_INACTIVE_DEVICES']:
+            removed = devices.delete()[0]
+        else:
+            removed = devices.update(active=False)
+        self.count('removed_devices', removed)
+
+    def process(self, now=None):
+        events = self.claim(now)
+        return self.deliver(events, now) if events else 0
+
+    def drain(self, now=None):
+        """
+            Send every due notification in the calling thread, returns how
+            many were sent. now lets the coalescing window be skipped.
+        """
+        sent = 0
+        events = self.claim(now)
+        while events:
+            sent += self.deliver(events, now)
+            events = self.claim(now)
+        return sent
+
+    def purge(self, now=None):
+        """
+            Delete the sent, skipped and failed events older than
+            PUSH_RETENTION_DAYS, returns how many were deleted.
+        """
+        before = (now or timezone.now()) - timedelta(days=self.retention_days)
+        return PushEvent.objects.filter(
+            status__in=[PushEvent.SENT, PushEvent.SKIPPED, PushEvent.FAILED], updated_at__lt=before).delete()[0]
+
+    def metrics(self):
+        events = {status: 0 for status, _ in PushEvent.STATUS_CHOICES}
+        for row in PushEvent.objects.values('status').annotate(count=Count('pk')):
+            events[row['status']] = row['count']
+
+        oldest = PushEvent.objects.filter(status=PushEvent.PENDING).aggregate(
+            oldest=Min('created_at'))['oldest']
+        with self.lock:
+            counters = dict(self.counters)
+            workers = sum(worker.is_alive() for worker in self.workers)
+
+        return {
+            'events': events,
+            'oldest_pending_seconds': (timezone.now() - oldest).total_seconds() if oldest else 0,
+            'workers': workers,
+            **counters,
+        }
+
+
+push_queue = PushQueue()
+atexit.register(push_queue.stop)
@@ -0,0 +1,39 @@
+"""
+    Student QR code images, rendered from the encrypted payload the first
+    time they are asked for instead of being stored when the account is
+    created. Any image of the same student and deployment key scans to the
+    same student, so the ETag names the student and key, not the bytes.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings
+
+from aes.aes_implementation import QR_VERSION, encrypt_qr, key_id
+from user_profile.credentials import qr_png
+
+# rendered images kept per process, a QR png is about 1 KB
+QR_CACHE_SIZE = 1024
+
+
+def qr_key_configured():
+    # AES_SECRET_KEY comes from the environment and may be unset
+    return bool(settings.AES_SECRET_KEY)
+
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def render_qr(student_id, aes_key):
+    return qr_png(encrypt_qr(student_id, aes_key))
+
+
+def student_qr_png(student_id):
+    return render_qr(str(student_id), settings.AES_SECRET_KEY)
+
+
+def student_qr_etag(student_id):
+    tag = hashlib.sha256(f'{QR_VERSION}:{key_id(settings.AES_SECRET_KEY)}:{student_id}'.encode())
+    return f'"{tag.hexdigest()[:32]}"'
+
+
+def qr_max_age():
+    return getattr(settings, 'QR_CODE_MAX_AGE', 60 * 60 * 24)
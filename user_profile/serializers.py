@@ -1,10 +1,12 @@
+from django.urls import reverse
 from rest_framework import serializers
 
 from base.models import User
+from core.sparse_fields import SparseFieldsMixin, query_list
 from .models import Teacher, Student, Parent
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = (
@@ -24,7 +26,7 @@ class UserSerializer(serializers.ModelSerializer):
         }
 
 
-class ParentSerializer(serializers.ModelSerializer):
+class ParentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer()
 
     class Meta:
@@ -36,7 +38,27 @@ class ParentSerializer(serializers.ModelSerializer):
                   'profile_photo',)
 
 
-class StudentSerializer(serializers.ModelSerializer):
+class StudentQRCodeMixin(serializers.Serializer):
+    """
+        qr_code_photo is the URL of the rendered QR code, only present with
+        ?include=qr since nested student payloads rarely show it.
+    """
+    qr_code_photo = serializers.SerializerMethodField()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        # ?include=qr,... opts into fields left out of payloads by default
+        if 'qr' not in (query_list(self.context.get('request'), 'include') or []):
+            fields.pop('qr_code_photo', None)
+        return fields
+
+    def get_qr_code_photo(self, data):
+        url = reverse('api:student-qr-code', kwargs={'pk': data.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class StudentSerializer(SparseFieldsMixin, StudentQRCodeMixin, serializers.ModelSerializer):
     user = UserSerializer()
 
     class Meta:
@@ -65,7 +87,7 @@ class StudentSerializer(serializers.ModelSerializer):
         return request.build_absolute_uri(photo_url)
 
 
-class TeacherSerializer(serializers.ModelSerializer):
+class TeacherSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer()
 
     class Meta:
@@ -101,7 +123,7 @@ class ResetPasswordEmailRequestSerializer(serializers.Serializer):
         fields = ['email_address']
 
 
-class StudentOnlySerializer(serializers.ModelSerializer):
+class StudentOnlySerializer(SparseFieldsMixin, StudentQRCodeMixin, serializers.ModelSerializer):
     user = UserSerializer()
 
     class Meta:
@@ -0,0 +1,299 @@
+import csv
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import connections, transaction
+from django.template.loader import get_template
+from django.utils import timezone
+
+from academic_record.academic_year import current_academic_year
+from base.models import User
+from class_information.models import Section
+from registration.models import Registration
+from user_profile.credentials import hash_password, initial_password
+from user_profile.email import email_queue
+from .models import Student, StudentImport
+
+logger = logging.getLogger(__name__)
+
+# gender, year_level and section may be left out, section registers to the current academic year
+IMPORT_COLUMNS = ['email', 'first_name', 'last_name', 'contact_number', 'address',
+                  'age', 'gender', 'year_level', 'section']
+REQUIRED_COLUMNS = ['email', 'first_name', 'last_name', 'contact_number', 'address', 'age']
+BATCH_SIZE = 500
+# rows between two progress reports
+PROGRESS_EVERY = 25
+
+
+def read_rows(file, file_name):
+    """
+        Rows of a CSV or XLSX file as dicts keyed by the lower case header.
+    """
+    if file_name.lower().endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValidationError('XLSX files need openpyxl installed, upload a CSV instead')
+
+        sheet = load_workbook(file, read_only=True, data_only=True).active
+        values = sheet.iter_rows(values_only=True)
+        header = next(values, None) or []
+        rows = ([] if value is None else value for value in values)
+    else:
+        content = file.read()
+        text = content.decode('utf-8-sig') if isinstance(content, bytes) else content
+        values = csv.reader(io.StringIO(text))
+        header = next(values, None) or []
+        rows = values
+
+    header = [str(column or '').strip().lower() for column in header]
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ValidationError(f'Missing columns: {", ".join(missing)}')
+
+    return [{column: '' if value is None else str(value).strip() for column, value in zip(header, row)}
+            for row in rows if any(value not in (None, '') for value in row)]
+
+
+def validate_rows(rows):
+    """
+        Check every row before anything is written. Duplicates of email and
+        contact number are found with one query each against the database
+        and with sets inside the file. Returns (valid rows, errors), a valid
+        row carries its spreadsheet line in 'line' and its Section.
+    """
+    errors = []
+    genders = {gender for gender, _ in Student.GENDER_CHOICES}
+    year_levels = {year_level for year_level, _ in Student.YEAR_LEVEL_CHOICES}
+
+    emails = {row.get('email', '').lower() for row in rows}
+    contact_numbers = {row.get('contact_number', '') for row in rows}
+    taken_emails = {email.lower() for email in User.objects.filter(username__in=emails).values_list('username', flat=True)}
+    taken_emails |= {email.lower() for email in User.objects.filter(email__in=emails).values_list('email', flat=True)}
+    taken_contacts = set(Student.objects.filter(
+        contact_number__in=contact_numbers).values_list('contact_number', flat=True))
+
+    sections = {}
+    for section in Section.objects.filter(name__in={row.get('section') for row in rows if row.get('section')}):
+        sections.setdefault(section.name, []).append(section)
+    academic_year = current_academic_year()
+
+    seen_emails = set()
+    seen_contacts = set()
+    valid = []
+    # line 1 is the header
+    for line, row in enumerate(rows, start=2):
+        row_errors = []
+
+        def error(field, message):
+            row_errors.append({'row': line, 'field': field, 'message': message})
+
+        for column in REQUIRED_COLUMNS:
+            if not row.get(column):
+                error(column, 'This field is required')
+
+        email = row.get('email', '').lower()
+        if email:
+            try:
+                validate_email(email)
+            except ValidationError:
+                error('email', 'Enter a valid email address')
+            if email in taken_emails:
+                error('email', 'Email already exists')
+            elif email in seen_emails:
+                error('email', 'Email appears more than once in the file')
+            seen_emails.add(email)
+
+        contact_number = row.get('contact_number', '')
+        if contact_number:
+            if contact_number in taken_contacts:
+                error('contact_number', 'Contact already exists')
+            elif contact_number in seen_contacts:
+                error('contact_number', 'Contact appears more than once in the file')
+            seen_contacts.add(contact_number)
+
+        if row.get('age') and not row['age'].isdigit():
+            error('age', 'Enter a whole number')
+
+        row['gender'] = (row.get('gender') or Student.NA).upper()
+        if row['gender'] not in genders:
+            error('gender', f'Use one of {", ".join(sorted(genders))}')
+
+        row['year_level'] = (row.get('year_level') or 'GRADE 7').upper()
+        if row['year_level'] not in year_levels:
+            error('year_level', f'Use one of {", ".join(sorted(year_levels))}')
+
+        section = None
+        if row.get('section'):
+            matches = sections.get(row['section'], [])
+            if academic_year is None:
+                error('section', 'There is no current academic year to register to')
+            elif len(matches) != 1:
+                error('section', 'Section not found' if not matches else 'Section name is ambiguous')
+            else:
+                section = matches[0]
+
+        if row_errors:
+            errors += row_errors
+        else:
+            valid.append({**row, 'email': email, 'line': line, 'section': section})
+
+    return valid, errors
+
+
+def import_workers():
+    return getattr(settings, 'STUDENT_IMPORT_WORKERS', min(4, os.cpu_count() or 1))
+
+
+def hash_passwords(jobs, progress=None):
+    """
+        Hash the passwords of the jobs in a process pool, in order. Spawned
+        processes do not inherit the threads of a web worker.
+    """
+    workers = min(import_workers(), len(jobs))
+    if workers <= 1:
+        results = map(hash_password, jobs)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        results = executor.map(hash_password, jobs, chunksize=max(1, len(jobs) // (workers * 8)))
+
+    try:
+        hashes = []
+        for result in results:
+            hashes.append(result)
+            if progress and len(hashes) % PROGRESS_EVERY == 0:
+                progress(len(hashes))
+        return hashes
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def create_students(rows, password_hashes):
+    """
+        Write users, students, registrations and welcome emails of valid rows
+        with bulk inserts in one transaction.
+    """
+    template = get_template('registration/index.html')
+    academic_year = current_academic_year()
+
+    users = []
+    students = []
+    registrations = []
+    emails = []
+    for row, password_hash in zip(rows, password_hashes):
+        user = User(username=row['email'], email=row['email'], first_name=row['first_name'],
+                    last_name=row['last_name'], password=password_hash)
+        student = Student(
+            user=user, address=row['address'], contact_number=row['contact_number'],
+            age=int(row['age']), gender=row['gender'], year_level=row['year_level'])
+
+        users.append(user)
+        students.append(student)
+        if row['section']:
+            registrations.append(Registration(
+                student=student, section=row['section'], academic_year=academic_year))
+        emails.append((user.email, 'Welcome to EaseStudyante', template.render({
+            'full_name': f'{user.first_name} {user.last_name}',
+            'password': row['password'],
+            'email_address': user.email,
+        })))
+
+    with transaction.atomic():
+        User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+        Student.objects.bulk_create(students, batch_size=BATCH_SIZE)
+        Registration.objects.bulk_create(registrations, batch_size=BATCH_SIZE)
+        email_queue.enqueue_many(emails)
+
+    return students
+
+
+def import_students(rows, progress=None):
+    """
+        Onboard students from parsed rows, see read_rows. Invalid rows are
+        reported and skipped, the others are created together.
+        progress(processed rows, total rows) is called along the way.
+        Returns {'total', 'created', 'errors': [{'row', 'field', 'message'}]}.
+    """
+    total = len(rows)
+    valid, errors = validate_rows(rows)
+    invalid = total - len(valid)
+    if progress:
+        progress(invalid, total)
+
+    hasher = get_hasher()
+    hasher_path = f'{type(hasher).__module__}.{type(hasher).__name__}'
+    jobs = []
+    for row in valid:
+        row['password'] = initial_password(row['last_name'], row['contact_number'])
+        jobs.append((row['password'], hasher_path))
+
+    password_hashes = hash_passwords(
+        jobs, progress and (lambda done: progress(invalid + done, total)))
+    students = create_students(valid, password_hashes) if valid else []
+    if progress:
+        progress(total, total)
+
+    return {'total': total, 'created': len(students), 'errors': errors}
+
+
+def run_student_import(student_import_id):
+    """
+        Run a StudentImport row, progress and the report are saved on it.
+    """
+    student_import = StudentImport.objects.get(pk=student_import_id)
+    student_import.status = StudentImport.RUNNING
+    student_import.save(update_fields=['status', 'updated_at'])
+
+    def progress(processed, total):
+        StudentImport.objects.filter(pk=student_import.pk).update(
+            processed_rows=processed, total_rows=total, updated_at=timezone.now())
+
+    try:
+        with student_import.file.open('rb') as file:
+            rows = read_rows(file, student_import.file.name)
+        report = import_students(rows, progress)
+    except ValidationError as error:
+        student_import.refresh_from_db(fields=['total_rows', 'processed_rows'])
+        student_import.status = StudentImport.FAILED
+        student_import.errors = [{'row': None, 'field': None, 'message': message} for message in error.messages]
+    except Exception as error:
+        logger.exception('Student import %s failed', student_import.pk)
+        student_import.refresh_from_db(fields=['total_rows', 'processed_rows'])
+        student_import.status = StudentImport.FAILED
+        student_import.errors = [{'row': None, 'field': None, 'message': repr(error)}]
+    else:
+        student_import.status = StudentImport.DONE
+        student_import.total_rows = report['total']
+        student_import.processed_rows = report['total']
+        student_import.created_count = report['created']
+        student_import.errors = report['errors']
+
+    student_import.finished_at = timezone.now()
+    student_import.save(update_fields=['status', 'total_rows', 'processed_rows', 'created_count',
+                                       'errors', 'finished_at', 'updated_at'])
+    return student_import
+
+
+def start_student_import(student_import):
+    """
+        Run the import in a thread of this process once the row is committed,
+        the admin follows it on the StudentImport page.
+    """
+    def run():
+        try:
+            run_student_import(student_import.pk)
+        finally:
+            connections.close_all()
+
+    transaction.on_commit(lambda: threading.Thread(
+        target=run, name=f'student-import-{student_import.pk}', daemon=True).start())
@@ -1,3 +1,489 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import time
+from datetime import date, timedelta
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.contrib.auth.hashers import check_password
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from fcm_django.models import FCMDevice
+
+from academic_record.academic_year import clear_current_academic_year
+from academic_record.models import AcademicYear
+from django.urls import reverse
+
+from base.models import User
+from class_information.models import Department, Section
+from registration.models import Registration
+from user_profile.email import EmailQueue, Util
+from user_profile.models import OutboxEmail, Parent, PushEvent, Student, StudentImport, Teacher
+from user_profile.push import FakeTransport, PushQueue
+from user_profile.qr_code import render_qr
+from user_profile.student_import import import_students, read_rows, run_student_import
+
+
+class FlakyEmailBackend(EmailBackend):
+    # locmem backend whose first failures sends raise
+    failures = 0
+    opened = 0
+
+    def open(self):
+        FlakyEmailBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if FlakyEmailBackend.failures:
+            FlakyEmailBackend.failures -= 1
+            raise ConnectionError('SMTP went away')
+        return super().send_messages(messages)
+
+
+def queue_email(queue, index=0):
+    return queue.enqueue(f'student{index}@example.com', 'Welcome to EaseStudyante', f'<p>Hello {index}</p>')
+
+
+@override_settings(EMAIL_BATCH_SIZE=3, EMAIL_MAX_ATTEMPTS=3, EMAIL_RETRY_BACKOFF=30)
+class EmailQueueTestCase(TestCase):
+    def setUp(self):
+        self.queue = EmailQueue()
+        FlakyEmailBackend.failures = 0
+        FlakyEmailBackend.opened = 0
+
+    def test_send_email_goes_through_the_outbox(self):
+        Util.send_email({'email_body': '<p>Reset</p>', 'to_email': 'parent@example.com',
+                         'email_subject': 'Password Reset Confirmation'})
+
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.status, OutboxEmail.PENDING)
+
+        self.assertEqual(self.queue.drain(), 1)
+        self.assertEqual(mail.outbox[0].to, ['parent@example.com'])
+        self.assertEqual(mail.outbox[0].content_subtype, 'html')
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.SENT)
+        self.assertIsNotNone(email.sent_at)
+        self.assertEqual(email.body, '')
+
+    @override_settings(EMAIL_BACKEND='user_profile.tests.FlakyEmailBackend')
+    def test_one_connection_for_all_batches(self):
+        for index in range(7):
+            queue_email(self.queue, index)
+
+        self.assertEqual(self.queue.drain(), 7)
+        self.assertEqual(FlakyEmailBackend.opened, 1)
+        self.assertEqual(self.queue.counters['batches'], 3)
+        self.assertEqual(len(mail.outbox), 7)
+
+    @override_settings(EMAIL_BACKEND='user_profile.tests.FlakyEmailBackend')
+    def test_failures_are_retried_with_backoff(self):
+        email = queue_email(self.queue)
+        FlakyEmailBackend.failures = 1
+
+        self.assertEqual(self.queue.drain(), 0)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.PENDING, 1))
+        self.assertIn('SMTP went away', email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=25))
+
+        # not due yet
+        self.assertEqual(self.queue.drain(), 0)
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(self.queue.drain(), 1)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.SENT, 2))
+        # the broken connection was replaced
+        self.assertEqual(FlakyEmailBackend.opened, 2)
+
+    @override_settings(EMAIL_BACKEND='user_profile.tests.FlakyEmailBackend')
+    def test_gives_up_after_max_attempts(self):
+        email = queue_email(self.queue)
+        FlakyEmailBackend.failures = 10
+
+        with self.assertLogs('user_profile.email', 'ERROR'):
+            for _ in range(3):
+                OutboxEmail.objects.update(next_attempt_at=timezone.now())
+                self.queue.drain()
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.FAILED, 3))
+        self.assertEqual(self.queue.metrics()['outbox'][OutboxEmail.FAILED], 1)
+        self.assertEqual(self.queue.counters['retried'], 2)
+
+    def test_rows_of_a_dead_worker_are_claimed_again(self):
+        queue_email(self.queue)
+        OutboxEmail.objects.update(status=OutboxEmail.SENDING, claimed_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(self.queue.drain(), 1)
+
+    def test_claims_do_not_overlap(self):
+        for index in range(3):
+            queue_email(self.queue, index)
+        other = EmailQueue()
+
+        claimed = self.queue.claim()
+        self.assertEqual(len(claimed), 3)
+        self.assertEqual(other.claim(), [])
+
+    @override_settings(EMAIL_RETENTION_DAYS=7)
+    def test_finished_emails_are_purged(self):
+        pending, sent, failed = (queue_email(self.queue, index) for index in range(3))
+        OutboxEmail.objects.filter(pk=sent.pk).update(status=OutboxEmail.SENT)
+        OutboxEmail.objects.filter(pk=failed.pk).update(status=OutboxEmail.FAILED)
+
+        self.assertEqual(self.queue.purge(), 0)
+        self.assertEqual(self.queue.purge(timezone.now() + timedelta(days=8)), 2)
+        self.assertEqual(list(OutboxEmail.objects.values_list('pk', flat=True)), [pending.pk])
+
+    def test_command_drains_and_reports(self):
+        queue_email(self.queue)
+        out = StringIO()
+        call_command('send_queued_emails', stdout=out)
+
+        self.assertIn('Sent 1 emails', out.getvalue())
+        self.assertIn('"SENT": 1', out.getvalue())
+
+
+@override_settings(EMAIL_QUEUE_WORKERS=2, EMAIL_QUEUE_POLL_INTERVAL=0.05)
+class EmailQueueWorkerTestCase(TransactionTestCase):
+    def test_workers_send_after_commit(self):
+        queue = EmailQueue()
+        try:
+            for index in range(5):
+                queue_email(queue, index)
+
+            deadline = time.monotonic() + 5
+            while len(mail.outbox) < 5 and time.monotonic() < deadline:
+                time.sleep(0.02)
+
+            self.assertEqual(len(mail.outbox), 5)
+            self.assertEqual(queue.metrics()['workers'], 2)
+        finally:
+            queue.stop()
+
+        self.assertEqual(OutboxEmail.objects.filter(status=OutboxEmail.SENT).count(), 5)
+
+
+@override_settings(PUSH_TRANSPORT='user_profile.push.FakeTransport', PUSH_COALESCE_SECONDS=30,
+                   PUSH_BATCH_SIZE=500, PUSH_MAX_ATTEMPTS=2, PUSH_RETRY_BACKOFF=30)
+class PushQueueTestCase(TestCase):
+    def setUp(self):
+        self.queue = PushQueue()
+        FakeTransport.reset()
+        self.parent = Parent.objects.create(
+            user=User.objects.create_user('parent', 'parent@example.com', 'p4ssw0rD'),
+            address='Manila', contact_number='09170000010', age=40)
+        self.ana = self.create_student('ana', 'Ana', '09170000011')
+        self.ben = self.create_student('ben', 'Ben', '09170000012')
+
+    def create_student(self, username, first_name, contact_number, parent=True):
+        return Student.objects.create(
+            user=User.objects.create_user(username, f'{username}@example.com', 'p4ssw0rD',
+                                          first_name=first_name, last_name='Cruz'),
+            address='Manila', contact_number=contact_number, age=13, parent=self.parent if parent else None)
+
+    def add_device(self, user, token):
+        return FCMDevice.objects.create(user=user, registration_id=token, type='android')
+
+    def after_window(self):
+        return timezone.now() + timedelta(seconds=31)
+
+    def test_changes_are_coalesced_per_recipient(self):
+        self.add_device(self.ana.user, 'ana-phone')
+        self.add_device(self.parent.user, 'parent-phone')
+
+        self.queue.enqueue([self.ana.pk], PushEvent.ATTENDANCE)
+        self.queue.enqueue([self.ana.pk, self.ana.pk], PushEvent.GRADES)
+        self.assertEqual(PushEvent.objects.count(), 4)
+
+        # the window is still open
+        self.assertEqual(self.queue.drain(), 0)
+        self.assertEqual(self.queue.drain(self.after_window()), 2)
+
+        # the student and the parent get the same notification, one multicast
+        self.assertEqual(len(FakeTransport.outbox), 1)
+        push = FakeTransport.outbox[0]
+        self.assertEqual(sorted(push['tokens']), ['ana-phone', 'parent-phone'])
+        self.assertEqual(push['title'], 'Attendance and grades updated')
+        self.assertEqual(push['body'], 'Ana Cruz')
+        self.assertEqual(push['data'], {'kinds': 'ATTENDANCE,GRADES', 'student_ids': str(self.ana.pk)})
+        self.assertFalse(PushEvent.objects.exclude(status=PushEvent.SENT).exists())
+
+    def test_parent_gets_one_notification_for_all_children(self):
+        self.add_device(self.parent.user, 'parent-phone')
+        self.queue.enqueue([self.ana.pk, self.ben.pk], PushEvent.GRADES)
+
+        self.assertEqual(self.queue.drain(self.after_window()), 1)
+        self.assertEqual([push['body'] for push in FakeTransport.outbox], ['Ana Cruz, Ben Cruz'])
+        # the students have no device
+        self.assertEqual(PushEvent.objects.filter(status=PushEvent.SKIPPED).count(), 2)
+        self.assertEqual(PushEvent.objects.filter(status=PushEvent.SENT).count(), 2)
+
+    @override_settings(PUSH_BATCH_SIZE=2)
+    def test_multicasts_are_batched(self):
+        for index in range(3):
+            self.add_device(self.parent.user, f'parent-phone-{index}')
+        self.add_device(self.ana.user, 'ana-phone')
+        self.queue.enqueue([self.ana.pk], PushEvent.ATTENDANCE)
+
+        self.assertEqual(self.queue.drain(self.after_window()), 2)
+        self.assertEqual([len(push['tokens']) for push in FakeTransport.outbox], [2, 2])
+        self.assertEqual(self.queue.counters['delivered'], 4)
+
+    def test_invalid_tokens_remove_the_device(self):
+        self.add_device(self.ana.user, 'ana-phone')
+        self.add_device(self.parent.user, 'parent-old-phone')
+        FakeTransport.invalid_tokens = {'parent-old-phone'}
+        self.queue.enqueue([self.ana.pk], PushEvent.ATTENDANCE)
+
+        self.assertEqual(self.queue.drain(self.after_window()), 1)
+        self.assertFalse(FCMDevice.objects.filter(registration_id='parent-old-phone').exists())
+        self.assertEqual(PushEvent.objects.get(recipient=self.parent.user).status, PushEvent.SKIPPED)
+        self.assertEqual(PushEvent.objects.get(recipient=self.ana.user).status, PushEvent.SENT)
+
+    def test_failures_are_retried_then_given_up(self):
+        orphan = self.create_student('cid', 'Cid', '09170000013', parent=False)
+        self.add_device(orphan.user, 'cid-phone')
+        FakeTransport.failing_tokens = {'cid-phone'}
+        self.queue.enqueue([orphan.pk], PushEvent.GRADES)
+
+        now = self.after_window()
+        self.assertEqual(self.queue.drain(now), 0)
+        event = PushEvent.objects.get()
+        self.assertEqual((event.status, event.attempts, event.last_error), (PushEvent.PENDING, 1, 'unavailable'))
+        self.assertEqual(event.due_at, now + timedelta(seconds=30))
+
+        with self.assertLogs('user_profile.push', 'ERROR'):
+            self.queue.drain(timezone.now() + timedelta(minutes=5))
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), (PushEvent.FAILED, 2))
+        self.assertEqual(self.queue.metrics()['events'][PushEvent.FAILED], 1)
+
+    def test_transport_errors_are_retried(self):
+        self.add_device(self.ana.user, 'ana-phone')
+        self.queue.enqueue([self.ana.pk], PushEvent.ATTENDANCE)
+
+        with self.settings(PUSH_TRANSPORT='user_profile.tests.BrokenTransport'), \
+                self.assertLogs('user_profile.push', 'ERROR'):
+            self.assertEqual(self.queue.drain(self.after_window()), 0)
+        self.assertEqual(PushEvent.objects.get(recipient=self.ana.user).status, PushEvent.PENDING)
+
+        self.assertEqual(self.queue.drain(timezone.now() + timedelta(minutes=5)), 1)
+        self.assertEqual(PushEvent.objects.get(recipient=self.ana.user).status, PushEvent.SENT)
+
+    @override_settings(PUSH_NOTIFICATIONS_ENABLED=False)
+    def test_disabled(self):
+        self.assertEqual(self.queue.enqueue([self.ana.pk], PushEvent.GRADES), [])
+        self.assertFalse(PushEvent.objects.exists())
+
+    @override_settings(PUSH_RETENTION_DAYS=7)
+    def test_finished_events_are_purged(self):
+        self.queue.enqueue([self.ana.pk, self.ben.pk], PushEvent.GRADES)
+        PushEvent.objects.filter(student=self.ana).update(status=PushEvent.SKIPPED)
+
+        self.assertEqual(self.queue.purge(), 0)
+        self.assertEqual(self.queue.purge(timezone.now() + timedelta(days=8)), 2)
+        self.assertEqual(set(PushEvent.objects.values_list('student_id', flat=True)), {self.ben.pk})
+
+    def test_command_drains_and_reports(self):
+        self.add_device(self.ana.user, 'ana-phone')
+        self.queue.enqueue([self.ana.pk], PushEvent.GRADES)
+        PushEvent.objects.update(due_at=timezone.now())
+        out = StringIO()
+        call_command('send_push_notifications', stdout=out)
+
+        self.assertIn('Sent 1 notifications', out.getvalue())
+        self.assertIn('"SENT": 1', out.getvalue())
+
+
+class BrokenTransport:
+    def send_multicast(self, tokens, title, body, data):
+        raise ConnectionError('FCM went away')
+
+
+STUDENTS_CSV = """Email,First_Name,Last_Name,Contact_Number,Address,Age,Gender,Year_Level,Section
+ana@example.com,Ana,Cruz,09170000001,Manila,13,F,GRADE 7,Rizal
+ben@example.com,Ben,Li,09170000002,Manila,14,m,grade 8,
+taken@example.com,Tom,Taken,09170000003,Manila,13,M,GRADE 7,
+ANA@example.com,Ann,Dup,09170000004,Manila,13,F,GRADE 7,
+cid@example.com,Cid,Reyes,09170000001,Manila,x,Q,GRADE 99,Nowhere
+"""
+
+
+@override_settings(STUDENT_IMPORT_WORKERS=0)
+class StudentImportTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        clear_current_academic_year()
+        self.addCleanup(clear_current_academic_year)
+        self.academic_year = AcademicYear.objects.create(
+            name='2024-2025', start_date=date(2024, 6, 1), end_date=date(2025, 3, 31))
+        self.section = Section.objects.create(name='Rizal')
+        User.objects.create_user('taken@example.com', 'taken@example.com', 'p4ssw0rD')
+
+    def import_csv(self, content=STUDENTS_CSV, progress=None):
+        return import_students(read_rows(BytesIO(content.encode()), 'students.csv'), progress)
+
+    def test_valid_rows_are_created_and_errors_reported(self):
+        report = self.import_csv()
+
+        self.assertEqual((report['total'], report['created']), (5, 2))
+        errors = {(error['row'], error['field'], error['message']) for error in report['errors']}
+        self.assertIn((4, 'email', 'Email already exists'), errors)
+        self.assertIn((5, 'email', 'Email appears more than once in the file'), errors)
+        self.assertIn((6, 'contact_number', 'Contact appears more than once in the file'), errors)
+        self.assertEqual({field for row, field, _ in errors if row == 6},
+                         {'contact_number', 'age', 'gender', 'year_level', 'section'})
+
+        student = Student.objects.select_related('user').get(user__username='ana@example.com')
+        self.assertTrue(check_password('Cruz0001', student.user.password))
+        self.assertFalse(student.qr_code_photo)
+        self.assertEqual(Registration.objects.get(student=student).section, self.section)
+        ben = Student.objects.get(user__username='ben@example.com')
+        self.assertEqual((ben.gender, ben.year_level), ('M', 'GRADE 8'))
+        self.assertTrue(check_password('Li__0002', ben.user.password))
+        self.assertFalse(Registration.objects.filter(student=ben).exists())
+
+    def test_welcome_emails_are_queued(self):
+        self.import_csv()
+
+        self.assertEqual(sorted(OutboxEmail.objects.values_list('to_email', flat=True)),
+                         ['ana@example.com', 'ben@example.com'])
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_import_queries_do_not_grow_with_rows(self):
+        rows = '\n'.join(f's{index}@example.com,S,Name,0918{index:07d},Manila,13,F,GRADE 7,Rizal'
+                         for index in range(40))
+        header = 'email,first_name,last_name,contact_number,address,age,gender,year_level,section\n'
+
+        with self.assertNumQueries(11):
+            report = self.import_csv(header + rows)
+        self.assertEqual(report['created'], 40)
+
+    def test_progress_reaches_the_total(self):
+        calls = []
+        self.import_csv(progress=lambda processed, total: calls.append((processed, total)))
+
+        self.assertEqual(calls[0], (3, 5))
+        self.assertEqual(calls[-1], (5, 5))
+
+    def test_xlsx_rows(self):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        workbook.active.append(['Email', 'First_Name', 'Last_Name', 'Contact_Number', 'Address', 'Age'])
+        workbook.active.append(['ana@example.com', 'Ana', 'Cruz', '09170000001', 'Manila', 13])
+        workbook.active.append([None] * 6)
+        content = BytesIO()
+        workbook.save(content)
+        content.seek(0)
+
+        rows = read_rows(content, 'Students.XLSX')
+        self.assertEqual(rows, [{'email': 'ana@example.com', 'first_name': 'Ana', 'last_name': 'Cruz',
+                                 'contact_number': '09170000001', 'address': 'Manila', 'age': '13'}])
+
+    def test_missing_columns_reject_the_file(self):
+        with self.assertRaises(ValidationError):
+            read_rows(BytesIO(b'email,first_name\nana@example.com,Ana\n'), 'students.csv')
+
+    def test_import_job_keeps_the_report(self):
+        student_import = StudentImport.objects.create(file=SimpleUploadedFile(
+            'students.csv', STUDENTS_CSV.encode(), content_type='text/csv'))
+
+        run_student_import(student_import.pk)
+        student_import.refresh_from_db()
+
+        self.assertEqual(student_import.status, StudentImport.DONE)
+        self.assertEqual((student_import.processed_rows, student_import.total_rows), (5, 5))
+        self.assertEqual(student_import.created_count, 2)
+        self.assertEqual(len(student_import.errors), 7)
+
+    def test_command_prints_the_report(self):
+        path = f'{self.media_root}/students.csv'
+        with open(path, 'w') as file:
+            file.write(STUDENTS_CSV)
+        out = StringIO()
+        call_command('import_students', path, stdout=out)
+
+        self.assertIn('Created 2 of 5 students, 7 errors', out.getvalue())
+        self.assertIn('row 4 email: Email already exists', out.getvalue())
+
+    @override_settings(STUDENT_IMPORT_WORKERS=2)
+    def test_process_pool_gives_the_same_result(self):
+        report = self.import_csv()
+
+        self.assertEqual(report['created'], 2)
+        student = Student.objects.select_related('user').get(user__username='ben@example.com')
+        self.assertTrue(check_password('Li__0002', student.user.password))
+
+
+@override_settings(AES_SECRET_KEY='test-aes-secret-key')
+class StudentQRCodeTestCase(TestCase):
+    def setUp(self):
+        render_qr.cache_clear()
+        self.parent = Parent.objects.create(
+            user=User.objects.create_user('parent', 'parent@example.com', 'p4ssw0rD'),
+            address='Manila', contact_number='09170000010', age=40)
+        self.student = Student.objects.create(
+            user=User.objects.create_user('student', 'student@example.com', 'p4ssw0rD'),
+            address='Manila', contact_number='09170000011', age=13, parent=self.parent)
+        self.url = reverse('api:student-qr-code', kwargs={'pk': self.student.pk})
+
+    def test_rendered_once_and_revalidated(self):
+        self.client.force_login(self.student.user)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+        self.assertIn('max-age=', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+        self.assertEqual(self.client.get(self.url).content, response.content)
+        self.assertEqual(render_qr.cache_info().misses, 1)
+
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+
+    def test_who_can_see_the_code(self):
+        teacher = Teacher.objects.create(
+            user=User.objects.create_user('teacher', 'teacher@example.com', 'p4ssw0rD'),
+            address='Manila', contact_number='09170000012', age=30,
+            department=Department.objects.create(name='Science', code='SCI'))
+        stranger = User.objects.create_user('stranger', 'stranger@example.com', 'p4ssw0rD')
+
+        for user, status_code in [(self.parent.user, 200), (teacher.user, 200), (stranger, 403)]:
+            self.client.force_login(user)
+            self.assertEqual(self.client.get(self.url).status_code, status_code, user.username)
+
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    @override_settings(AES_SECRET_KEY=None)
+    def test_unavailable_without_a_key(self):
+        self.client.force_login(self.student.user)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('error_message', response.json())
+
+    def test_nested_students_leave_out_the_code_unless_included(self):
+        self.client.force_login(self.parent.user)
+
+        student = self.client.get(reverse('api:parent-profile')).data['students'][0]
+        self.assertNotIn('qr_code_photo', student)
+
+        student = self.client.get(reverse('api:parent-profile'), {'include': 'qr'}).data['students'][0]
+        self.assertEqual(student['qr_code_photo'], f'http://testserver{self.url}')
@@ -1,9 +1,10 @@
 from rest_framework import generics, permissions, response, status
 
-from academic_record.models import AcademicYear
+from academic_record.academic_year import current_academic_year
 from base.models import User
 from class_information.models import GradeEncode
 from user_profile.email import Util
+from user_profile.qr_code import qr_key_configured, qr_max_age, student_qr_etag, student_qr_png
 
 from .serializers import ChangePasswordSerializer, ParentSerializer, ResetPasswordEmailRequestSerializer, StudentOnlySerializer, StudentSerializer, TeacherSerializer
 from .models import Parent, Teacher, Student
@@ -14,6 +15,8 @@ from django.template.loader import get_template
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import smart_bytes
 from django.contrib.sites.shortcuts import get_current_site
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
 import re
 
 
@@ -24,12 +27,12 @@ class StudentProfileView(generics.RetrieveAPIView):
     def get(self, request, *args, **kwargs):
         user = self.request.user
         user_profiles = Student.objects.filter(user=user)
-        academic_years = AcademicYear.objects.all()
+        academic_year = current_academic_year(request)
 
-        if user_profiles.exists() and academic_years.exists():
+        if user_profiles.exists() and academic_year:
             user_profile = user_profiles.first()
             register_users = Registration.objects.filter(
-                student=user_profile, academic_year=academic_years.first())
+                student=user_profile, academic_year=academic_year)
 
             if register_users.exists():
                 data = {
@@ -67,13 +70,12 @@ class TeacherProfileView(generics.RetrieveAPIView):
 
         if user_profiles.exists():
             user_profile = user_profiles.first()
-            academic_years = AcademicYear.objects.all()
+            academic_year = current_academic_year(request)
             grade_encodes = GradeEncode.objects.all()
 
             grading_periods = []
 
-            if academic_years.exists() and grade_encodes.exists():
-                academic_year = academic_years.first()
+            if academic_year and grade_encodes.exists():
                 for grade_encode in grade_encodes:
                     if grade_encode.grading_period == "FIRST_GRADING":
                         period = {
@@ -146,7 +148,7 @@ class ParentProfileView(generics.RetrieveAPIView):
             }
 
             students_serializer = StudentOnlySerializer(
-                user_profile.students, many=True)
+                user_profile.student_set.select_related('user'), many=True, context={'request': request})
             data["students"] = students_serializer.data
 
             return response.Response(data, status=status.HTTP_200_OK)
@@ -158,6 +160,39 @@ class ParentProfileView(generics.RetrieveAPIView):
             return response.Response(error, status=status.HTTP_400_BAD_REQUEST)
 
 
+class StudentQRCodeView(generics.GenericAPIView):
+    """
+        PNG of a student's QR code for the student, their parent, teachers
+        and staff. The image is rendered on the first request and cached,
+        clients revalidate it with If-None-Match.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk, *args, **kwargs):
+        student = Student.objects.select_related('parent').only(
+            'user_id', 'parent__user_id').filter(pk=pk).first()
+        if student is None:
+            return response.Response({"error_message": "Student not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        user = request.user
+        if not (user.is_staff or user.pk in (student.user_id, student.parent and student.parent.user_id)
+                or Teacher.objects.filter(user=user).exists()):
+            return response.Response({"error_message": "You cannot view this QR code"},
+                                     status=status.HTTP_403_FORBIDDEN)
+        if not qr_key_configured():
+            return response.Response({"error_message": "QR codes are not available on this server"},
+                                     status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        etag = student_qr_etag(student.pk)
+        qr_response = get_conditional_response(request, etag=etag)
+        if qr_response is None:
+            qr_response = HttpResponse(student_qr_png(student.pk), content_type='image/png')
+
+        qr_response['ETag'] = etag
+        patch_cache_control(qr_response, private=True, max_age=qr_max_age())
+        return qr_response
+
+
 class ChangePasswordView(generics.UpdateAPIView):
     serializer_class = ChangePasswordSerializer
     model = User